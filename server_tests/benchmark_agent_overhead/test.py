@@ -0,0 +1,89 @@
+
+from testlib import *
+from core_api import CoreApi
+
+
+"""
+Measures the overhead of the agent: the same app with and without aikido installed.
+1. Start the server with aikido installed, measure GET /api/pets/, /api/execute and /api/request
+2. Stop the server, uninstall aikido, start the server and measure all routes
+3. Install aikido, restart the server and measure POST /api/create
+4. Report throughput and p50/p99 latency, without vs with the agent, to the step summary
+
+/api/create adds a pet per request, so it is measured last in both runs: otherwise GET /api/pets/
+would return more pets in the second run. The agent runs in detection mode: the shell command and
+the outbound request to the control server are detected as attacks but not blocked, so both runs
+get the same responses, and the numbers include the detection work.
+"""
+
+CONCURRENCY_LEVELS = [1, 8, 32]
+REQUESTS_PER_LEVEL = 300
+WARMUP_REQUESTS = 50
+
+ROUTES = [
+    ("GET", "/api/pets/", None),
+    ("POST", "/api/execute", {"userCommand": "echo benchmark"}),
+    ("POST", "/api/request", {"url": "http://127.0.0.1:8081/health"}),
+    ("POST", "/api/create", {"name": "Benchmark Pet"}),
+]
+
+
+def measure_route(collector, method, route, data):
+    requests = [(method, route, {}, data)] * REQUESTS_PER_LEVEL
+    s.burst(requests[:WARMUP_REQUESTS], max(CONCURRENCY_LEVELS))
+    measurements = {}
+    for concurrency in CONCURRENCY_LEVELS:
+        measurement = s.measure(requests, concurrency)
+        collector.soft_assert(
+            measurement["errors"] == 0,
+            f"{method} {route} at concurrency {concurrency}: {measurement['errors']} request(s) failed")
+        measurements[concurrency] = measurement
+    return measurements
+
+
+def measure_routes(collector, routes, results, mode):
+    for method, route, data in routes:
+        for concurrency, measurement in measure_route(collector, method, route, data).items():
+            results.setdefault((method, route, concurrency), {})[mode] = measurement
+
+
+def run_test(s: TestServer, c: CoreApi, cs: TestControlServer):
+    collector = AssertionCollector()
+    results = {}
+
+    # With aikido installed
+    cs.check_health()
+    cs.start_server()
+    measure_routes(collector, ROUTES[:-1], results, "with")
+
+    # Without aikido
+    cs.stop_server()
+    cs.uninstall_aikido()
+    cs.start_server()
+    measure_routes(collector, ROUTES, results, "without")
+
+    # With aikido installed again, for the route that changes the app's data
+    cs.install_aikido()
+    cs.graceful_restart()
+    measure_routes(collector, ROUTES[-1:], results, "with")
+
+    rows = []
+    for (method, route, concurrency), measurements in results.items():
+        without, with_agent = measurements["without"], measurements["with"]
+        # the agent must not change what the app answers
+        collector.soft_assert(
+            without["statuses"] == with_agent["statuses"],
+            f"{method} {route} at concurrency {concurrency}: statuses without the agent "
+            f"{without['statuses']}, with the agent {with_agent['statuses']}")
+        rows.append({"method": method, "route": route, "concurrency": concurrency,
+                     "without": without, "with": with_agent})
+        print(f"{method} {route} @{concurrency}: {without['rps']:.1f} -> {with_agent['rps']:.1f} req/s, "
+              f"p50 {without['p50']} -> {with_agent['p50']} ms, p99 {without['p99']} -> {with_agent['p99']} ms")
+    report_benchmark(rows)
+
+    collector.raise_if_failures()
+
+
+if __name__ == "__main__":
+    args, s, c, cs = init_server_and_core()
+    run_test(s, c, cs)
@@ -0,0 +1,149 @@
+"""
+Concurrent HTTP/1.1 requests over asyncio streams, behind TestServer.burst().
+
+Requests are spread over `concurrency` keep-alive connections, so the app gets them at the same time
+instead of one after another. Routes are sent exactly as given (no normalisation or re-encoding),
+like get_raw. Responses are requests.Response objects, in the order the requests were given, with
+the latency of each request in `elapsed`.
+"""
+import asyncio
+import datetime
+import json
+import time
+from typing import Iterable, List, Optional, Tuple
+
+import requests
+
+DEFAULT_TIMEOUT_SECONDS = 30
+# statuses that never have a body
+_NO_BODY_STATUSES = (204, 304)
+
+
+def _normalize(request) -> Tuple[str, str, dict, Optional[bytes]]:
+    """(method, route[, headers[, data]]) tuple or a dict with those keys -> method, route, headers, body."""
+    if isinstance(request, dict):
+        method, route = request.get("method", "GET"), request.get("route", "/")
+        headers, data = request.get("headers") or {}, request.get("data")
+    else:
+        method, route, headers, data = (tuple(request) + (None, None))[:4]
+        headers = headers or {}
+    if data is None or isinstance(data, bytes):
+        body = data
+    elif isinstance(data, str):
+        body = data.encode("utf-8")
+    else:
+        body = json.dumps(data).encode("utf-8")
+        headers = {"Content-Type": "application/json", **headers}
+    return method.upper(), route, headers, body
+
+
+def _encode_request(port: int, method: str, route: str, headers: dict, body: Optional[bytes]) -> bytes:
+    lines = [f"{method} {route} HTTP/1.1", f"Host: localhost:{port}"]
+    lines += [f"{name}: {value}" for name, value in headers.items()]
+    if body is not None:
+        lines.append(f"Content-Length: {len(body)}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("utf-8") + (body or b"")
+
+
+async def _read_response(reader: asyncio.StreamReader, method: str):
+    """Returns (status, headers, body, keep_alive)."""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("connection closed before the response")
+    version, status = status_line.decode("latin-1").split(" ", 2)[:2]
+    headers = requests.structures.CaseInsensitiveDict()
+    while True:
+        line = (await reader.readline()).decode("latin-1").rstrip("\r\n")
+        if not line:
+            break
+        name, _, value = line.partition(":")
+        value = value.strip()
+        headers[name] = f"{headers[name]}, {value}" if name in headers else value
+
+    status = int(status)
+    connection = headers.get("Connection", "").lower()
+    keep_alive = connection != "close" and (version != "HTTP/1.0" or connection == "keep-alive")
+    if method == "HEAD" or status in _NO_BODY_STATUSES or 100 <= status < 200:
+        body = b""
+    elif "chunked" in headers.get("Transfer-Encoding", "").lower():
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            if size == 0:
+                # trailers, up to the empty line
+                while (await reader.readline()).strip():
+                    pass
+                break
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+        body = b"".join(chunks)
+    elif "Content-Length" in headers:
+        body = await reader.readexactly(int(headers["Content-Length"]))
+    else:
+        body = await reader.read()
+        keep_alive = False
+    return status, headers, body, keep_alive
+
+
+def _response(port: int, route: str, status: int, headers, body: bytes, latency: float) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status
+    response.headers = headers
+    response._content = body
+    response.url = f"http://localhost:{port}{route}"
+    response.elapsed = datetime.timedelta(seconds=latency)
+    return response
+
+
+async def _worker(port: int, queue: asyncio.Queue, responses: List[requests.Response], timeout: float) -> None:
+    reader = writer = None
+    try:
+        while not queue.empty():
+            index, (method, route, headers, body) = queue.get_nowait()
+            for attempt in range(2):
+                reused = writer is not None
+                start = time.perf_counter()
+                try:
+                    if writer is None:
+                        reader, writer = await asyncio.wait_for(asyncio.open_connection("localhost", port), timeout)
+                    writer.write(_encode_request(port, method, route, headers, body))
+                    await writer.drain()
+                    status, response_headers, content, keep_alive = await asyncio.wait_for(
+                        _read_response(reader, method), timeout)
+                    responses[index] = _response(port, route, status, response_headers, content,
+                                                 time.perf_counter() - start)
+                    if not keep_alive:
+                        writer.close()
+                        writer = None
+                    break
+                except (OSError, ValueError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+                    if writer is not None:
+                        writer.close()
+                        writer = None
+                    # a kept-alive connection may have been closed by the app in the meantime: retry once
+                    if not reused or attempt == 1:
+                        print(f"Error in burst request {method} {route}: {e!r}")
+                        break
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+async def _burst(port: int, requests_: list, concurrency: int, timeout: float) -> List[requests.Response]:
+    queue = asyncio.Queue()
+    for index, request in enumerate(requests_):
+        queue.put_nowait((index, request))
+    # failed requests keep an empty Response, like localhost_post_request returns
+    responses = [requests.Response() for _ in requests_]
+    await asyncio.gather(*(_worker(port, queue, responses, timeout)
+                           for _ in range(max(1, min(concurrency, len(requests_))))))
+    return responses
+
+
+def burst(port: int, requests_: Iterable, concurrency: int = 10,
+          timeout: float = DEFAULT_TIMEOUT_SECONDS) -> List[requests.Response]:
+    """Send all `requests_` to localhost:`port` over `concurrency` connections; responses in the same order."""
+    normalized = [_normalize(request) for request in requests_]
+    if not normalized:
+        return []
+    return asyncio.run(_burst(port, normalized, concurrency, timeout))
@@ -0,0 +1,72 @@
+"""
+Reuse of test containers between tests with the same startup profile.
+
+A test opts in with an empty `reusable` file in its directory. Tests whose test.env,
+start_config.json and start_firewall.json are identical boot the same app, so after one of them
+passed, its container is kept running and handed to the next test with that profile instead of
+starting a new one. run_test resets the container between tests: the app behind its token is
+rotated in the core mock (fresh config, events and lists) and the start config is delivered again.
+"""
+import hashlib
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+REUSABLE_MARKER = "reusable"
+START_PROFILE_FILES = ("test.env", "start_config.json", "start_firewall.json")
+
+
+def start_profile_hash(test_path: str, test_type: str) -> Optional[str]:
+    """Hash of what the container of the test in `test_path` boots with, or None if it is not reusable."""
+    if not os.path.exists(os.path.join(test_path, REUSABLE_MARKER)):
+        return None
+    digest = hashlib.sha256(test_type.encode("utf-8"))
+    for name in START_PROFILE_FILES:
+        digest.update(b"\0" + name.encode("utf-8") + b"\0")
+        try:
+            with open(os.path.join(test_path, name), "rb") as f:
+                digest.update(f.read())
+        except FileNotFoundError:
+            digest.update(b"-")
+    return digest.hexdigest()
+
+
+@dataclass
+class ReusableContainer:
+    # the container (and its database) are named after the test that started it
+    name: str
+    token: str
+    port: int
+    control_port: Optional[int] = None
+    tests_run: int = 0
+
+
+class ContainerReuse:
+    """Idle containers per start profile hash. At most `max_idle` are kept in total."""
+
+    def __init__(self, max_idle: int):
+        self.max_idle = max_idle
+        self._idle: Dict[str, List[ReusableContainer]] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str) -> Optional[ReusableContainer]:
+        with self._lock:
+            containers = self._idle.get(key)
+            return containers.pop() if containers else None
+
+    def release(self, key: str, container: ReusableContainer) -> bool:
+        """Keep `container` for the next test with profile `key`. Returns False if it has to be removed."""
+        with self._lock:
+            if sum(len(containers) for containers in self._idle.values()) >= self.max_idle:
+                return False
+            container.tests_run += 1
+            self._idle.setdefault(key, []).append(container)
+            return True
+
+    def drain(self) -> List[ReusableContainer]:
+        """Take all idle containers, to remove them at the end of the run."""
+        with self._lock:
+            containers = [c for idle in self._idle.values() for c in idle]
+            self._idle = {}
+            return containers
@@ -2,7 +2,6 @@
 
 from testlib import *
 from core_api import CoreApi
-import threading
 import random
 import time
 
@@ -50,15 +49,13 @@ def send_attacks(collector):
 
 
 def check_event_is_submitted_shell_injection(collector, response_code, expected_json):
-    start_events = c.get_events("detected_attack")
+    cursor = c.get_events_cursor()
     response = s.post("/api/execute", {"userCommand": "whoami"})
     collector.soft_assert_response_code_is(response, response_code)
 
-    c.wait_for_new_events(5, old_events_length=len(
-        start_events), filter_type="detected_attack")
+    c.wait_for_events_since(5, cursor, filter_type="detected_attack")
 
-    all_events = c.get_events("detected_attack")
-    new_events = all_events[len(start_events):]
+    new_events, _ = c.events_since(cursor, "detected_attack")
 
     if not collector.soft_assert(
             len(new_events) == 1,
@@ -71,8 +68,15 @@ def check_event_is_submitted_shell_injection(collector, response_code, expected_
         collector.add_failure(str(e))
 
 
-def traffic_generator(stop_event):
-    """Generate diverse traffic with various IPs, user agents, and endpoints"""
+# Offered load while the server starts and is attacked: requests per second, spread over processes
+TRAFFIC_RATE = 100
+TRAFFIC_PROCESSES = 2
+TRAFFIC_SEED = 1234
+
+
+def build_traffic(count=10000, seed=TRAFFIC_SEED):
+    """Diverse traffic with various IPs, user agents, and endpoints; the same mix for the same seed"""
+    rng = random.Random(seed)
 
     # IP ranges by region
     IP_RANGES = {
@@ -133,54 +137,39 @@ def traffic_generator(stop_event):
     ip_pool = []
     for region, prefixes in IP_RANGES.items():
         for _ in range(20):  # 20 IPs per region
-            prefix = random.choice(prefixes)
-            ip = f"{prefix}{random.randint(1, 255)}.{random.randint(1, 255)}.{random.randint(1, 255)}"
+            prefix = rng.choice(prefixes)
+            ip = f"{prefix}{rng.randint(1, 255)}.{rng.randint(1, 255)}.{rng.randint(1, 255)}"
             ip_pool.append(ip)
 
     # Generate traffic
-    for i in range(10000):
-        if stop_event.is_set():
-            break
-
-        try:
-            # Select random IP and user agent
-            ip = random.choice(ip_pool)
-            user_agent = random.choice(USER_AGENTS)
-
-            # Build headers
-            headers = {
-                'X-Forwarded-For': ip,
-                'X-Real-IP': ip,
-                'User-Agent': user_agent,
-            }
-
-            # 70% chance it's a normal user (not a bot)
-            if 'Mozilla/5.0 (Windows' in user_agent or 'Mozilla/5.0 (Macintosh' in user_agent:
-                # Add user ID and name for normal users
-                user_id = random.randint(10000, 99999)
-                names = ['Alice', 'Bob', 'Charlie', 'David', 'Emma', 'Frank', 'Grace',
-                         'Henry', 'Isabella', 'Jack', 'Kate', 'Liam', 'Mia', 'Noah', 'Olivia']
-                user_name = names[user_id % len(names)]
-                headers['X-User-ID'] = str(user_id)
-                headers['X-User-Name'] = user_name
-
-            # Select random endpoint
-            endpoint = random.choice(ENDPOINTS)
-
-            # Make request
-            if endpoint['method'] == 'get':
-                response = s.get(endpoint['path'], headers=headers)
-            elif endpoint['method'] == 'post':
-                response = s.post(endpoint['path'], endpoint.get(
-                    'data', {}), headers=headers)
-
-            # Small delay to avoid overwhelming the server
-            if i % 100 == 0:
-                time.sleep(0.01)
-
-        except Exception as e:
-            # Continue on error
-            pass
+    traffic = []
+    for _ in range(count):
+        # Select random IP and user agent
+        ip = rng.choice(ip_pool)
+        user_agent = rng.choice(USER_AGENTS)
+
+        # Build headers
+        headers = {
+            'X-Forwarded-For': ip,
+            'X-Real-IP': ip,
+            'User-Agent': user_agent,
+        }
+
+        # 70% chance it's a normal user (not a bot)
+        if 'Mozilla/5.0 (Windows' in user_agent or 'Mozilla/5.0 (Macintosh' in user_agent:
+            # Add user ID and name for normal users
+            user_id = rng.randint(10000, 99999)
+            names = ['Alice', 'Bob', 'Charlie', 'David', 'Emma', 'Frank', 'Grace',
+                     'Henry', 'Isabella', 'Jack', 'Kate', 'Liam', 'Mia', 'Noah', 'Olivia']
+            user_name = names[user_id % len(names)]
+            headers['X-User-ID'] = str(user_id)
+            headers['X-User-Name'] = user_name
+
+        # Select random endpoint
+        endpoint = rng.choice(ENDPOINTS)
+        traffic.append((endpoint['method'], endpoint['path'], headers, endpoint.get('data')))
+
+    return traffic
 
 
 def run_test(s: TestServer, c: CoreApi, cs: TestControlServer):
@@ -191,9 +180,7 @@ def run_test(s: TestServer, c: CoreApi, cs: TestControlServer):
     cs.kill_agent()
     cs.status_is_running(False)
 
-    stop_event = threading.Event()
-    thread = threading.Thread(target=traffic_generator, args=(stop_event,))
-    thread.start()
+    load = s.load(build_traffic(), rate=TRAFFIC_RATE, processes=TRAFFIC_PROCESSES)
 
     cs.start_server()
     cs.status_is_running(True)
@@ -202,9 +189,8 @@ def run_test(s: TestServer, c: CoreApi, cs: TestControlServer):
     check_event_is_submitted_shell_injection(
         collector, 500, "expect_detection_blocked.json")
 
-    # Stop the traffic generator thread
-    stop_event.set()
-    thread.join()
+    # only for the logs: a slow app makes the generator drop requests, which says nothing about detection
+    print(load.stop())
 
     collector.raise_if_failures()
 
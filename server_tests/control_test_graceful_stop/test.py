@@ -55,15 +55,13 @@ def send_attacks(collector):
 
 
 def check_event_is_submitted_shell_injection(collector, response_code, expected_json):
-    start_events = c.get_events("detected_attack")
+    cursor = c.get_events_cursor()
     response = s.post("/api/execute", {"userCommand": "whoami"})
     collector.soft_assert_response_code_is(response, response_code)
 
-    c.wait_for_new_events(5, old_events_length=len(
-        start_events), filter_type="detected_attack")
+    c.wait_for_events_since(5, cursor, filter_type="detected_attack")
 
-    all_events = c.get_events("detected_attack")
-    new_events = all_events[len(start_events):]
+    new_events, _ = c.events_since(cursor, "detected_attack")
 
     if not collector.soft_assert(
             len(new_events) == 1,
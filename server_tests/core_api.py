@@ -5,6 +5,10 @@ import os
 
 
 class CoreApi:
+    CONFIG_POLL_INTERVAL_SECONDS = 0.5
+    CONFIG_APPLY_GRACE_SECONDS = 1
+    HEARTBEAT_FLUSH_INTERVAL_MS = 5000
+
     def __init__(self, token: str, core_url: str, test_name: str, config_update_delay: int = 60):
         self.token = token
         self.core_url = core_url
@@ -16,6 +20,12 @@ class CoreApi:
         response = requests.post(f"{core_url}/api/runtime/apps")
         return response.json()["token"]
 
+    def rotate_app(self) -> dict:
+        """Start the app behind this token over with a fresh config, events and lists (same token)."""
+        response = requests.post(
+            f"{self.core_url}/api/runtime/apps/rotate", headers={"Authorization": f"{self.token}"})
+        return response.json()
+
     def get_full_path(self, file_name: str) -> str:
         return os.path.join(os.path.dirname(os.path.abspath(__file__)), self.test_name, file_name)
 
@@ -27,8 +37,10 @@ class CoreApi:
     def update_runtime_config_json(self, config: dict) -> dict:
         response = requests.post(f"{self.core_url}/api/runtime/config",
                                  headers={"Authorization": f"{self.token}"}, json=config)
-        time.sleep(self.config_update_delay)
-        return response.json()
+        result = response.json()
+        self.wait_for_config_applied(
+            result.get("configUpdatedAt"), "config", self.config_update_delay)
+        return result
 
     def update_runtime_config_file(self, config_file: str) -> dict:
         with open(self.get_full_path(config_file), "r", encoding="utf-8") as f:
@@ -38,29 +50,121 @@ class CoreApi:
     def update_runtime_firewall_json(self, firewall: dict) -> dict:
         response = requests.post(f"{self.core_url}/api/runtime/firewall/lists",
                                  headers={"Authorization": f"{self.token}"}, json=firewall)
-        time.sleep(self.config_update_delay)
-        return response.json()
+        result = response.json()
+        self.wait_for_config_applied(
+            result.get("configUpdatedAt"), "lists", self.config_update_delay)
+        return result
 
     def update_runtime_firewall_file(self, file_name: str) -> dict:
         with open(self.get_full_path(file_name), "r", encoding="utf-8") as f:
             firewall = json.load(f)
         return self.update_runtime_firewall_json(firewall)
 
+    def get_config_applied(self) -> dict:
+        response = requests.get(
+            f"{self.core_url}/api/runtime/config/applied", headers={"Authorization": f"{self.token}"})
+        return response.json()
+
+    def wait_for_config_applied(self, config_updated_at: int, source: str, max_wait_time: float) -> bool:
+        """
+        Blocks until the agent has fetched the config version `config_updated_at`
+        from `source` ("config", "lists" or "realtime"), or until `max_wait_time`
+        seconds have passed. Returns True if the agent picked up the config.
+        """
+        deadline = time.monotonic() + max_wait_time
+        if config_updated_at is None:
+            time.sleep(max_wait_time)
+            return False
+
+        while True:
+            try:
+                delivered = self.get_config_applied()["delivered"]
+                if delivered.get(source, 0) >= config_updated_at:
+                    # give the agent a moment to apply what it just fetched
+                    time.sleep(min(self.CONFIG_APPLY_GRACE_SECONDS,
+                                   max(0, deadline - time.monotonic())))
+                    return True
+            except (requests.RequestException, ValueError, KeyError):
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(self.CONFIG_POLL_INTERVAL_SECONDS, remaining))
+
     def get_events(self, filter_type: str = None) -> list:
+        events, _ = self.events_since(0, filter_type)
+        return events
+
+    def get_events_cursor(self) -> int:
         response = requests.get(
-            f"{self.core_url}/api/runtime/events", headers={"Authorization": f"{self.token}"})
-        events = response.json()
+            f"{self.core_url}/api/runtime/events/cursor", headers={"Authorization": f"{self.token}"})
+        return response.json()["cursor"]
+
+    def events_since(self, cursor: int, filter_type: str = None) -> tuple:
+        """
+        Returns (events, new_cursor): the events (of filter_type, if given) captured
+        after `cursor`, and the cursor to pass next time to only get newer events.
+        """
+        params = {"after": cursor}
         if filter_type:
-            events = [event for event in events if event['type'] == filter_type]
-        return events
+            params["type"] = filter_type
+        response = requests.get(
+            f"{self.core_url}/api/runtime/events", headers={"Authorization": f"{self.token}"}, params=params)
+        return response.json(), int(response.headers.get("X-Events-Cursor", cursor))
+
+    def _wait_for_events(self, max_wait_time: int, since: int, after: int, filter_type: str = None) -> bool:
+        # long-poll: the core mock holds the request until a new event arrives or max_wait_time expires
+        params = {"since": since, "after": after,
+                  "timeout": int(max_wait_time * 1000)}
+        if filter_type:
+            params["type"] = filter_type
+        response = requests.get(f"{self.core_url}/api/runtime/events/wait",
+                                headers={"Authorization": f"{self.token}"}, params=params,
+                                timeout=max_wait_time + 10)
+        return response.json()["found"]
 
     def wait_for_new_events(self, max_wait_time: int, old_events_length: int, filter_type: str = None):
-        while max_wait_time > 0:
-            if len(self.get_events(filter_type)) > old_events_length:
-                return True
-            time.sleep(1)
-            max_wait_time -= 1
-        return False
+        return self._wait_for_events(max_wait_time, 0, old_events_length, filter_type)
+
+    def wait_for_events_since(self, max_wait_time: int, cursor: int, filter_type: str = None) -> bool:
+        return self._wait_for_events(max_wait_time, cursor, 0, filter_type)
+
+    def wait_for_matching_events(self, max_wait_time: float, cursor: int, match, filter_type: str = None) -> list:
+        """
+        Returns the events (of filter_type, if given) captured after `cursor` for which `match(event)`
+        is true, as soon as there is at least one, or whatever matched once `max_wait_time` has passed.
+        Unlike wait_for_events_since, events that belong to other scenarios running at the same time
+        don't end the wait.
+        """
+        deadline = time.monotonic() + max_wait_time
+        matched = []
+        while True:
+            events, cursor = self.events_since(cursor, filter_type)
+            matched += [event for event in events if match(event)]
+            remaining = deadline - time.monotonic()
+            if matched or remaining <= 0:
+                return matched
+            self._wait_for_events(remaining, cursor, 0, filter_type)
+
+    def flush_heartbeat(self, interval_ms: int = HEARTBEAT_FLUSH_INTERVAL_MS) -> dict:
+        """
+        Serve a heartbeat interval of `interval_ms` until the agent's next heartbeat, so the traffic
+        the test just sent is reported soon. The core mock restores the normal interval in its
+        response to the first heartbeat after the agent has fetched the short interval, so a
+        heartbeat already on its way doesn't end the flush. Doesn't wait for that fetch.
+        """
+        response = requests.post(f"{self.core_url}/api/runtime/heartbeat/flush",
+                                 headers={"Authorization": f"{self.token}"}, json={"intervalInMS": interval_ms})
+        return response.json()
+
+    def wait_for_heartbeat(self, max_wait_time: float, cursor: int, predicate=None):
+        """
+        The first heartbeat captured after `cursor` for which `predicate(heartbeat)` is true (any
+        heartbeat without one), as soon as it arrives. None if there is none after `max_wait_time`.
+        """
+        heartbeats = self.wait_for_matching_events(
+            max_wait_time, cursor, predicate or (lambda heartbeat: True), "heartbeat")
+        return heartbeats[0] if heartbeats else None
 
     def set_mock_server_down(self):
         response = requests.post(
@@ -0,0 +1,275 @@
+"""
+Per-test PostgreSQL databases, provisioned over a native connection to the postgres container.
+
+Databases are copied from a template with `CREATE DATABASE ... TEMPLATE`, which is a catalog copy
+on the server, instead of running `docker exec postgres createdb` for each test. DatabasePool creates
+the databases of queued tests in the background and drops them again when a test has ended.
+
+PgConnection implements just enough of the PostgreSQL wire protocol for this (startup, password /
+md5 / SCRAM-SHA-256 authentication and simple queries), so no database driver needs to be installed.
+"""
+import base64
+import concurrent.futures
+import hashlib
+import hmac
+import os
+import socket
+import struct
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from summary import get_logger
+
+logger = get_logger()
+
+DEFAULT_TEMPLATE = "zen_test_template"
+# SQLSTATE of CREATE DATABASE for a name that already exists
+DUPLICATE_DATABASE = "42P04"
+
+
+class PgError(Exception):
+    def __init__(self, fields: Dict[str, str]):
+        super().__init__(fields.get("M", "unknown error"))
+        self.code = fields.get("C")
+
+
+class PgConnection:
+    def __init__(self, host: str, port: int, user: str, password: str, database: str, timeout: float = 30):
+        self.user = user
+        self.password = password
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        try:
+            self._startup(database)
+        except Exception:
+            self.sock.close()
+            raise
+
+    def _send(self, message_type: bytes, payload: bytes) -> None:
+        self.sock.sendall(message_type + struct.pack("!I", len(payload) + 4) + payload)
+
+    def _recv_exact(self, size: int) -> bytes:
+        data = bytearray()
+        while len(data) < size:
+            chunk = self.sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("PostgreSQL closed the connection")
+            data += chunk
+        return bytes(data)
+
+    def _recv(self) -> Tuple[bytes, bytes]:
+        header = self._recv_exact(5)
+        size = struct.unpack("!I", header[1:5])[0]
+        return header[:1], self._recv_exact(size - 4)
+
+    @staticmethod
+    def _error_fields(payload: bytes) -> Dict[str, str]:
+        fields = {}
+        for field in payload.split(b"\0"):
+            if field:
+                fields[chr(field[0])] = field[1:].decode("utf-8", errors="replace")
+        return fields
+
+    def _startup(self, database: str) -> None:
+        params = f"user\0{self.user}\0database\0{database}\0\0".encode("utf-8")
+        # protocol version 3.0
+        payload = struct.pack("!I", 196608) + params
+        self.sock.sendall(struct.pack("!I", len(payload) + 4) + payload)
+
+        scram = None
+        while True:
+            message_type, payload = self._recv()
+            if message_type == b"E":
+                raise PgError(self._error_fields(payload))
+            if message_type == b"Z":
+                return
+            if message_type != b"R":
+                # ParameterStatus, BackendKeyData, notices
+                continue
+            auth = struct.unpack("!I", payload[:4])[0]
+            if auth == 3:
+                self._send(b"p", self.password.encode("utf-8") + b"\0")
+            elif auth == 5:
+                inner = hashlib.md5((self.password + self.user).encode("utf-8")).hexdigest()
+                outer = hashlib.md5(inner.encode("ascii") + payload[4:8]).hexdigest()
+                self._send(b"p", b"md5" + outer.encode("ascii") + b"\0")
+            elif auth == 10:
+                if b"SCRAM-SHA-256\0" not in payload[4:]:
+                    raise ConnectionError("PostgreSQL offers no supported SASL mechanism")
+                scram = ScramSha256(self.password)
+                first = scram.client_first()
+                self._send(b"p", b"SCRAM-SHA-256\0" + struct.pack("!I", len(first)) + first)
+            elif auth == 11:
+                self._send(b"p", scram.client_final(payload[4:]))
+            elif auth == 12:
+                scram.verify_server_final(payload[4:])
+            elif auth != 0:
+                raise ConnectionError(f"Unsupported PostgreSQL authentication method {auth}")
+
+    def execute(self, sql: str) -> List[Tuple[Optional[str], ...]]:
+        """Run a simple query and return its rows as text."""
+        self._send(b"Q", sql.encode("utf-8") + b"\0")
+        rows = []
+        error = None
+        while True:
+            message_type, payload = self._recv()
+            if message_type == b"D":
+                columns = struct.unpack("!H", payload[:2])[0]
+                row = []
+                offset = 2
+                for _ in range(columns):
+                    size = struct.unpack("!i", payload[offset:offset + 4])[0]
+                    offset += 4
+                    if size < 0:
+                        row.append(None)
+                    else:
+                        row.append(payload[offset:offset + size].decode("utf-8"))
+                        offset += size
+                rows.append(tuple(row))
+            elif message_type == b"E":
+                error = PgError(self._error_fields(payload))
+            elif message_type == b"Z":
+                if error:
+                    raise error
+                return rows
+
+    def close(self) -> None:
+        try:
+            self._send(b"X", b"")
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class ScramSha256:
+    """Client side of SCRAM-SHA-256 (RFC 5802 / 7677), as used by PostgreSQL."""
+
+    def __init__(self, password: str, user: str = "", nonce: Optional[str] = None):
+        self.password = password.encode("utf-8")
+        self.nonce = nonce or base64.b64encode(os.urandom(18)).decode("ascii")
+        # PostgreSQL takes the user name from the startup message, so it is left empty there
+        self.client_first_bare = f"n={user},r={self.nonce}"
+        self.auth_message = None
+        self.salted_password = None
+
+    def client_first(self) -> bytes:
+        return f"n,,{self.client_first_bare}".encode("ascii")
+
+    def client_final(self, server_first: bytes) -> bytes:
+        server_first = server_first.decode("ascii")
+        attributes = dict(item.split("=", 1) for item in server_first.split(","))
+        if not attributes["r"].startswith(self.nonce):
+            raise ConnectionError("SCRAM server nonce does not match")
+        self.salted_password = hashlib.pbkdf2_hmac(
+            "sha256", self.password, base64.b64decode(attributes["s"]), int(attributes["i"]))
+        client_key = hmac.digest(self.salted_password, b"Client Key", "sha256")
+        stored_key = hashlib.sha256(client_key).digest()
+        client_final_without_proof = f"c=biws,r={attributes['r']}"
+        self.auth_message = f"{self.client_first_bare},{server_first},{client_final_without_proof}".encode("ascii")
+        signature = hmac.digest(stored_key, self.auth_message, "sha256")
+        proof = bytes(a ^ b for a, b in zip(client_key, signature))
+        return f"{client_final_without_proof},p={base64.b64encode(proof).decode('ascii')}".encode("ascii")
+
+    def verify_server_final(self, server_final: bytes) -> None:
+        attributes = dict(item.split("=", 1) for item in server_final.decode("ascii").split(","))
+        server_key = hmac.digest(self.salted_password, b"Server Key", "sha256")
+        expected = hmac.digest(server_key, self.auth_message, "sha256")
+        if not hmac.compare_digest(base64.b64decode(attributes.get("v", "")), expected):
+            raise ConnectionError("SCRAM server signature does not match")
+
+
+def quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+class DatabasePool:
+    """
+    Creates per-test databases from a template ahead of time and drops them when tests end.
+    Each worker thread keeps its own admin connection.
+    """
+
+    def __init__(self, host: str, port: int, user: str, password: str, admin_database: str,
+                 template: str = DEFAULT_TEMPLATE, workers: int = 4):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.admin_database = admin_database
+        self.template = template
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="db-pool")
+        self._local = threading.local()
+        self._connections: List[PgConnection] = []
+        self._lock = threading.Lock()
+        self._created: Dict[str, concurrent.futures.Future] = {}
+        self._dropped: List[concurrent.futures.Future] = []
+
+    def _connection(self) -> PgConnection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = PgConnection(self.host, self.port, self.user,
+                                self.password, self.admin_database)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def start(self) -> None:
+        """Create the template database (empty, like createdb would) and mark it as a template."""
+        conn = PgConnection(self.host, self.port, self.user,
+                            self.password, self.admin_database)
+        try:
+            template = quote_identifier(self.template)
+            if not conn.execute(f"SELECT 1 FROM pg_database WHERE datname = '{self.template}'"):
+                conn.execute(f"CREATE DATABASE {template} TEMPLATE template1")
+            conn.execute(f"ALTER DATABASE {template} IS_TEMPLATE true ALLOW_CONNECTIONS false")
+        finally:
+            conn.close()
+
+    def _create(self, name: str) -> None:
+        try:
+            self._connection().execute(
+                f"CREATE DATABASE {quote_identifier(name)} TEMPLATE {quote_identifier(self.template)}")
+        except PgError as e:
+            if e.code != DUPLICATE_DATABASE:
+                raise
+
+    def _drop(self, name: str, created: Optional[concurrent.futures.Future] = None) -> None:
+        if created is not None:
+            # a database that is still being created would be created again after the drop
+            concurrent.futures.wait([created])
+        self._connection().execute(
+            f"DROP DATABASE IF EXISTS {quote_identifier(name)} WITH (FORCE)")
+
+    def prepare(self, names: Iterable[str]) -> None:
+        """Start creating the databases of queued tests in the background, in the given order."""
+        with self._lock:
+            for name in names:
+                if name not in self._created:
+                    self._created[name] = self._executor.submit(self._create, name)
+
+    def acquire(self, name: str) -> None:
+        """Wait until the database `name` exists (creating it now if it was not prepared)."""
+        self.prepare([name])
+        self._created[name].result()
+
+    def release(self, name: str) -> None:
+        """Drop the database `name` in the background, also if it was only prepared."""
+        with self._lock:
+            created = self._created.pop(name, None)
+            future = self._executor.submit(self._drop, name, created)
+            self._dropped.append(future)
+        future.add_done_callback(lambda f: self._log_drop_error(name, f))
+
+    @staticmethod
+    def _log_drop_error(name: str, future: concurrent.futures.Future) -> None:
+        error = future.exception()
+        if error:
+            logger.warning(f"Could not drop database {name}: {error}")
+
+    def close(self) -> None:
+        """Wait for pending creates and drops, then close the admin connections."""
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
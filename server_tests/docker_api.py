@@ -0,0 +1,574 @@
+"""
+Small Docker Engine API client used by run_test.py, testlib and the tests' mock-server helpers.
+
+It talks HTTP to the daemon over the unix socket (or DOCKER_HOST=unix://... / tcp://...) and keeps
+a pool of keep-alive connections, so waiting for a container or reading its logs does not fork a
+`docker` process each time. Where the engine is only reachable through the CLI (e.g. the Windows
+named pipe), get_docker() returns DockerCli, which has the same methods.
+"""
+import http.client
+import json
+import os
+import queue
+import socket
+import subprocess
+import time
+import urllib.parse
+from typing import Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_DOCKER_SOCKET = "/var/run/docker.sock"
+
+
+class DockerApiError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(f"Docker API error {status}: {message}")
+        self.status = status
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def _split_image(image: str) -> Tuple[str, str]:
+    name, _, tag = image.rpartition(":")
+    if not name or "/" in tag:
+        return image, "latest"
+    return name, tag
+
+
+def _format_since(since: float) -> str:
+    # Docker takes fractional unix timestamps: a whole second could replay the previous test's last lines
+    return f"{since:.6f}"
+
+
+def _demux_stream(data: bytes) -> bytes:
+    """Strip the 8-byte frame headers docker adds to stdout/stderr of containers without a TTY."""
+    out = bytearray()
+    i = 0
+    while i + 8 <= len(data) and data[i] in (0, 1, 2) and data[i + 1:i + 4] == b"\0\0\0":
+        size = int.from_bytes(data[i + 4:i + 8], "big")
+        out += data[i + 8:i + 8 + size]
+        i += 8 + size
+    if i == 0:
+        return data
+    return bytes(out) + data[i:]
+
+
+def _memory_usage(memory_stats: dict) -> int:
+    # like `docker stats`: the page cache the kernel can drop at any time is not counted
+    usage = memory_stats.get("usage", 0)
+    stats = memory_stats.get("stats", {})
+    for key in ("total_inactive_file", "inactive_file"):
+        if key in stats and stats[key] < usage:
+            return usage - stats[key]
+    return usage
+
+
+def _cpu_percent(stats: dict) -> Optional[float]:
+    cpu, precpu = stats.get("cpu_stats", {}), stats.get("precpu_stats", {})
+    cpu_delta = cpu.get("cpu_usage", {}).get("total_usage", 0) - \
+        precpu.get("cpu_usage", {}).get("total_usage", 0)
+    system_delta = cpu.get("system_cpu_usage", 0) - \
+        precpu.get("system_cpu_usage", 0)
+    if system_delta <= 0 or not precpu.get("system_cpu_usage"):
+        return None
+    online_cpus = cpu.get("online_cpus") or len(
+        cpu.get("cpu_usage", {}).get("percpu_usage") or []) or 1
+    return cpu_delta / system_delta * online_cpus * 100
+
+
+_SIZE_UNITS = {"b": 1, "kb": 1000, "mb": 1000 ** 2, "gb": 1000 ** 3, "tb": 1000 ** 4,
+               "kib": 1024, "mib": 1024 ** 2, "gib": 1024 ** 3, "tib": 1024 ** 4}
+
+
+def _parse_size(size: str) -> int:
+    """'10.5MiB' / '1.2kB' (as printed by `docker stats`) -> bytes."""
+    size = size.strip()
+    number = size.rstrip("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ")
+    return int(float(number) * _SIZE_UNITS.get(size[len(number):].strip().lower(), 1))
+
+
+class LogStream:
+    """
+    Lines of a followed container log (`docker logs -f`), stdout and stderr interleaved as they arrive.
+    Iterating ends when the container stops or close() is called from another thread.
+    """
+
+    def __init__(self, conn: http.client.HTTPConnection, response: http.client.HTTPResponse):
+        self._conn = conn
+        self._response = response
+
+    def __iter__(self) -> Iterator[str]:
+        # one pending partial line per stream, so stdout and stderr frames don't get glued together
+        partial = {1: b"", 2: b""}
+        try:
+            while True:
+                header = self._response.read(8)
+                if len(header) < 8:
+                    break
+                stream = 2 if header[0] == 2 else 1
+                data = partial[stream] + \
+                    self._response.read(int.from_bytes(header[4:8], "big"))
+                *lines, partial[stream] = data.split(b"\n")
+                for line in lines:
+                    yield line.decode("utf-8", errors="replace")
+        except (http.client.HTTPException, OSError, ValueError):
+            # closed by close() or by the daemon
+            pass
+        finally:
+            self._conn.close()
+        for rest in partial.values():
+            if rest:
+                yield rest.decode("utf-8", errors="replace")
+
+    def close(self) -> None:
+        try:
+            self._conn.sock.shutdown(socket.SHUT_RDWR)
+        except (AttributeError, OSError):
+            pass
+
+
+class CliLogStream:
+    """LogStream backed by a `docker logs -f` process."""
+
+    def __init__(self, process: subprocess.Popen):
+        self._process = process
+
+    def __iter__(self) -> Iterator[str]:
+        try:
+            for line in self._process.stdout:
+                yield line.rstrip("\n")
+        finally:
+            self._process.stdout.close()
+            self._process.wait()
+
+    def close(self) -> None:
+        self._process.kill()
+
+
+class DockerApi:
+    def __init__(self, docker_host: str = f"unix://{DEFAULT_DOCKER_SOCKET}", timeout: float = 60, pool_size: int = 16):
+        url = urllib.parse.urlparse(docker_host)
+        if url.scheme == "unix":
+            self.socket_path = url.path
+            self.host, self.port = None, None
+        elif url.scheme in ("tcp", "http"):
+            self.socket_path = None
+            self.host, self.port = url.hostname, url.port or 2375
+        else:
+            raise ValueError(f"Unsupported docker host: {docker_host}")
+        self.timeout = timeout
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+
+    def _new_connection(self, timeout: Optional[float] = None) -> http.client.HTTPConnection:
+        timeout = timeout or self.timeout
+        if self.socket_path:
+            return UnixHTTPConnection(self.socket_path, timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+
+    def _release(self, conn: http.client.HTTPConnection, response: http.client.HTTPResponse):
+        if response.will_close:
+            conn.close()
+            return
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def _url(self, path: str, params: Optional[dict] = None) -> str:
+        if params:
+            return f"{path}?{urllib.parse.urlencode(params)}"
+        return path
+
+    def request(self, method: str, path: str, params: Optional[dict] = None, body=None, timeout: Optional[float] = None) -> Tuple[int, bytes]:
+        headers = {"Host": "docker"}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+
+        for attempt in range(2):
+            try:
+                conn = self._pool.get_nowait()
+                reused = True
+            except queue.Empty:
+                conn = self._new_connection(timeout)
+                reused = False
+            try:
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout or self.timeout)
+                conn.request(method, self._url(path, params),
+                             body=payload, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                # a pooled keep-alive connection may have been closed by the daemon
+                if reused and attempt == 0:
+                    continue
+                raise
+            self._release(conn, response)
+            return response.status, data
+
+    def _json(self, method: str, path: str, params: Optional[dict] = None, body=None, timeout: Optional[float] = None, allow_404: bool = False):
+        status, data = self.request(method, path, params, body, timeout)
+        if status == 404 and allow_404:
+            return None
+        if status >= 400:
+            try:
+                message = json.loads(data).get("message", data)
+            except ValueError:
+                message = data.decode("utf-8", errors="replace")
+            raise DockerApiError(status, message)
+        return json.loads(data) if data else None
+
+    def info(self) -> dict:
+        return self._json("GET", "/info")
+
+    def inspect_network(self, name: str) -> dict:
+        return self._json("GET", f"/networks/{name}")
+
+    def inspect_container(self, name: str) -> Optional[dict]:
+        return self._json("GET", f"/containers/{name}/json", allow_404=True)
+
+    def is_running(self, name: str) -> bool:
+        container = self.inspect_container(name)
+        return bool(container and container["State"]["Running"])
+
+    def image_exists(self, image: str) -> bool:
+        return self._json("GET", f"/images/{image}/json", allow_404=True) is not None
+
+    def tag_image(self, image: str, target: str) -> None:
+        repo, tag = _split_image(target)
+        self._json("POST", f"/images/{image}/tag", {"repo": repo, "tag": tag})
+
+    def pull_image(self, image: str) -> None:
+        name, tag = _split_image(image)
+        status, data = self.request(
+            "POST", "/images/create", {"fromImage": name, "tag": tag}, timeout=600)
+        # the body is a stream of JSON progress messages; failures show up as {"error": ...}
+        errors = [line for line in data.decode("utf-8", errors="replace").splitlines()
+                  if '"error"' in line]
+        if status >= 400 or errors:
+            raise DockerApiError(status, errors[-1] if errors else data.decode(
+                "utf-8", errors="replace"))
+
+    def run_container(self, name: str, image: str, cmd: Optional[List[str]] = None, env: Optional[List[str]] = None,
+                      ports: Optional[Dict[int, int]] = None, binds: Optional[List[str]] = None, network: Optional[str] = None,
+                      ip: Optional[str] = None, cap_add: Optional[List[str]] = None, auto_remove: bool = False) -> str:
+        """Equivalent of `docker run -d`; pulls the image if it is not present yet."""
+        ports = ports or {}
+        host_config = {
+            "PortBindings": {f"{container_port}/tcp": [{"HostPort": str(host_port)}]
+                             for container_port, host_port in ports.items()},
+            "Binds": binds or [],
+            "CapAdd": cap_add or [],
+            "AutoRemove": auto_remove,
+        }
+        body = {
+            "Image": image,
+            "Env": env or [],
+            "ExposedPorts": {f"{container_port}/tcp": {} for container_port in ports},
+            "HostConfig": host_config,
+        }
+        if cmd:
+            body["Cmd"] = cmd
+        if network:
+            host_config["NetworkMode"] = network
+            if ip:
+                body["NetworkingConfig"] = {"EndpointsConfig": {
+                    network: {"IPAMConfig": {"IPv4Address": ip}}}}
+
+        try:
+            container = self._json(
+                "POST", "/containers/create", {"name": name}, body)
+        except DockerApiError as e:
+            if e.status != 404:
+                raise
+            self.pull_image(image)
+            container = self._json(
+                "POST", "/containers/create", {"name": name}, body)
+        self._json("POST", f"/containers/{container['Id']}/start")
+        return container["Id"]
+
+    def wait_for_running(self, name: str, timeout_seconds: float = 20) -> None:
+        """Wait for the container's start event instead of polling `docker inspect`."""
+        deadline = time.monotonic() + timeout_seconds
+        filters = json.dumps(
+            {"type": ["container"], "container": [name], "event": ["start"]})
+        # `since` replays events from just before we subscribed, so a start we raced with is not lost
+        params = {"filters": filters, "since": str(int(time.time()) - 1)}
+        conn = self._new_connection(timeout_seconds)
+        try:
+            conn.request("GET", self._url("/events", params),
+                         headers={"Host": "docker"})
+            response = conn.getresponse()
+            if self.is_running(name):
+                return
+            while response.status == 200:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                conn.sock.settimeout(remaining)
+                line = response.readline()
+                if not line:
+                    break
+                if line.strip():
+                    return
+        except (http.client.HTTPException, OSError):
+            pass
+        finally:
+            conn.close()
+
+        if self.is_running(name):
+            return
+        raise RuntimeError(
+            f"Container {name} did not start after {timeout_seconds} seconds")
+
+    def container_ip(self, name: str) -> str:
+        container = self.inspect_container(name) or {}
+        networks = container.get("NetworkSettings", {}).get("Networks", {})
+        return "".join(n.get("IPAddress", "") for n in networks.values())
+
+    def logs(self, name: str, since: Optional[float] = None) -> str:
+        params = {"stdout": 1, "stderr": 1}
+        if since:
+            params["since"] = _format_since(since)
+        status, data = self.request(
+            "GET", f"/containers/{name}/logs", params)
+        if status >= 400:
+            raise DockerApiError(status, data.decode("utf-8", errors="replace"))
+        return _demux_stream(data).decode("utf-8", errors="replace")
+
+    def follow_logs(self, name: str, since: Optional[float] = None) -> LogStream:
+        # a dedicated connection without a read timeout: the stream stays open for the container's lifetime
+        conn = self._new_connection()
+        conn.timeout = None
+        params = {"follow": 1, "stdout": 1, "stderr": 1}
+        if since:
+            params["since"] = _format_since(since)
+        conn.request("GET", self._url(f"/containers/{name}/logs", params),
+                     headers={"Host": "docker"})
+        response = conn.getresponse()
+        if response.status >= 400:
+            data = response.read()
+            conn.close()
+            raise DockerApiError(response.status, data.decode("utf-8", errors="replace"))
+        return LogStream(conn, response)
+
+    def stats(self, name: str) -> Optional[dict]:
+        """
+        Resource usage of a running container, like one line of `docker stats`: memory (bytes),
+        cpu_percent (of one CPU), cpu_seconds (used since the container started), pids,
+        net_rx / net_tx (bytes). None if the container is gone.
+        Takes about a second: the daemon samples the CPU usage twice.
+        """
+        stats = self._json("GET", f"/containers/{name}/stats",
+                           {"stream": 0}, allow_404=True)
+        if not stats or not stats.get("memory_stats"):
+            return None
+        networks = (stats.get("networks") or {}).values()
+        return {
+            "memory": _memory_usage(stats["memory_stats"]),
+            "cpu_percent": _cpu_percent(stats),
+            "cpu_seconds": stats.get("cpu_stats", {}).get("cpu_usage", {}).get("total_usage", 0) / 1e9,
+            "pids": stats.get("pids_stats", {}).get("current"),
+            "net_rx": sum(n.get("rx_bytes", 0) for n in networks),
+            "net_tx": sum(n.get("tx_bytes", 0) for n in networks),
+        }
+
+    # stopping or removing what is already stopped or gone is not an error (304 / 404), like `docker rm -f`
+    def stop_container(self, name: str, timeout_seconds: int = 10) -> None:
+        self._json("POST", f"/containers/{name}/stop",
+                   {"t": timeout_seconds}, timeout=timeout_seconds + self.timeout, allow_404=True)
+
+    def remove_container(self, name: str) -> None:
+        self._json("DELETE", f"/containers/{name}", {"force": 1}, allow_404=True)
+
+    def exec_run(self, name: str, cmd: List[str], env: Optional[List[str]] = None, user: Optional[str] = None) -> Tuple[int, str]:
+        """Equivalent of `docker exec`; returns (exit code, combined stdout/stderr)."""
+        body = {"Cmd": cmd, "AttachStdout": True,
+                "AttachStderr": True, "Env": env or []}
+        if user:
+            body["User"] = user
+        created = self._json("POST", f"/containers/{name}/exec", body=body)
+        status, data = self.request(
+            "POST", f"/exec/{created['Id']}/start", body={"Detach": False, "Tty": False})
+        if status >= 400:
+            raise DockerApiError(status, data.decode("utf-8", errors="replace"))
+        exit_code = self._json("GET", f"/exec/{created['Id']}/json")["ExitCode"]
+        return exit_code, _demux_stream(data).decode("utf-8", errors="replace")
+
+    def create_network(self, name: str, driver: str, subnet: str) -> None:
+        self._json("POST", "/networks/create", body={
+            "Name": name, "Driver": driver, "IPAM": {"Config": [{"Subnet": subnet}]}})
+
+    def connect_network(self, network: str, container: str) -> None:
+        self._json("POST", f"/networks/{network}/connect",
+                   body={"Container": container})
+
+    def disconnect_network(self, network: str, container: str) -> None:
+        self._json("POST", f"/networks/{network}/disconnect",
+                   body={"Container": container, "Force": True}, allow_404=True)
+
+    def remove_network(self, name: str) -> None:
+        self._json("DELETE", f"/networks/{name}", allow_404=True)
+
+
+class DockerCli:
+    """Same interface as DockerApi, implemented with the docker CLI."""
+
+    def _run(self, args: List[str], check: bool = True, timeout: Optional[float] = None) -> subprocess.CompletedProcess:
+        return subprocess.run(["docker", *args], capture_output=True, text=True, check=check, timeout=timeout,
+                              encoding="utf-8", errors="replace")
+
+    def info(self) -> dict:
+        return json.loads(self._run(["info", "--format", "{{json .}}"], timeout=30).stdout)
+
+    def inspect_network(self, name: str) -> dict:
+        return json.loads(self._run(["network", "inspect", name], timeout=30).stdout)[0]
+
+    def inspect_container(self, name: str) -> Optional[dict]:
+        result = self._run(["inspect", name], check=False)
+        if result.returncode != 0:
+            return None
+        return json.loads(result.stdout)[0]
+
+    def is_running(self, name: str) -> bool:
+        container = self.inspect_container(name)
+        return bool(container and container["State"]["Running"])
+
+    def image_exists(self, image: str) -> bool:
+        return self._run(["image", "inspect", image], check=False).returncode == 0
+
+    def tag_image(self, image: str, target: str) -> None:
+        self._run(["tag", image, target])
+
+    def pull_image(self, image: str) -> None:
+        self._run(["pull", image])
+
+    def run_container(self, name: str, image: str, cmd: Optional[List[str]] = None, env: Optional[List[str]] = None,
+                      ports: Optional[Dict[int, int]] = None, binds: Optional[List[str]] = None, network: Optional[str] = None,
+                      ip: Optional[str] = None, cap_add: Optional[List[str]] = None, auto_remove: bool = False) -> str:
+        args = ["run", "-d", "--name", name]
+        if auto_remove:
+            args.append("--rm")
+        for value in env or []:
+            args += ["--env", value]
+        for container_port, host_port in (ports or {}).items():
+            args += ["-p", f"{host_port}:{container_port}"]
+        for bind in binds or []:
+            args += ["-v", bind]
+        if network:
+            args += ["--network", network]
+        if ip:
+            args += ["--ip", ip]
+        for cap in cap_add or []:
+            args += ["--cap-add", cap]
+        args.append(image)
+        args += cmd or []
+        return self._run(args).stdout.strip()
+
+    def wait_for_running(self, name: str, timeout_seconds: float = 20) -> None:
+        deadline = time.monotonic() + timeout_seconds
+        while time.monotonic() < deadline:
+            if self.is_running(name):
+                return
+            time.sleep(1)
+        raise RuntimeError(
+            f"Container {name} did not start after {timeout_seconds} seconds")
+
+    def container_ip(self, name: str) -> str:
+        result = self._run(["inspect", "-f", "{{range .NetworkSettings.Networks}}{{.IPAddress}}{{end}}", name],
+                           check=False)
+        return result.stdout.strip() if result.returncode == 0 else ""
+
+    def logs(self, name: str, since: Optional[float] = None) -> str:
+        args = ["logs", name]
+        if since:
+            args += ["--since", _format_since(since)]
+        return subprocess.check_output(["docker", *args], stderr=subprocess.STDOUT).decode("utf-8", errors="replace")
+
+    def follow_logs(self, name: str, since: Optional[float] = None) -> CliLogStream:
+        args = ["logs", "-f", name]
+        if since:
+            args += ["--since", _format_since(since)]
+        process = subprocess.Popen(["docker", *args], stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                   text=True, encoding="utf-8", errors="replace")
+        return CliLogStream(process)
+
+    def stats(self, name: str) -> Optional[dict]:
+        result = self._run(["stats", "--no-stream", "--format", "{{json .}}", name],
+                           check=False, timeout=30)
+        if result.returncode != 0 or not result.stdout.strip():
+            return None
+        stats = json.loads(result.stdout.splitlines()[0])
+        net_rx, _, net_tx = stats.get("NetIO", "0B / 0B").partition("/")
+        try:
+            cpu_percent = float(stats.get("CPUPerc", "").rstrip("%"))
+        except ValueError:
+            cpu_percent = None
+        return {
+            "memory": _parse_size(stats.get("MemUsage", "0B").split("/")[0]),
+            "cpu_percent": cpu_percent,
+            # not printed by `docker stats`
+            "cpu_seconds": None,
+            "pids": int(stats["PIDs"]) if str(stats.get("PIDs", "")).isdigit() else None,
+            "net_rx": _parse_size(net_rx),
+            "net_tx": _parse_size(net_tx or "0B"),
+        }
+
+    def stop_container(self, name: str, timeout_seconds: int = 10) -> None:
+        self._run(["stop", "-t", str(timeout_seconds), name], check=False)
+
+    def remove_container(self, name: str) -> None:
+        self._run(["rm", "-f", name], check=False)
+
+    def exec_run(self, name: str, cmd: List[str], env: Optional[List[str]] = None, user: Optional[str] = None) -> Tuple[int, str]:
+        args = ["exec"]
+        for value in env or []:
+            args += ["-e", value]
+        if user:
+            args += ["-u", user]
+        result = self._run([*args, name, *cmd], check=False)
+        return result.returncode, result.stdout + result.stderr
+
+    def create_network(self, name: str, driver: str, subnet: str) -> None:
+        self._run(["network", "create", "--driver",
+                  driver, "--subnet", subnet, name])
+
+    def connect_network(self, network: str, container: str) -> None:
+        self._run(["network", "connect", network, container])
+
+    def disconnect_network(self, network: str, container: str) -> None:
+        self._run(["network", "disconnect", network, container], check=False)
+
+    def remove_network(self, name: str) -> None:
+        self._run(["network", "rm", name], check=False)
+
+
+_docker = None
+
+
+def get_docker():
+    """
+    Shared client for this process: DockerApi when the engine is reachable over a unix socket or
+    tcp (DOCKER_HOST), DockerCli otherwise.
+    """
+    global _docker
+    if _docker is None:
+        docker_host = os.environ.get("DOCKER_HOST", "")
+        if docker_host.startswith(("unix://", "tcp://", "http://")):
+            _docker = DockerApi(docker_host)
+        elif not docker_host and os.path.exists(DEFAULT_DOCKER_SOCKET):
+            _docker = DockerApi()
+        else:
+            _docker = DockerCli()
+    return _docker
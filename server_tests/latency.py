@@ -0,0 +1,128 @@
+"""
+Latency histograms for benchmarked requests.
+
+LatencyHistogram is HDR-style: values are kept in log-linear buckets (128 per power of two, in
+microseconds), so percentiles are exact to within 1% at any scale while memory stays bounded.
+LatencyRecorder keeps one histogram per (method, route, status); testlib records benchmarked
+requests into it and reports it to run_test, which shows it in the step summary.
+"""
+import math
+import threading
+from typing import Dict, List, Optional, Tuple
+
+SUB_BUCKET_BITS = 7
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+PERCENTILES = (50, 90, 99)
+
+
+def _bucket_index(value_us: int) -> int:
+    if value_us < 2 * SUB_BUCKET_COUNT:
+        return value_us
+    shift = value_us.bit_length() - (SUB_BUCKET_BITS + 1)
+    return shift * SUB_BUCKET_COUNT + (value_us >> shift)
+
+
+def _bucket_highest_value(index: int) -> int:
+    """Highest value (in microseconds) that lands in bucket `index`."""
+    if index < 2 * SUB_BUCKET_COUNT:
+        return index
+    shift = index // SUB_BUCKET_COUNT - 1
+    return ((index - shift * SUB_BUCKET_COUNT + 1) << shift) - 1
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.total_ms = 0.0
+        self.min_ms: Optional[float] = None
+        self.max_ms: Optional[float] = None
+
+    def record(self, latency_ms: float) -> None:
+        index = _bucket_index(max(0, int(latency_ms * 1000)))
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total_ms += latency_ms
+        self.min_ms = latency_ms if self.min_ms is None else min(self.min_ms, latency_ms)
+        self.max_ms = latency_ms if self.max_ms is None else max(self.max_ms, latency_ms)
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += other.count
+        self.total_ms += other.total_ms
+        for value in (other.min_ms, other.max_ms):
+            if value is not None:
+                self.min_ms = value if self.min_ms is None else min(self.min_ms, value)
+                self.max_ms = value if self.max_ms is None else max(self.max_ms, value)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        """Latency (ms) that `percentile` percent of the recorded values are at or below."""
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(percentile / 100 * self.count))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(_bucket_highest_value(index) / 1000, self.max_ms)
+        return self.max_ms
+
+    def to_json(self) -> dict:
+        summary = {
+            "count": self.count,
+            "min": self.min_ms,
+            "mean": self.total_ms / self.count if self.count else None,
+            "max": self.max_ms,
+        }
+        for percentile in PERCENTILES:
+            summary[f"p{percentile}"] = self.percentile(percentile)
+        # sparse buckets, so histograms of several runs can be merged later
+        summary["buckets"] = {str(index): count for index, count in sorted(self.buckets.items())}
+        return summary
+
+    @classmethod
+    def from_json(cls, data: dict) -> "LatencyHistogram":
+        histogram = cls()
+        histogram.buckets = {int(index): count for index, count in data.get("buckets", {}).items()}
+        histogram.count = data.get("count", 0)
+        histogram.total_ms = (data.get("mean") or 0) * histogram.count
+        histogram.min_ms = data.get("min")
+        histogram.max_ms = data.get("max")
+        return histogram
+
+
+class LatencyRecorder:
+    """One histogram per (method, route, status); safe to record into from several threads."""
+
+    def __init__(self):
+        self._histograms: Dict[Tuple[str, str, Optional[int]], LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    def record(self, method: str, route: str, status: Optional[int], latency_ms: float) -> None:
+        # the query string would make every request a route of its own
+        key = (method.upper(), route.split("?", 1)[0], status)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = LatencyHistogram()
+            histogram.record(latency_ms)
+
+    def merge_json(self, routes: List[dict]) -> None:
+        """Add histograms recorded elsewhere (the to_json of another recorder), e.g. in another process."""
+        with self._lock:
+            for route in routes:
+                key = (route["method"], route["route"], route["status"])
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = LatencyHistogram()
+                histogram.merge(LatencyHistogram.from_json(route))
+
+    def __len__(self) -> int:
+        return len(self._histograms)
+
+    def to_json(self) -> List[dict]:
+        with self._lock:
+            return [{"method": method, "route": route, "status": status, **histogram.to_json()}
+                    for (method, route, status), histogram in sorted(
+                        self._histograms.items(), key=lambda item: (item[0][0], item[0][1], str(item[0][2])))]
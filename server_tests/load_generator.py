@@ -0,0 +1,217 @@
+"""
+Open-loop load generation, behind TestServer.load().
+
+Requests are sent at a constant arrival rate, independent of how fast the app answers: a slow app
+gets the same offered load as a fast one, and its slowness shows up as latency instead of as a lower
+rate. The load is spread over worker processes (this file run as a script), each sending its share
+of the rate from a pool of threads. Latency is measured from when a request was due, not from when
+a thread got to send it, so queueing in the generator is not hidden.
+
+Requests are given like for burst(): (method, route[, headers[, data]]) tuples or dicts with those
+keys. Each worker cycles through its slice of them, so a seeded list gives a reproducible mix.
+"""
+import json
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+import requests
+
+from latency import LatencyHistogram, LatencyRecorder
+
+DEFAULT_PROCESSES = 2
+# per worker process: requests due while this many are in flight are dropped (and counted)
+DEFAULT_MAX_IN_FLIGHT = 100
+DEFAULT_TIMEOUT_SECONDS = 10
+_STOP_TIMEOUT_SECONDS = 30
+
+
+def _normalize(request) -> dict:
+    if isinstance(request, dict):
+        return {"method": request.get("method", "GET").upper(), "route": request.get("route", "/"),
+                "headers": request.get("headers") or {}, "data": request.get("data")}
+    method, route, headers, data = (tuple(request) + (None, None))[:4]
+    return {"method": method.upper(), "route": route, "headers": headers or {}, "data": data}
+
+
+@dataclass
+class LoadReport:
+    rate: float
+    # seconds the load was offered for
+    elapsed: float = 0.0
+    scheduled: int = 0
+    sent: int = 0
+    # due while max_in_flight requests were still waiting for a response, so not sent
+    dropped: int = 0
+    # sent, but no response (connection refused, reset, timed out)
+    errors: int = 0
+    statuses: Dict[str, int] = field(default_factory=dict)
+    histogram: LatencyHistogram = field(default_factory=LatencyHistogram)
+    # per (method, route, status), see LatencyRecorder.to_json
+    routes: List[dict] = field(default_factory=list)
+
+    @property
+    def responses(self) -> int:
+        return self.sent - self.errors
+
+    @property
+    def achieved_rps(self) -> float:
+        return self.responses / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def error_rate(self) -> float:
+        return self.errors / self.sent if self.sent else 0.0
+
+    def merge(self, worker: dict) -> None:
+        self.elapsed = max(self.elapsed, worker["elapsed"])
+        for counter in ("scheduled", "sent", "dropped", "errors"):
+            setattr(self, counter, getattr(self, counter) + worker[counter])
+        for status, count in worker["statuses"].items():
+            self.statuses[status] = self.statuses.get(status, 0) + count
+        self.histogram.merge(LatencyHistogram.from_json(worker["histogram"]))
+        self.routes += worker["routes"]
+
+    def __str__(self) -> str:
+        latency = " ".join(f"p{p}={self.histogram.percentile(p) or 0:.1f}ms" for p in (50, 90, 99))
+        return (f"Load: {self.rate:.0f} req/s offered for {self.elapsed:.1f}s, {self.sent}/{self.scheduled} sent "
+                f"({self.dropped} dropped), {self.achieved_rps:.1f} responses/s, "
+                f"{self.error_rate:.1%} errors, statuses {self.statuses}, {latency} "
+                f"max={self.histogram.max_ms or 0:.1f}ms")
+
+
+class LoadGenerator:
+    """Offers `rate` requests per second to localhost:`port` until stop(), or for `duration` seconds."""
+
+    def __init__(self, port: int, requests_: Iterable, rate: float, processes: int = DEFAULT_PROCESSES,
+                 duration: Optional[float] = None, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+                 timeout: float = DEFAULT_TIMEOUT_SECONDS, recorder: Optional[LatencyRecorder] = None):
+        requests_ = [_normalize(request) for request in requests_]
+        if not requests_:
+            raise ValueError("LoadGenerator needs at least one request")
+        if rate <= 0 or processes < 1:
+            raise ValueError(f"Invalid load: rate={rate}, processes={processes}")
+        self.rate = rate
+        self.recorder = recorder
+        self.report: Optional[LoadReport] = None
+        processes = min(processes, len(requests_))
+        self._specs = [{
+            "port": port,
+            "requests": requests_[i::processes],
+            "rate": rate / processes,
+            # spread the workers' arrivals over the interval instead of sending in lockstep
+            "phase": i / rate,
+            "duration": duration,
+            "max_in_flight": max_in_flight,
+            "timeout": timeout,
+        } for i in range(processes)]
+        self._workers: List[subprocess.Popen] = []
+
+    def start(self) -> "LoadGenerator":
+        for spec in self._specs:
+            worker = subprocess.Popen([sys.executable, __file__], stdin=subprocess.PIPE,
+                                      stdout=subprocess.PIPE, text=True)
+            worker.stdin.write(json.dumps(spec) + "\n")
+            worker.stdin.flush()
+            self._workers.append(worker)
+        return self
+
+    def stop(self) -> LoadReport:
+        """Stop offering load, wait for the requests in flight and return the combined report."""
+        report = LoadReport(self.rate)
+        for worker in self._workers:
+            try:
+                worker.stdin.write("stop\n")
+                worker.stdin.flush()
+            except OSError:
+                # already done (duration passed)
+                pass
+        for worker in self._workers:
+            try:
+                stdout, _ = worker.communicate(timeout=_STOP_TIMEOUT_SECONDS)
+                report.merge(json.loads(stdout))
+            except (subprocess.TimeoutExpired, ValueError) as e:
+                worker.kill()
+                print(f"Load worker did not report: {e!r}")
+        self._workers = []
+        if self.recorder is not None:
+            self.recorder.merge_json(report.routes)
+        self.report = report
+        return report
+
+    def __enter__(self) -> "LoadGenerator":
+        # TestServer.load() hands out a generator that is already running
+        return self if self._workers else self.start()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.stop()
+
+
+def _run_worker(spec: dict) -> dict:
+    stop = threading.Event()
+
+    def wait_for_stop():
+        # "stop", or EOF when the parent is gone
+        sys.stdin.readline()
+        stop.set()
+
+    threading.Thread(target=wait_for_stop, daemon=True).start()
+
+    base_url = f"http://localhost:{spec['port']}"
+    recorder = LatencyRecorder()
+    histogram = LatencyHistogram()
+    statuses: Dict[str, int] = {}
+    counters = {"scheduled": 0, "sent": 0, "dropped": 0, "errors": 0}
+    lock = threading.Lock()
+    in_flight = threading.BoundedSemaphore(spec["max_in_flight"])
+    local = threading.local()
+
+    def send(request: dict, due: float) -> None:
+        try:
+            if not hasattr(local, "session"):
+                local.session = requests.Session()
+            try:
+                response = local.session.request(
+                    request["method"], base_url + request["route"], headers=request["headers"],
+                    json=request["data"], timeout=spec["timeout"])
+                status = response.status_code
+            except requests.RequestException:
+                status = None
+            latency_ms = (time.perf_counter() - due) * 1000
+            recorder.record(request["method"], request["route"], status, latency_ms)
+            with lock:
+                if status is None:
+                    counters["errors"] += 1
+                else:
+                    statuses[str(status)] = statuses.get(str(status), 0) + 1
+                    histogram.record(latency_ms)
+        finally:
+            in_flight.release()
+
+    interval = 1 / spec["rate"]
+    duration = spec["duration"]
+    start = time.perf_counter() + spec["phase"]
+    with ThreadPoolExecutor(max_workers=spec["max_in_flight"]) as executor:
+        for index in range(sys.maxsize):
+            due = start + index * interval
+            if duration is not None and due - start >= duration:
+                break
+            if stop.wait(max(0.0, due - time.perf_counter())):
+                break
+            counters["scheduled"] += 1
+            if not in_flight.acquire(blocking=False):
+                counters["dropped"] += 1
+                continue
+            counters["sent"] += 1
+            executor.submit(send, spec["requests"][index % len(spec["requests"])], due)
+        elapsed = max(0.0, time.perf_counter() - start)
+
+    return {**counters, "elapsed": elapsed, "statuses": statuses,
+            "histogram": histogram.to_json(), "routes": recorder.to_json()}
+
+
+if __name__ == "__main__":
+    print(json.dumps(_run_worker(json.loads(sys.stdin.readline()))))
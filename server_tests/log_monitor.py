@@ -0,0 +1,89 @@
+"""
+Follows a test container's logs while the test runs.
+
+Lines are kept in a bounded buffer (and appended to a log file the test process can read),
+and every line is matched against crash signatures as it arrives, so a crashed agent is
+noticed right away instead of after the test times out.
+"""
+import collections
+import threading
+from typing import Callable, List, Optional
+
+from docker_api import get_docker
+from summary import get_logger
+
+logger = get_logger()
+
+CRASH_SIGNATURES = ("Segmentation fault", "core dumped")
+DEFAULT_MAX_LINES = 10000
+
+
+class LogMonitor:
+    def __init__(self, container_name: str, log_file: Optional[str] = None, max_lines: int = DEFAULT_MAX_LINES,
+                 since: Optional[float] = None):
+        self.container_name = container_name
+        self.log_file = log_file
+        # unix time to follow from, for a container that already ran another test
+        self.since = since
+        self.crash_line: Optional[str] = None
+        self.crashed = threading.Event()
+        self._lines = collections.deque(maxlen=max_lines)
+        self._lock = threading.Lock()
+        self._on_crash: List[Callable[[str], None]] = []
+        self._stream = None
+        self._thread = threading.Thread(
+            target=self._follow, name=f"logs-{container_name}", daemon=True)
+
+    def start(self) -> "LogMonitor":
+        self._stream = get_docker().follow_logs(self.container_name, self.since)
+        self._thread.start()
+        return self
+
+    def on_crash(self, callback: Callable[[str], None]) -> None:
+        """Call `callback(line)` once when a crash signature shows up (right away if it already did)."""
+        with self._lock:
+            if self.crash_line is None:
+                self._on_crash.append(callback)
+                return
+        callback(self.crash_line)
+
+    def _follow(self) -> None:
+        log_file = open(self.log_file, "w", encoding="utf-8") if self.log_file else None
+        try:
+            for line in self._stream:
+                with self._lock:
+                    self._lines.append(line)
+                if log_file:
+                    log_file.write(line + "\n")
+                    log_file.flush()
+                if self.crash_line is None and any(signature in line for signature in CRASH_SIGNATURES):
+                    self._crash(line)
+        except Exception as e:
+            logger.error(f"Error following logs of {self.container_name}: {e}")
+        finally:
+            if log_file:
+                log_file.close()
+
+    def _crash(self, line: str) -> None:
+        with self._lock:
+            self.crash_line = line
+            callbacks, self._on_crash = self._on_crash, []
+        logger.error(f"{self.container_name}: crash detected in logs: {line}")
+        for callback in callbacks:
+            try:
+                callback(line)
+            except Exception as e:
+                logger.error(f"Error in crash callback for {self.container_name}: {e}")
+        self.crashed.set()
+
+    def text(self) -> str:
+        """The buffered log lines (the last `max_lines` of them)."""
+        with self._lock:
+            return "\n".join(self._lines)
+
+    def stop(self, timeout_seconds: float = 5) -> None:
+        """Stop following and wait for the lines already received to be processed."""
+        if self._stream is not None:
+            self._stream.close()
+        if self._thread.is_alive():
+            self._thread.join(timeout_seconds)
@@ -0,0 +1,69 @@
+"""
+Merge the results files of several run_test shards (--shard i/n --results_file ...) into one
+GitHub step summary, and optionally one combined results file.
+
+    python merge_results.py --results "results/*.json" [--results_file merged.json]
+"""
+import argparse
+import glob
+import sys
+from typing import List
+
+from summary import (TestResult, get_logger, load_results_file, report_and_exit,
+                     write_results_file, write_summary_to_github_step_summary)
+
+logger = get_logger()
+
+
+def find_results_files(patterns: str) -> List[str]:
+    """Expand a comma or newline separated list of paths / glob patterns, in a stable order."""
+    files = []
+    for pattern in patterns.replace("\n", ",").split(","):
+        pattern = pattern.strip()
+        if not pattern:
+            continue
+        matches = sorted(glob.glob(pattern)) or [pattern]
+        files.extend(f for f in matches if f not in files)
+    return files
+
+
+def merge_results(patterns: str, results_file: str = "", ignore_failures: str = "false"):
+    files = find_results_files(patterns)
+    if not files:
+        logger.error("No results files to merge")
+        sys.exit(1)
+
+    test_results: List[TestResult] = []
+    seen = set()
+    # the shards build their images in parallel, so the slowest one is what the matrix waited for
+    build_duration = 0.0
+    for path in files:
+        try:
+            results = load_results_file(path)
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Could not read results file {path}: {e}")
+            sys.exit(1)
+        build_duration = max(build_duration, results.get("build_duration") or 0.0)
+        for result in results["tests"]:
+            if result.test_dir in seen:
+                logger.warning(f"{result.test_dir} appears in more than one results file, keeping the first")
+                continue
+            seen.add(result.test_dir)
+            test_results.append(result)
+        logger.info(f"Merged {len(results['tests'])} test(s) from {path}")
+
+    write_results_file(results_file, test_results, build_duration)
+    write_summary_to_github_step_summary(test_results)
+    report_and_exit(test_results, ignore_failures)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--results", type=str, required=True)
+    parser.add_argument("--results_file", type=str,
+                        required=False, default="")
+    parser.add_argument("--ignore_failures", type=str,
+                        required=False, default="false")
+
+    args = parser.parse_args()
+    merge_results(args.results, args.results_file, args.ignore_failures)
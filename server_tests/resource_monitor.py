@@ -0,0 +1,112 @@
+"""
+Samples a test container's resource usage while the test runs.
+
+ResourceSampler polls the Docker stats of the container (memory, CPU, pids, network) from a
+background thread every `interval` seconds and, optionally, counts the open file descriptors of all
+processes in the container through `docker exec`. run_test keeps the peaks of every test (see
+summarize) and the soak mode fits the memory growth over the samples.
+"""
+import threading
+import time
+from typing import List, Optional
+
+from docker_api import get_docker
+from summary import get_logger
+
+logger = get_logger()
+
+# counts the entries of /proc/<pid>/fd of every process (including this shell's own few)
+_COUNT_FDS_COMMAND = ["sh", "-c", 'for d in /proc/[0-9]*/fd; do ls "$d"; done 2>/dev/null | wc -l']
+
+
+class ResourceSampler:
+    def __init__(self, container_name: str, interval: float, count_fds: bool = False):
+        self.container_name = container_name
+        self.interval = interval
+        self.count_fds = count_fds
+        self.samples: List[dict] = []
+        self._stop = threading.Event()
+        self._start = time.monotonic()
+        self._thread = threading.Thread(
+            target=self._run, name=f"resources-{container_name}", daemon=True)
+
+    def start(self) -> "ResourceSampler":
+        self._start = time.monotonic()
+        self._thread.start()
+        return self
+
+    def stop(self) -> List[dict]:
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+    def _open_fds(self) -> Optional[int]:
+        try:
+            exit_code, output = get_docker().exec_run(
+                self.container_name, _COUNT_FDS_COMMAND)
+            return int(output.strip()) if exit_code == 0 else None
+        except Exception as e:
+            logger.debug(f"{self.container_name}: could not count open fds: {e}")
+            return None
+
+    def sample(self) -> Optional[dict]:
+        try:
+            stats = get_docker().stats(self.container_name)
+        except Exception as e:
+            logger.debug(f"{self.container_name}: could not read stats: {e}")
+            return None
+        if stats is None:
+            return None
+        sample = {"time": round(time.monotonic() - self._start, 2), **stats}
+        if self.count_fds:
+            sample["open_fds"] = self._open_fds()
+        return sample
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            started = time.monotonic()
+            sample = self.sample()
+            if sample is not None:
+                self.samples.append(sample)
+            self._stop.wait(max(0.0, self.interval - (time.monotonic() - started)))
+
+
+def _peak(samples: List[dict], key: str):
+    values = [s[key] for s in samples if s.get(key) is not None]
+    return max(values) if values else None
+
+
+def _used(samples: List[dict], key: str):
+    # counters that only go up: what the container used between the first and the last sample
+    values = [s[key] for s in samples if s.get(key) is not None]
+    return values[-1] - values[0] if values else None
+
+
+def summarize(samples: List[dict]) -> Optional[dict]:
+    """Peaks of the samples, and the CPU time and network traffic between the first and last one."""
+    if not samples:
+        return None
+    return {
+        "samples": len(samples),
+        "cpu_seconds": _used(samples, "cpu_seconds"),
+        "cpu_peak": _peak(samples, "cpu_percent"),
+        "memory_peak": _peak(samples, "memory"),
+        "net_rx": _used(samples, "net_rx"),
+        "net_tx": _used(samples, "net_tx"),
+        "pids_peak": _peak(samples, "pids"),
+    }
+
+
+def slope_per_hour(samples: List[dict], key: str, skip_seconds: float = 0) -> Optional[float]:
+    """Least-squares slope of samples[key] over time, per hour, leaving out the first `skip_seconds`."""
+    points = [(s["time"], s[key]) for s in samples
+              if s["time"] >= skip_seconds and s.get(key) is not None]
+    if len(points) < 2:
+        return None
+    mean_t = sum(t for t, _ in points) / len(points)
+    mean_v = sum(v for _, v in points) / len(points)
+    variance = sum((t - mean_t) ** 2 for t, _ in points)
+    if variance == 0:
+        return None
+    covariance = sum((t - mean_t) * (v - mean_v) for t, v in points)
+    return covariance / variance * 3600
@@ -0,0 +1,94 @@
+"""
+JSON-lines result records sent from a running test.py to run_test.
+
+run_test opens a ResultReader per test and passes its address to the test in ZEN_TEST_RESULTS_ADDRESS.
+testlib reports through ResultWriter: one record per failed soft assertion (with its test.py lines, the
+test function it ran in and the time since the test started; passed ones too if the AssertionCollector
+asks for it), and one record for an uncaught exception. run_test consumes the records while the test
+runs and builds the failure report from them, instead of scraping the test's stderr.
+
+The channel is a loopback TCP socket rather than a pipe inherited through pass_fds: subprocess.Popen
+does not support pass_fds on Windows, and tests run in forkserver workers (worker_pool) are forked
+from a process that never had the pipe, while an address in the environment works for both.
+"""
+import json
+import os
+import socket
+import threading
+import time
+from typing import List, Optional
+
+RESULTS_ADDRESS_ENV = "ZEN_TEST_RESULTS_ADDRESS"
+
+
+class ResultWriter:
+    """Test side. Does nothing when the test was not started by run_test."""
+
+    def __init__(self, address: Optional[str] = None):
+        self._start = time.monotonic()
+        self._lock = threading.Lock()
+        self._file = None
+        address = address or os.environ.get(RESULTS_ADDRESS_ENV)
+        if address:
+            host, _, port = address.rpartition(":")
+            try:
+                self._file = socket.create_connection(
+                    (host, int(port)), timeout=10).makefile("w", encoding="utf-8")
+            except OSError:
+                self._file = None
+
+    def report(self, record_type: str, **fields) -> None:
+        if self._file is None:
+            return
+        record = {"type": record_type, "time": round(
+            time.monotonic() - self._start, 4), **fields}
+        with self._lock:
+            try:
+                self._file.write(json.dumps(record) + "\n")
+                self._file.flush()
+            except OSError:
+                self._file = None
+
+
+class ResultReader:
+    """run_test side: accepts the test's connection and collects its records as they arrive."""
+
+    def __init__(self):
+        self._server = socket.create_server(("127.0.0.1", 0))
+        self.address = f"127.0.0.1:{self._server.getsockname()[1]}"
+        self.records: List[dict] = []
+        self._connected = threading.Event()
+        self._thread = threading.Thread(target=self._read, daemon=True)
+        self._thread.start()
+
+    def _read(self) -> None:
+        try:
+            conn, _ = self._server.accept()
+        except OSError:
+            # closed before the test connected
+            return
+        self._connected.set()
+        with conn, conn.makefile("r", encoding="utf-8") as lines:
+            for line in lines:
+                try:
+                    self.records.append(json.loads(line))
+                except ValueError:
+                    continue
+
+    def close(self, timeout_seconds: float = 5) -> None:
+        """Wait for the records the test already sent (the test has exited), then stop listening."""
+        if self._connected.is_set():
+            self._thread.join(timeout_seconds)
+        try:
+            # wakes up a pending accept()
+            self._server.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._server.close()
+
+    def failed_assertions(self) -> List[dict]:
+        return [r for r in self.records if r["type"] == "assertion" and not r["passed"]]
+
+    def error(self) -> Optional[dict]:
+        errors = [r for r in self.records if r["type"] == "error"]
+        return errors[-1] if errors else None
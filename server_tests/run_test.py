@@ -1,80 +1,71 @@
-import logging
-import sys
 import argparse
 import traceback
 import requests
 import os
 from core_api import CoreApi
+from docker_api import get_docker
+from log_monitor import LogMonitor
+from db_pool import DatabasePool
+from container_reuse import ContainerReuse, ReusableContainer, start_profile_hash
+from worker_pool import PopenTestProcess, TestWorkerPool, forkserver_supported
+from result_protocol import RESULTS_ADDRESS_ENV, ResultReader
+from resource_monitor import ResourceSampler, summarize
+from soak import SoakConfig, analyze_soak, soak_failure
+from summary import (TestResult, TestStatus, get_logger, report_and_exit,
+                     write_results_file, write_summary_to_github_step_summary)
 import json
 import subprocess
 import time
 import concurrent.futures
-from dataclasses import dataclass
-from typing import List, Optional
+import threading
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
-from enum import Enum
 import shlex
 import re
-import io
-import html
+import tempfile
+import contextlib
+import hashlib
+import fnmatch
 
 CORE_URL = "http://localhost:3000"
 DOCKER_IMAGE_NAME = "firewall-tester-action-docker-image"
-
-
-class GitHubActionsFormatter(logging.Formatter):
-    def format(self, record):
-        level = record.levelname.lower()
-        message = super().format(record)
-
-        if record.levelno == logging.ERROR:
-            return f"::error::{message}"
-        elif record.levelno == logging.WARNING:
-            return f"::warning::{message}"
-        elif record.levelno == logging.INFO:
-            return f"{message}"
-        elif record.levelno == logging.DEBUG:
-            return f"::debug::{message}"
-        else:
-            return message
-
-
-def get_logger(name: str = "github_actions_logger") -> logging.Logger:
-    sys.stdout.reconfigure(encoding='utf-8')
-    logger = logging.getLogger(name)
-    if not logger.hasHandlers():
-        handler = logging.StreamHandler(sys.stdout)
-        formatter = GitHubActionsFormatter(
-            "%(asctime)s - %(levelname)s - %(message)s")
-        handler.setFormatter(formatter)
-        logger.addHandler(handler)
-        logger.setLevel(logging.DEBUG)
-    return logger
+DEFAULT_DURATIONS_FILE = os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), ".test_durations.json")
+# Used for scheduling tests that have no recorded duration yet (seconds)
+DEFAULT_TEST_DURATION_ESTIMATE = 120
+STATIC_TEST_DURATION_ESTIMATES = {
+    "test_wave_attack": 600,
+    "test_outbound_domain_blocking": 600,
+}
+# Seconds between samples of a test container's resource usage (a Docker stats call itself takes ~1s)
+RESOURCE_SAMPLE_INTERVAL_SECONDS = 2
+# Soak mode (test_type soak): seconds each soak test runs, allowed memory growth (MiB per hour)
+DEFAULT_SOAK_DURATION = 600
+DEFAULT_SOAK_MAX_MEMORY_SLOPE = 50.0
+SOAK_SAMPLES = 60
+# on top of the soak duration: container readiness and the test's own checks
+SOAK_TIMEOUT_MARGIN_SECONDS = 300
 
 
 logger = get_logger()
 
 
-def run_process_with_retries(*args, attempts: int = 3, retry_delay_seconds: int = 10, **kwargs):
+def call_with_retries(fn, *args, attempts: int = 3, retry_delay_seconds: int = 10, **kwargs):
     for attempt in range(1, attempts + 1):
         try:
-            return subprocess.run(*args, **kwargs)
-        except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as error:
+            return fn(*args, **kwargs)
+        except Exception as error:
             logger.warning(
-                f"Command failed (attempt {attempt}/{attempts}): {error}. "
+                f"Docker call failed (attempt {attempt}/{attempts}): {error}. "
                 f"Retrying in {retry_delay_seconds} seconds..."
             )
             time.sleep(retry_delay_seconds)
-    raise RuntimeError(f"Command failed after {attempts} attempts")
+    raise RuntimeError(f"Docker call failed after {attempts} attempts")
+
 
+docker = get_docker()
 
-DOCKER_OSTYPE = run_process_with_retries(
-    ["docker", "info", "--format", "{{.OSType}}"],
-    capture_output=True,
-    text=True,
-    check=True,
-    timeout=30,
-).stdout.strip().lower()
+DOCKER_OSTYPE = call_with_retries(docker.info)["OSType"].strip().lower()
 
 if DOCKER_OSTYPE == "linux":
     POSTGRES_IMAGE = "postgres"
@@ -89,16 +80,8 @@ def get_docker_host_ip() -> str:
     # Covers all local scenarios (linux, macos, windows)
     network_name = "bridge" if DOCKER_OSTYPE == "linux" else "nat"
 
-    result = run_process_with_retries(
-        ["docker", "network", "inspect", network_name],
-        capture_output=True,
-        text=True,
-        check=True,
-        timeout=30,
-    )
-
-    networks = json.loads(result.stdout)
-    ipam_configs = networks[0].get("IPAM", {}).get("Config", [])
+    network = call_with_retries(docker.inspect_network, network_name)
+    ipam_configs = network.get("IPAM", {}).get("Config", [])
     gateway = ipam_configs[0].get("Gateway")
 
     if not gateway:
@@ -112,27 +95,26 @@ DOCKER_HOST_IP = get_docker_host_ip()
 
 
 def start_postgres() -> None:
-    docker_args = ["docker", "run", "--rm", "--name", "postgres",
-                   "-e", f"POSTGRES_USER={POSTGRES_USER}", "-e", f"POSTGRES_PASSWORD={POSTGRES_PASSWORD}",
-                   "-e", "POSTGRES_DB=mydb", "-p", "5432:5432", "-d", POSTGRES_IMAGE]
-
-    subprocess.run(docker_args, check=True)
+    docker.run_container("postgres", POSTGRES_IMAGE,
+                         env=[f"POSTGRES_USER={POSTGRES_USER}", f"POSTGRES_PASSWORD={POSTGRES_PASSWORD}",
+                              "POSTGRES_DB=mydb"],
+                         ports={5432: 5432}, auto_remove=True)
     logger.info("Started Postgres container")
     wait_for_postgres_ready()
 
 
 def wait_for_postgres_ready(timeout_seconds: int = 180) -> None:
-    ready_command = ["docker", "exec", "postgres", "pg_isready", "-U", POSTGRES_USER, "-h", "127.0.0.1", "-p", "5432"]
+    ready_command = ["pg_isready", "-U", POSTGRES_USER, "-h", "127.0.0.1", "-p", "5432"]
 
     deadline = time.time() + timeout_seconds
     while time.time() < deadline:
-        result = subprocess.run(
-            ready_command,
-            capture_output=True,
-            text=True,
-        )
-        if result.returncode == 0:
-            return
+        try:
+            exit_code, _ = docker.exec_run("postgres", ready_command)
+            if exit_code == 0:
+                return
+        except Exception:
+            # the container may not accept exec requests yet
+            pass
         time.sleep(1)
 
     raise RuntimeError(
@@ -141,41 +123,16 @@ def wait_for_postgres_ready(timeout_seconds: int = 180) -> None:
 
 
 def stop_postgres() -> None:
-    subprocess.run(
-        ["docker", "stop", "postgres"],
-        check=False,
-        capture_output=False,
-    )
-
-
-def wait_for_running_container(container_name: str, timeout_seconds: int = 20) -> None:
-    deadline = time.time() + timeout_seconds
-    while time.time() < deadline:
-        result = subprocess.run(
-            ["docker", "inspect", "-f", "{{.State.Running}}", container_name],
-            capture_output=True,
-            text=True,
-        )
-        if result.returncode == 0 and result.stdout.strip().lower() == "true":
-            return
-        time.sleep(1)
-    raise RuntimeError(
-        f"Container {container_name} did not start after {timeout_seconds} seconds"
-    )
+    docker.stop_container("postgres")
 
 
 def get_running_container_ip(container_name: str, timeout_seconds: int = 20) -> str:
-    wait_for_running_container(container_name, timeout_seconds=timeout_seconds)
+    docker.wait_for_running(container_name, timeout_seconds=timeout_seconds)
 
     deadline = time.time() + timeout_seconds
     while time.time() < deadline:
-        result = subprocess.run(
-            ["docker", "inspect", "-f", "{{range .NetworkSettings.Networks}}{{.IPAddress}}{{end}}", container_name],
-            capture_output=True,
-            text=True,
-        )
-        ip_address = result.stdout.strip()
-        if result.returncode == 0 and ip_address:
+        ip_address = docker.container_ip(container_name)
+        if ip_address:
             return ip_address
         time.sleep(1)
 
@@ -183,33 +140,185 @@ def get_running_container_ip(container_name: str, timeout_seconds: int = 20) ->
         f"Could not determine IP address for container {container_name}"
     )
 
+def wait_for_app_ready(port: int, timeout_seconds: float, abort: Optional[threading.Event] = None) -> bool:
+    """
+    Poll the mapped port with exponential backoff until the app answers with any HTTP response.
+    Gives up early once `abort` is set.
+    """
+    deadline = time.monotonic() + timeout_seconds
+    delay = 0.1
+    abort = abort or threading.Event()
+    while not abort.is_set():
+        try:
+            requests.get(f"http://localhost:{port}/", timeout=5)
+            return True
+        except requests.RequestException:
+            pass
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        abort.wait(min(delay, remaining))
+        delay = min(delay * 2, 2)
+    return False
+
+
+def start_database_pool() -> Optional[DatabasePool]:
+    """
+    Connect to the postgres container and prepare the template test databases are copied from.
+    Returns None if that fails; test databases are then created with createdb in the container.
+    """
+    db_pool = DatabasePool("127.0.0.1", 5432, POSTGRES_USER, POSTGRES_PASSWORD, "postgres")
+    try:
+        db_pool.start()
+        return db_pool
+    except Exception as e:
+        logger.warning(
+            f"Could not connect to postgres, falling back to createdb: {e}")
+        db_pool.close()
+        return None
+
+
 def create_test_database(test_dir: str) -> None:
-    create_database_command = ["docker", "exec", "-e", f"PGPASSWORD={POSTGRES_PASSWORD}", "postgres", "createdb",
-                               "-w", "-h", "127.0.0.1", "-p", "5432", "-U", POSTGRES_USER, test_dir]
-    subprocess.run(create_database_command, check=True)
-
-class TestStatus(Enum):
-    PASSED = "PASSED"
-    FAILED = "FAILED"
-    SKIPPED = "SKIPPED"
-    TIMEOUT = "TIMEOUT"
-
-
-@dataclass
-class TestResult:
-    test_dir: str
-    start_time: datetime
-    end_time: Optional[datetime] = None
-    status: TestStatus = TestStatus.FAILED
-    error_message: Optional[str] = None
-    duration: Optional[float] = None
-    failed_assertions: Optional[List[str]] = None
-
-    def complete(self, status: TestStatus, error_message: Optional[str] = None):
-        self.end_time = datetime.now()
-        self.status = status
-        self.error_message = error_message
-        self.duration = (self.end_time - self.start_time).total_seconds()
+    create_database_command = ["createdb", "-w", "-h", "127.0.0.1",
+                               "-p", "5432", "-U", POSTGRES_USER, test_dir]
+    exit_code, output = docker.exec_run("postgres", create_database_command,
+                                        env=[f"PGPASSWORD={POSTGRES_PASSWORD}"])
+    if exit_code != 0:
+        raise RuntimeError(
+            f"createdb {test_dir} failed with exit code {exit_code}: {output}")
+
+
+@contextlib.contextmanager
+def timed_phase(phases: Dict[str, float], phase: str):
+    """Add the time spent in the with-block to phases[phase]."""
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        phases[phase] = phases.get(phase, 0) + time.monotonic() - start
+
+
+def parse_env_file(env_file_path: str) -> List[str]:
+    """Read a docker --env-file: KEY=VALUE lines, # comments, bare KEY is taken from our environment."""
+    env = []
+    with open(env_file_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.lstrip().rstrip("\r\n")
+            if not line or line.startswith("#"):
+                continue
+            if "=" in line:
+                env.append(line)
+            elif line in os.environ:
+                env.append(f"{line}={os.environ[line]}")
+    return env
+
+
+def build_container_env(extra_args: str, env_file_path: str, extra_envs: dict) -> List[str]:
+    """
+    Environment for the test container, with the same precedence as the docker CLI gives
+    `docker run <extra_args> --env-file <test.env> --env K=V...`: env files first, then -e/--env flags.
+    """
+    env_files = []
+    flags = []
+    args = shlex.split(sanitize_extra_run_args(extra_args))
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if "=" in arg and arg.startswith("-"):
+            name, value = arg.split("=", 1)
+        else:
+            name, value = arg, args[i + 1]
+            i += 1
+        if name == "--env-file":
+            env_files.append(value)
+        elif "=" in value:
+            flags.append(value)
+        elif value in os.environ:
+            flags.append(f"{value}={os.environ[value]}")
+        i += 1
+    if os.path.exists(env_file_path):
+        env_files.append(env_file_path)
+    flags += [f"{key}={value}" for key, value in extra_envs.items()]
+
+    merged = {}
+    for env_file in env_files:
+        for entry in parse_env_file(env_file):
+            key, _, value = entry.partition("=")
+            merged[key] = value
+    for entry in flags:
+        key, _, value = entry.partition("=")
+        merged[key] = value
+    return [f"{key}={value}" for key, value in merged.items()]
+
+
+def load_test_durations(durations_file: str) -> dict:
+    try:
+        with open(durations_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_test_durations(durations_file: str, test_results: List[TestResult]) -> None:
+    """Merge the durations of this run into the history file (moving average per test)."""
+    durations = load_test_durations(durations_file)
+    for result in test_results:
+        if result.status == TestStatus.SKIPPED or result.duration is None:
+            continue
+        previous = durations.get(result.test_dir)
+        durations[result.test_dir] = result.duration if previous is None else (
+            previous + result.duration) / 2
+    try:
+        tmp_file = f"{durations_file}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(durations, f, indent=2, sort_keys=True)
+        os.replace(tmp_file, durations_file)
+    except OSError as e:
+        logger.warning(f"Could not save test durations to {durations_file}: {e}")
+
+
+def estimate_test_duration(test_dir: str, durations: dict) -> float:
+    if test_dir in durations:
+        return durations[test_dir]
+    return STATIC_TEST_DURATION_ESTIMATES.get(test_dir, DEFAULT_TEST_DURATION_ESTIMATE)
+
+
+def parse_shard(shard: str) -> Optional[Tuple[int, int]]:
+    """Parse "i/n" (1-based) into (i, n); an empty string means no sharding."""
+    if not shard:
+        return None
+    match = re.fullmatch(r"\s*(\d+)\s*/\s*(\d+)\s*", shard)
+    if not match:
+        raise ValueError(f"Invalid shard '{shard}', expected 'i/n' (e.g. '1/4')")
+    index, count = int(match.group(1)), int(match.group(2))
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"Invalid shard '{shard}', i must be between 1 and n")
+    return index, count
+
+
+def shard_test_dirs(test_dirs: List[str], shard: Tuple[int, int], durations: dict, tests_to_skip: set) -> List[str]:
+    """
+    The tests of shard i out of n. Tests are handed out longest first to the shard with the least
+    estimated time so far, so every runner computes the same partition as long as they all see the
+    same test directories and the same durations file. Skipped tests weigh nothing but are still
+    assigned to one shard, so they appear once in the merged results.
+    """
+    index, count = shard
+    loads = [0.0] * count
+    assigned: List[List[str]] = [[] for _ in range(count)]
+
+    def weight(test_dir: str) -> float:
+        return 0.0 if test_dir in tests_to_skip else estimate_test_duration(test_dir, durations)
+
+    for test_dir in sorted(test_dirs, key=lambda d: (-weight(d), d)):
+        target = min(range(count), key=lambda s: (loads[s], s))
+        loads[target] += weight(test_dir)
+        assigned[target].append(test_dir)
+
+    logger.info(
+        f"Shard {index}/{count}: {len(assigned[index - 1])} of {len(test_dirs)} tests, "
+        f"~{loads[index - 1]:.0f}s estimated (shards: {', '.join(f'{load:.0f}s' for load in loads)})")
+    return assigned[index - 1]
 
 
 def sanitize_extra_run_args(extra_args: str):
@@ -256,207 +365,433 @@ def sanitize_extra_run_args(extra_args: str):
     return " ".join(result)
 
 
-def run_test(test_dir: str, token: str, dockerfile_path: str, start_port: int, config_update_delay: int, test_timeout: int, extra_args: str, app_port: int, sleep_before_test: int, control_port: int, docker_postgres_host: str) -> TestResult:
-    result = TestResult(test_dir=test_dir, start_time=datetime.now())
-    try:
-        # 1. if start_config.json and start_firewall.json exists, apply them
-        core_api = CoreApi(token=token, core_url=CORE_URL, test_name=test_dir,
-                           config_update_delay=1)
-        if os.path.exists(os.path.join(os.path.dirname(os.path.abspath(__file__)), test_dir, "start_config.json")):
-            with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), test_dir, "start_config.json"), "r", encoding="utf-8") as f:
-                try:
-                    config = json.load(f)
-                    r = core_api.update_runtime_config_json(config)
-                except Exception as e:
-                    logger.error(
-                        f"Error applying start_config.json: {e} \n{traceback.format_exc()}")
-                    raise Exception(
-                        f"Error applying start_config.json: {e} \n{traceback.format_exc()}")
-
-        if os.path.exists(os.path.join(os.path.dirname(os.path.abspath(__file__)), test_dir, "start_firewall.json")):
-            with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), test_dir, "start_firewall.json"), "r", encoding="utf-8") as f:
-                try:
-                    config = json.load(f)
-                    r = core_api.update_runtime_firewall_json(config)
-                except Exception as e:
-                    logger.error(
-                        f"Error applying start_firewall.json: {e} \n{traceback.format_exc()}")
-                    raise Exception(
-                        f"Error applying start_firewall.json: {e} \n{traceback.format_exc()}")
-
-        # 2. run the Docker container
-        create_test_database(test_dir)
-        time.sleep(1)
-
-        extra_envs = {
-            "AIKIDO_TOKEN": token,
-            "PORT": app_port,
-            "DATABASE_URL": f"postgres://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{docker_postgres_host}:5432/{test_dir}?sslmode=disable",
-            "AIKIDO_ENDPOINT": f"http://{DOCKER_HOST_IP}:3000",
-            "AIKIDO_REALTIME_ENDPOINT": f"http://{DOCKER_HOST_IP}:3000",
-            "AIKIDO_URL": f"http://{DOCKER_HOST_IP}:3000",
-            "AIKIDO_REALTIME_URL": f"http://{DOCKER_HOST_IP}:3000",
-        }
-        env_file_path = os.path.join(os.path.dirname(
-            os.path.abspath(__file__)), test_dir, 'test.env')
-        if os.path.exists(env_file_path):
-            # remove from extra_envs env that are already in the file
-            with open(env_file_path, "r") as f:
-                content = f.read()
-            keys_to_remove = [
-                env for env in extra_envs if f"{env}=" in content]
-            for env in keys_to_remove:
-                del extra_envs[env]
-
-        command = (
-            f"docker run -d "
-            f"{sanitize_extra_run_args(extra_args)} "
-            f"--env-file {env_file_path} "
-            f"--name {test_dir} "
-            f"-p {start_port}:{app_port} "
-        )
+def prepare_test(test_dir: str, token: str, start_port: int, extra_args: str, app_port: int, control_port: int, docker_postgres_host: str, db_pool: Optional[DatabasePool] = None) -> Dict[str, float]:
+    """
+    Apply the start config, create the database and start the container for a test.
+    Returns the time spent in each of these phases.
+    """
+    phases = {}
+    with timed_phase(phases, "config"):
+        apply_start_config(test_dir, token)
+    with timed_phase(phases, "createdb"):
+        if db_pool:
+            db_pool.acquire(test_dir)
+        else:
+            create_test_database(test_dir)
+    with timed_phase(phases, "docker_run"):
+        start_test_container(test_dir, token, start_port,
+                             extra_args, app_port, control_port, docker_postgres_host)
+    return phases
+
+
+def apply_start_config(test_dir: str, token: str, config_update_delay: int = 0) -> None:
+    # 1. if start_config.json and start_firewall.json exists, apply them
+    # for a new container no agent is running yet, so there is nothing to wait for: it fetches the start config on boot
+    core_api = CoreApi(token=token, core_url=CORE_URL, test_name=test_dir,
+                       config_update_delay=config_update_delay)
+    if os.path.exists(os.path.join(os.path.dirname(os.path.abspath(__file__)), test_dir, "start_config.json")):
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), test_dir, "start_config.json"), "r", encoding="utf-8") as f:
+            try:
+                config = json.load(f)
+                r = core_api.update_runtime_config_json(config)
+            except Exception as e:
+                logger.error(
+                    f"Error applying start_config.json: {e} \n{traceback.format_exc()}")
+                raise Exception(
+                    f"Error applying start_config.json: {e} \n{traceback.format_exc()}")
 
-        if control_port:
-            command += f" -p {control_port}:8081 "
+    if os.path.exists(os.path.join(os.path.dirname(os.path.abspath(__file__)), test_dir, "start_firewall.json")):
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), test_dir, "start_firewall.json"), "r", encoding="utf-8") as f:
+            try:
+                config = json.load(f)
+                r = core_api.update_runtime_firewall_json(config)
+            except Exception as e:
+                logger.error(
+                    f"Error applying start_firewall.json: {e} \n{traceback.format_exc()}")
+                raise Exception(
+                    f"Error applying start_firewall.json: {e} \n{traceback.format_exc()}")
+
+
+def start_test_container(test_dir: str, token: str, start_port: int, extra_args: str, app_port: int, control_port: int, docker_postgres_host: str) -> None:
+    # 2. run the Docker container
+    extra_envs = {
+        "AIKIDO_TOKEN": token,
+        "PORT": app_port,
+        "DATABASE_URL": f"postgres://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{docker_postgres_host}:5432/{test_dir}?sslmode=disable",
+        "AIKIDO_ENDPOINT": f"http://{DOCKER_HOST_IP}:3000",
+        "AIKIDO_REALTIME_ENDPOINT": f"http://{DOCKER_HOST_IP}:3000",
+        "AIKIDO_URL": f"http://{DOCKER_HOST_IP}:3000",
+        "AIKIDO_REALTIME_URL": f"http://{DOCKER_HOST_IP}:3000",
+    }
+    env_file_path = os.path.join(os.path.dirname(
+        os.path.abspath(__file__)), test_dir, 'test.env')
+    if os.path.exists(env_file_path):
+        # remove from extra_envs env that are already in the file
+        with open(env_file_path, "r") as f:
+            content = f.read()
+        keys_to_remove = [
+            env for env in extra_envs if f"{env}=" in content]
+        for env in keys_to_remove:
+            del extra_envs[env]
+
+    ports = {app_port: start_port}
+    if control_port:
+        ports[8081] = control_port
+
+    logger.debug(
+        f"Running Docker container {test_dir} from {DOCKER_IMAGE_NAME} with ports {ports}")
+    docker.run_container(test_dir, DOCKER_IMAGE_NAME,
+                         env=build_container_env(
+                             extra_args, env_file_path, extra_envs),
+                         ports=ports)
+
+
+def reset_reused_container(test_dir: str, container: ReusableContainer, config_update_delay: int) -> Dict[str, float]:
+    """
+    Prepare a container that already passed a test with the same start profile for `test_dir`:
+    the app behind its token starts over in the core mock, the app is restarted through the control
+    server when there is one, and the agent has to fetch the start config again.
+    """
+    phases = {}
+    with timed_phase(phases, "config"):
+        core_api = CoreApi(token=container.token, core_url=CORE_URL, test_name=test_dir,
+                           config_update_delay=config_update_delay)
+        rotated = core_api.rotate_app()
+        if container.control_port:
+            response = requests.post(
+                f"http://localhost:{container.control_port}/restart", timeout=60)
+            response.raise_for_status()
+        apply_start_config(test_dir, container.token, config_update_delay)
+        # without a start_config.json nothing above waited for the agent to pick up the fresh app
+        if not core_api.wait_for_config_applied(rotated["configUpdatedAt"], "config", config_update_delay):
+            raise RuntimeError(
+                f"the agent did not fetch the new config within {config_update_delay} seconds")
+    return phases
+
+
+def format_failed_assertion(record: dict) -> str:
+    """A failed assertion record as `[line X → line Y] message`, the form the summary links."""
+    if record["lines"]:
+        refs = " → ".join(f"line {ln}" for ln in record["lines"])
+        return f"[{refs}] {record['message']}"
+    return record["message"]
+
+
+def crash_message(crash_line: str) -> str:
+    return f"Segmentation fault or core dumped<br>`{crash_line.strip()}`"
+
+
+def execute_test(result: TestResult, test_dir: str, token: str, start_port: int, config_update_delay: int, test_timeout: int, sleep_before_test: int, control_port: int, ready_timeout: int, wait_for_agent_started: bool, monitor: LogMonitor, worker_pool: Optional[TestWorkerPool] = None, soak: Optional[SoakConfig] = None, reused: bool = False) -> TestResult:
+    """
+    Wait for the started container to be ready and run the test against it.
+    The test is aborted as soon as `monitor` sees the agent crash.
+    With a `worker_pool`, test.py runs in a fork of the preloaded forkserver instead of a new interpreter.
+    With `soak`, the test runs for soak.duration seconds and fails if the container's memory keeps growing.
+    A `reused` container was already waited for by reset_reused_container.
+    """
+    core_api = CoreApi(token=token, core_url=CORE_URL, test_name=test_dir,
+                       config_update_delay=config_update_delay)
+
+    with timed_phase(result.phases, "readiness"):
+        # 3. wait for the container to be ready (control tests probe the control server instead)
+        ready_deadline = time.monotonic() + ready_timeout
+        ready_port = control_port if control_port else start_port
+        if not wait_for_app_ready(ready_port, ready_timeout, abort=monitor.crashed):
+            logger.warning(
+                f"{test_dir}: port {ready_port} did not respond within {ready_timeout} seconds")
 
-        for env, value in extra_envs.items():
-            command += f" --env {env}={value}"
-        command += f" {DOCKER_IMAGE_NAME}"
+        # 4. optionally wait for the agent to register with the core mock
+        # (an agent in a reused container registered before; it fetched the fresh app's config instead)
+        if wait_for_agent_started and not reused:
+            remaining = max(0, ready_deadline - time.monotonic())
+            if not core_api.wait_for_new_events(remaining, 0, filter_type="started"):
+                logger.warning(
+                    f"{test_dir}: no started event received within {ready_timeout} seconds")
 
-        logger.debug(f"Running Docker container: {command}")
-        subprocess.run(command, shell=True, check=True)
+        if sleep_before_test:
+            monitor.crashed.wait(sleep_before_test)
 
-        # 3. wait for the container to be ready
-        time.sleep(sleep_before_test)
+    if monitor.crash_line is not None:
+        result.complete(TestStatus.FAILED, crash_message(monitor.crash_line))
+        return result
 
-        # 4. Cold turkey :
-        # Cold turkey for python
-        if not control_port:
-            try:
-                requests.get(f"http://localhost:{start_port}/")
-            except Exception as e:
-                logger.error(
-                    f"Error getting server: {e} \n{traceback.format_exc()}")
-            time.sleep(1)
-
-        server_tests_dir = os.path.dirname(os.path.abspath(__file__))
-        # 5. run the test
-        command = f"python {os.path.join(server_tests_dir, test_dir, 'test.py')} --test_name {test_dir} --server_port {start_port} --token {token} --config_update_delay {config_update_delay} --core_port 3000"
-        if control_port:
-            command += f" --control_server_port {control_port}"
-        test_env = os.environ.copy()
-        test_env["PYTHONPATH"] = server_tests_dir
-        logger.debug(f"Running test: {command}")
-
-        # Run the test with timeout
-        try:
-            process = subprocess.run(
-                command,
-                shell=True,
-                env=test_env,
-                check=False,
-                capture_output=True,
-                text=True,
-                timeout=test_timeout
-            )
+    server_tests_dir = os.path.dirname(os.path.abspath(__file__))
+    # 5. run the test
+    command = ["python", os.path.join(server_tests_dir, test_dir, "test.py"), "--test_name", test_dir,
+               "--server_port", str(start_port), "--token", token,
+               "--config_update_delay", str(config_update_delay), "--core_port", "3000"]
+    if control_port:
+        command += ["--control_server_port", str(control_port)]
+    if monitor.log_file:
+        command += ["--logs_file", monitor.log_file]
+    if soak:
+        command += ["--soak_duration", str(soak.duration)]
+    # the container's CPU, memory, network and pids while the test runs (and its open fds when soaking)
+    sampler = ResourceSampler(monitor.container_name, soak.interval if soak else RESOURCE_SAMPLE_INTERVAL_SECONDS,
+                              count_fds=soak is not None).start()
+    # the test reports its assertions and uncaught exception here, as JSON lines
+    results = ResultReader()
+    test_env = os.environ.copy()
+    test_env["PYTHONPATH"] = server_tests_dir
+    test_env[RESULTS_ADDRESS_ENV] = results.address
+    logger.debug(f"Running test: {' '.join(command)}")
+
+    # Run the test with timeout; a crash in the container kills it right away.
+    # The output is logged line by line while the test runs.
+    def log_output(stream: str, line: str) -> None:
+        logger.debug(f"[{test_dir} :{stream}] {line}")
+
+    if worker_pool:
+        process = worker_pool.run(command[1], command[2:], env={RESULTS_ADDRESS_ENV: results.address},
+                                  on_output=log_output)
+    else:
+        process = PopenTestProcess(command, test_env, on_output=log_output)
+    monitor.on_crash(lambda _: process.kill())
+    try:
+        with timed_phase(result.phases, "test"):
+            _, stderr = process.communicate(timeout=test_timeout)
+        results.close()
+        if soak:
+            result.soak = analyze_soak(sampler.stop(), soak)
+        result.assertions = [
+            r for r in results.records if r["type"] == "assertion"] or None
+        latency = [r for r in results.records if r["type"] == "latency"]
+        result.latency = latency[-1]["routes"] if latency else None
+        benchmark = [r for r in results.records if r["type"] == "benchmark"]
+        result.benchmark = benchmark[-1]["rows"] if benchmark else None
+
+        if monitor.crash_line is not None:
+            result.complete(TestStatus.FAILED,
+                            crash_message(monitor.crash_line))
+            return result
 
-            # Log test output
-            if process.stdout:
-                logger.debug(
-                    f"{'-'*20}[{test_dir} :stdout] {'-'*20}:\n{process.stdout} \n{'-'*50}")
-            if process.stderr:
-                logger.debug(
-                    f"{'-'*30}[{test_dir} :stderr] {'-'*30}:\n{process.stderr} \n{'-'*100}")
-
-            if process.returncode != 0:
-                # Extract the actual assertion error and stack trace from the output
-                error_lines = process.stderr.split('\n')
-
-                # Extract individual [FAIL] markers for soft assertion failures
-                failed_assertions = []
-                for line in error_lines:
-                    stripped = line.strip()
-                    if stripped.startswith("[FAIL]"):
-                        failed_assertions.append(stripped[len("[FAIL] "):])
+        if process.returncode != 0:
+            error = results.error()
+            if error and error["exception"] == "AssertionError" and error["line"]:
+                failed_assertions = [
+                    format_failed_assertion(r) for r in results.failed_assertions()]
                 result.failed_assertions = failed_assertions if failed_assertions else None
-
-                # Find the full assertion error message (may be multi-line for soft assertions)
-                assertion_error = None
-                assertion_start_idx = None
-                for i, line in enumerate(error_lines):
-                    if 'AssertionError:' in line:
-                        assertion_start_idx = i
-                        break
-
-                if assertion_start_idx is not None:
-                    assertion_lines = []
-                    for i in range(assertion_start_idx, len(error_lines)):
-                        stripped = error_lines[i].strip()
-                        if stripped:
-                            assertion_lines.append(stripped)
-                    assertion_error = "\n".join(assertion_lines)
-
-                # Find the last stack trace line from test.py
-                test_stack_line = None
-                for i in range(len(error_lines)):
-                    line = error_lines[i]
-                    if f'{test_dir}/test.py' in line:
-                        test_stack_line = line.strip()
-
-                if assertion_error and test_stack_line:
-                    if failed_assertions:
-                        error_message = (
-                            f"{len(failed_assertions)} assertion(s) failed<br>"
-                            + "<br>".join(
-                                f"`{fa}`" for fa in failed_assertions
-                            )
+                if failed_assertions:
+                    error_message = (
+                        f"{len(failed_assertions)} assertion(s) failed<br>"
+                        + "<br>".join(
+                            f"`{fa}`" for fa in failed_assertions
                         )
-                    else:
-                        error_message = f"{test_stack_line}<br>`{assertion_error}`"
-                    raise Exception(error_message)
+                    )
                 else:
-                    raise Exception(
-                        f"Test failed with return code {process.returncode}\n```\n{process.stderr}\n```")
+                    error_message = f"{error['line']}<br>`AssertionError: {error['message']}`"
+                raise Exception(error_message)
+            else:
+                raise Exception(
+                    f"Test failed with return code {process.returncode}\n```\n{stderr}\n```")
 
-            result.complete(TestStatus.PASSED)
-            return result
+        if result.soak:
+            failure = soak_failure(result.soak)
+            if failure:
+                raise Exception(failure)
 
-        except subprocess.TimeoutExpired:
-            result.complete(TestStatus.TIMEOUT,
-                            f"Test timed out after {test_timeout} seconds")
-            return result
+        result.complete(TestStatus.PASSED)
+        return result
 
-    except Exception as e:
-        logger.error(f"Error running test: {e}")
-        result.complete(TestStatus.FAILED, str(e))
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.communicate()
+        results.close()
+        result.complete(TestStatus.TIMEOUT,
+                        f"Test timed out after {test_timeout} seconds")
         return result
     finally:
-        # chcek the logs for "Segmentation fault" or "core dumped"
+        result.resources = summarize(sampler.stop())
+
+
+def stop_and_remove_container(test_dir: str, stop_timeout: int, phases: Dict[str, float], db_pool: Optional[DatabasePool] = None) -> None:
+    try:
+        with timed_phase(phases, "teardown"):
+            try:
+                # stop the container
+                docker.stop_container(test_dir, timeout_seconds=stop_timeout)
+            finally:
+                # remove the container (forced, so also when stopping it failed)
+                docker.remove_container(test_dir)
+    finally:
+        # the app is gone, so its database can be dropped (in the background)
+        if db_pool:
+            db_pool.release(test_dir)
+
+
+def log_reaper_errors(test_dir: str, future: concurrent.futures.Future) -> None:
+    error = future.exception()
+    if error:
+        logger.error(f"Error removing container {test_dir}: {error}")
+
+
+def teardown_test(result: TestResult, test_dir: str, stop_timeout: int = 10, reaper: Optional[concurrent.futures.Executor] = None, monitor: Optional[LogMonitor] = None, db_pool: Optional[DatabasePool] = None, reuse: Optional[ContainerReuse] = None, reuse_key: Optional[str] = None, container: Optional[ReusableContainer] = None) -> None:
+    """
+    Check the container logs for crashes, then stop and remove the container.
+    The logs are captured here; stopping and removing is handed to `reaper` when given,
+    so the caller's test slot is free before the container is gone.
+    A reusable `container` whose test passed is handed back to `reuse` instead.
+    """
+    if monitor is not None:
+        with timed_phase(result.phases, "logs"):
+            monitor.stop()
+            logger.debug(f"Logs: {monitor.text()}")
+        if monitor.log_file and os.path.exists(monitor.log_file):
+            os.remove(monitor.log_file)
+        if monitor.crash_line is not None and result.status != TestStatus.FAILED:
+            result.complete(TestStatus.FAILED,
+                            crash_message(monitor.crash_line))
+    else:
+        # the monitor never started: check the logs for "Segmentation fault" or "core dumped"
         logs_str = ""
-        logs = None
         try:
-            logs = subprocess.check_output(
-                ["docker", "logs", test_dir], stderr=subprocess.STDOUT)
-            logs_str = logs.decode("utf-8")
+            with timed_phase(result.phases, "logs"):
+                logs_str = docker.logs(test_dir)
             logger.debug(f"Logs: {logs_str}")
         except Exception as e:
-            logger.error(f"Error getting logs: {e} \n{traceback.format_exc()}")
+            logger.error(
+                f"Error getting logs: {e} \n{traceback.format_exc()}")
             logs_str = ""
 
         if "Segmentation fault" in logs_str or "core dumped" in logs_str:
             result.complete(TestStatus.FAILED,
                             "Segmentation fault or core dumped")
-            return result
-
-        # stop the container
-        subprocess.run(f"docker stop {test_dir}",
-                       shell=True, check=False, capture_output=False)
-        # remove the container
-        subprocess.run(f"docker rm -f {test_dir}",
-                       shell=True, check=False, capture_output=False)
 
+    if container is not None and result.status == TestStatus.PASSED and reuse.release(reuse_key, container):
+        logger.debug(
+            f"Keeping container {test_dir} for the next test with the same start profile")
+        return
 
-def build_docker_image(dockerfile_path: str, extra_build_args: str):
+    if reaper is None:
+        stop_and_remove_container(
+            test_dir, stop_timeout, result.phases, db_pool)
+        return
+    future = reaper.submit(stop_and_remove_container,
+                           test_dir, stop_timeout, result.phases, db_pool)
+    future.add_done_callback(lambda f: log_reaper_errors(test_dir, f))
+
+
+def run_test(test_dir: str, token: str, dockerfile_path: str, start_port: int, config_update_delay: int, test_timeout: int, extra_args: str, app_port: int, sleep_before_test: int, control_port: int, docker_postgres_host: str, ready_timeout: int = 120, wait_for_agent_started: bool = False, prepared: Optional[concurrent.futures.Future] = None, stop_timeout: int = 10, reaper: Optional[concurrent.futures.Executor] = None, db_pool: Optional[DatabasePool] = None, worker_pool: Optional[TestWorkerPool] = None, reuse: Optional[ContainerReuse] = None, reuse_key: Optional[str] = None, soak: Optional[SoakConfig] = None) -> TestResult:
+    """
+    Runs a single test in its own container. If `prepared` is given, the container
+    was already started ahead of time by prepare_test and we only wait for it.
+    With a `reuse_key`, an idle container that passed a test with the same start profile
+    is reset and used instead, and this test's container is kept for the next one.
+    """
+    result = TestResult(test_dir=test_dir, start_time=datetime.now())
+    monitor = None
+    container = reuse.acquire(reuse_key) if reuse_key else None
+    log_since = None
+    if container is not None:
+        try:
+            log_since = time.time()
+            result.phases.update(reset_reused_container(
+                test_dir, container, config_update_delay))
+            token, start_port, control_port = container.token, container.port, container.control_port
+            logger.info(
+                f"{test_dir}: reusing container {container.name} (test {container.tests_run + 1} in it)")
+            # the app keeps using the database of the test the container was started for
+            if db_pool:
+                db_pool.release(test_dir)
+        except Exception as e:
+            logger.warning(
+                f"{test_dir}: could not reset container {container.name}, starting a new one: {e}")
+            try:
+                stop_and_remove_container(
+                    container.name, stop_timeout, result.phases, db_pool)
+            except Exception as e:
+                logger.error(f"Error removing container {container.name}: {e}")
+            container = None
+            log_since = None
+    if reuse_key and container is None:
+        container = ReusableContainer(
+            test_dir, token, start_port, control_port)
+    container_name = container.name if container else test_dir
+    try:
+        if log_since is None:
+            if prepared is None:
+                phases = prepare_test(test_dir, token, start_port, extra_args,
+                                      app_port, control_port, docker_postgres_host, db_pool)
+            else:
+                phases = prepared.result()
+            result.phases.update(phases)
+        # streams the container logs for the crash check and for TestServer.get_logs
+        monitor = LogMonitor(container_name, log_file=os.path.join(
+            tempfile.gettempdir(), f"{test_dir}.container.log"), since=log_since).start()
+        return execute_test(result, test_dir, token, start_port, config_update_delay, test_timeout,
+                            sleep_before_test, control_port, ready_timeout, wait_for_agent_started, monitor, worker_pool, soak,
+                            reused=log_since is not None)
+    except Exception as e:
+        logger.error(f"Error running test: {e}")
+        result.complete(TestStatus.FAILED, str(e))
+        return result
+    finally:
+        teardown_test(result, container_name, stop_timeout,
+                      reaper, monitor, db_pool, reuse, reuse_key, container)
+
+
+def _dockerignore_patterns(context_dir: str) -> List[str]:
+    """
+    Exclude patterns of the context's .dockerignore. Files docker would not send are left out of
+    the context hash; with `!` exceptions we don't try to mimic docker and hash everything instead.
+    """
+    dockerignore_path = os.path.join(context_dir, ".dockerignore")
+    if not os.path.exists(dockerignore_path):
+        return []
+    patterns = []
+    with open(dockerignore_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("!"):
+                return []
+            patterns.append(line.strip("/"))
+    return patterns
+
+
+def _is_ignored(rel_path: str, patterns: List[str]) -> bool:
+    # a pattern matching a directory excludes everything below it
+    parts = rel_path.split("/")
+    for i in range(1, len(parts) + 1):
+        prefix = "/".join(parts[:i])
+        if any(fnmatch.fnmatch(prefix, pattern) for pattern in patterns):
+            return True
+    return False
+
+
+def compute_build_hash(dockerfile_path: str, context_dir: str, extra_build_args: str) -> str:
+    """Content hash of everything that goes into the image build: Dockerfile, build args and context files."""
+    digest = hashlib.sha256()
+    with open(dockerfile_path, "rb") as f:
+        digest.update(f.read())
+    digest.update(b"\0" + (extra_build_args or "").encode("utf-8") + b"\0")
+
+    patterns = _dockerignore_patterns(context_dir)
+    for root, dirs, files in os.walk(context_dir):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            rel_path = os.path.relpath(path, context_dir).replace(os.sep, "/")
+            if _is_ignored(rel_path, patterns):
+                continue
+            digest.update(rel_path.encode("utf-8") + b"\0")
+            if os.path.islink(path):
+                digest.update(b"link:" + os.readlink(path).encode("utf-8"))
+            else:
+                digest.update(b"x" if os.access(path, os.X_OK) else b"-")
+                with open(path, "rb") as f:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                        digest.update(chunk)
+            digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def build_docker_image(dockerfile_path: str, extra_build_args: str, build_cache_dir: str = ""):
+    """
+    Build the test image, tagged with a hash of its inputs. If an image with that hash
+    already exists (e.g. a previous local run or a re-run on the same runner), it is reused.
+    """
     if not os.path.exists(dockerfile_path):
         # list files from dockerfile_path root
         logger.debug(f"Dockerfile not found: {dockerfile_path}")
@@ -466,8 +801,23 @@ def build_docker_image(dockerfile_path: str, extra_build_args: str):
 
     # Get the directory containing the Dockerfile
     dockerfile_dir = os.path.dirname(dockerfile_path)
+
+    hashed_image = f"{DOCKER_IMAGE_NAME}:ctx-{compute_build_hash(dockerfile_path, dockerfile_dir or '.', extra_build_args)[:16]}"
+    if docker.image_exists(hashed_image):
+        logger.info(
+            f"Reusing {hashed_image}: Dockerfile, build args and context are unchanged")
+        docker.tag_image(hashed_image, DOCKER_IMAGE_NAME)
+        return
+
     command = ["docker", "build", "-t",
-               DOCKER_IMAGE_NAME, "-f", dockerfile_path]
+               DOCKER_IMAGE_NAME, "-t", hashed_image, "-f", dockerfile_path]
+    if build_cache_dir:
+        # a local BuildKit cache needs buildx with a container builder (e.g. docker/setup-buildx-action)
+        command = ["docker", "buildx", "build", "--load", "-t", DOCKER_IMAGE_NAME,
+                   "-t", hashed_image, "-f", dockerfile_path,
+                   f"--cache-to=type=local,dest={build_cache_dir},mode=max"]
+        if os.path.exists(os.path.join(build_cache_dir, "index.json")):
+            command.append(f"--cache-from=type=local,src={build_cache_dir}")
     if extra_build_args:
         try:
             # extra_build_args is a string of arguments separated by spaces (e.g. "--build-arg APP_VERSION=2.0.1 --build-arg PHP_FIREWALL_VERSION=1.0.123")
@@ -481,219 +831,33 @@ def build_docker_image(dockerfile_path: str, extra_build_args: str):
     subprocess.run(" ".join(command), shell=True, check=True)
 
 
-def _escape_markdown(text: str) -> str:
-    """Escape characters that can break GitHub markdown rendering."""
-    # Escape HTML-like angle brackets to prevent them being parsed as tags
-    text = text.replace("<", "&lt;").replace(">", "&gt;")
-    # Escape pipe for table cells
-    text = text.replace("|", "\\|")
-    # Escape backticks to prevent inline code spans
-    text = text.replace("`", "\\`")
-    return text
-
-
-def _linkify_line_ref(text: str, test_dir: str) -> str:
-    """Replace [line X → line Y → ...] prefix with clickable GitHub links."""
-    def _make_link(line_num: str) -> str:
-        url = f"https://github.com/AikidoSec/firewall-tester-action/blob/main/server_tests/{test_dir}/test.py#L{line_num}"
-        return f'<a href="{url}">line {line_num}</a>'
-
-    # Match the entire bracket prefix: [line N] or [line N → line M → ...]
-    bracket_match = re.match(r'\[(line \d+(?:\s*→\s*line \d+)*)\]\s*', text)
-    if bracket_match:
-        inner = bracket_match.group(1)
-        # Replace each "line N" with an HTML link
-        linked = re.sub(r'line (\d+)', lambda m: _make_link(m.group(1)), inner)
-        text = linked + " " + text[bracket_match.end():]
-    return text
-
-
-def _get_source_context(test_dir: str, assertion_text: str, context_lines: int = 3) -> Optional[str]:
-    """Extract lines around each failure frame from test.py (context_lines before + the line + context_lines after)."""
-    line_nums = [int(m) for m in re.findall(r'line (\d+)', assertion_text)]
-    if not line_nums:
-        return None
-    test_file = os.path.join(os.path.dirname(__file__), test_dir, "test.py")
-    try:
-        with open(test_file, 'r') as f:
-            lines = f.readlines()
-        snippets = []
-        for line_num in line_nums:
-            start = max(0, line_num - 1 - context_lines)
-            end = min(len(lines), line_num + context_lines)
-            snippet_lines = []
-            for i in range(start, end):
-                marker = "→" if (i + 1) == line_num else " "
-                snippet_lines.append(
-                    f"{marker} {i + 1:>4} | {lines[i].rstrip()}")
-            snippets.append("\n".join(snippet_lines))
-        return "\n\n".join(snippets)
-    except Exception:
-        return None
-
-
-def _build_summary_header(test_results: List[TestResult]) -> str:
-    """Build the overview and results table (always included)."""
-    buf = io.StringIO()
-    buf.write("\n## Test Results Summary\n\n")
-
-    total_tests = len(test_results)
-    passed_tests = sum(
-        1 for r in test_results if r.status == TestStatus.PASSED)
-    skipped_tests = sum(
-        1 for r in test_results if r.status == TestStatus.SKIPPED)
-    timeout_tests = sum(
-        1 for r in test_results if r.status == TestStatus.TIMEOUT)
-    failed_tests = sum(
-        1 for r in test_results if r.status == TestStatus.FAILED)
-
-    buf.write("### Overview\n\n")
-    buf.write(f"- **Total Tests:** {total_tests}\n")
-    buf.write(f"- **Passed:** {passed_tests}\n")
-    buf.write(f"- **Skipped:** {skipped_tests}\n")
-    buf.write(f"- **Timed Out:** {timeout_tests}\n")
-    buf.write(f"- **Failed:** {failed_tests}\n")
-
-    buf.write("### Detailed Results\n\n")
-    buf.write("| Test | Status | Duration | Error Message |\n")
-    buf.write("|------|--------|----------|---------------|\n")
-
-    for result in test_results:
-        status_emoji = {
-            TestStatus.PASSED: "✅ PASS",
-            TestStatus.FAILED: "❌ FAIL",
-            TestStatus.SKIPPED: "⏭️ SKIP",
-            TestStatus.TIMEOUT: "⏰ TIMEOUT"
-        }
-        status = status_emoji[result.status]
-        duration = f"{result.duration:.2f}s" if result.duration is not None else "N/A"
-        if result.failed_assertions:
-            error = f"{len(result.failed_assertions)} assertion(s) failed (see details below)"
-        elif result.error_message:
-            error = result.error_message
-        else:
-            error = "-"
-        error = _escape_markdown(error)
-        buf.write(
-            f"| {result.test_dir} | {status} | {duration} | {error} |\n")
-
-    return buf.getvalue()
-
-
-def _build_details_block(result: TestResult, include_snippets: bool, max_assertions: Optional[int] = None) -> str:
-    """Build a single <details> block for one failed test."""
-    buf = io.StringIO()
-    total = len(result.failed_assertions)
-    assertions = result.failed_assertions
-    if max_assertions and max_assertions < total:
-        assertions = assertions[:max_assertions]
-
-    buf.write(f"<details>\n")
-    buf.write(
-        f"<summary>{result.test_dir} - {total} failed assertion(s)</summary>\n\n")
-    for i, assertion in enumerate(assertions, 1):
-        escaped = _escape_markdown(assertion)
-        escaped = _linkify_line_ref(escaped, result.test_dir)
-        indent = " " * (len(str(i)) + 2)
-        buf.write(f"{i}. {escaped}\n")
-        if include_snippets:
-            snippet = _get_source_context(result.test_dir, assertion)
-            if snippet:
-                buf.write(f"{indent}<details>\n")
-                buf.write(f"{indent}<summary>Show source</summary>\n\n")
-                buf.write(f"{indent}```python\n")
-                for snippet_line in reversed(snippet.split("\n")):
-                    buf.write(f"{indent}{snippet_line}\n")
-                buf.write(f"{indent}```\n")
-                buf.write(f"{indent}</details>\n")
-    if max_assertions and max_assertions < total:
-        buf.write(
-            f"\n*... and {total - max_assertions} more assertion(s) truncated to fit summary size limit.*\n")
-    buf.write(f"\n</details>\n\n")
-    return buf.getvalue()
-
-
-# GitHub step summary limit is 1024 KB; use 1020 KB as safe threshold
-_SUMMARY_SIZE_LIMIT = 1020 * 1024
-
-
-def write_summary_to_github_step_summary(test_results: List[TestResult]):
-    summary_path = os.environ.get('GITHUB_STEP_SUMMARY')
-    if not summary_path:
-        logger.warning("GITHUB_STEP_SUMMARY environment variable not set")
-        return
-
-    header = _build_summary_header(test_results)
-
-    failed_with_details = [
-        r for r in test_results if r.failed_assertions]
-
-    if not failed_with_details:
-        # No details section needed – just write the header
-        with open(summary_path, 'a', encoding='utf-8') as f:
-            f.write(header)
-        return
-
-    details_heading = "\n### Failed Assertions Details\n\n"
-
-    # Strategy 1: full details with snippets
-    details_blocks = [_build_details_block(
-        r, include_snippets=True) for r in failed_with_details]
-    full_content = header + details_heading + "".join(details_blocks)
-
-    if len(full_content.encode('utf-8')) <= _SUMMARY_SIZE_LIMIT:
-        with open(summary_path, 'a', encoding='utf-8') as f:
-            f.write(full_content)
-        return
-
-    logger.warning(
-        f"Summary with snippets is {len(full_content.encode('utf-8')) // 1024}KB, "
-        f"exceeds {_SUMMARY_SIZE_LIMIT // 1024}KB limit – removing source snippets")
-
-    # Strategy 2: details without snippets
-    details_blocks = [_build_details_block(
-        r, include_snippets=False) for r in failed_with_details]
-    full_content = header + details_heading + "".join(details_blocks)
-
-    if len(full_content.encode('utf-8')) <= _SUMMARY_SIZE_LIMIT:
-        with open(summary_path, 'a', encoding='utf-8') as f:
-            f.write(full_content)
-        return
-
-    logger.warning(
-        f"Summary without snippets is {len(full_content.encode('utf-8')) // 1024}KB, "
-        f"still exceeds limit – capping assertions per test")
-
-    # Strategy 3: no snippets + cap assertions per test, progressively reduce
-    for cap in [20, 10, 5]:
-        details_blocks = [_build_details_block(
-            r, include_snippets=False, max_assertions=cap) for r in failed_with_details]
-        full_content = header + details_heading + "".join(details_blocks)
-        if len(full_content.encode('utf-8')) <= _SUMMARY_SIZE_LIMIT:
-            with open(summary_path, 'a', encoding='utf-8') as f:
-                f.write(full_content)
-            return
-
-    # Strategy 4: only header + a note that details were truncated
-    logger.warning(
-        "Summary still too large – writing header only with truncation notice")
-    truncation_notice = (
-        "\n### Failed Assertions Details\n\n"
-        "> ⚠️ Detailed assertion failures were omitted because the summary exceeded "
-        "GitHub's 1024KB size limit. Check the test logs for full details.\n\n"
-    )
-    with open(summary_path, 'a', encoding='utf-8') as f:
-        f.write(header + truncation_notice)
-
-
-def run_tests(dockerfile_path: str, max_parallel_tests: int, config_update_delay: int, skip_tests: str, run_tests: str, test_timeout: int, extra_args: str, extra_build_args: str, app_port: int, sleep_before_test: int, ignore_failures: bool = False, test_type: str = "server"):
+def run_tests(dockerfile_path: str, max_parallel_tests: int, config_update_delay: int, skip_tests: str, run_tests: str, test_timeout: int, extra_args: str, extra_build_args: str, app_port: int, sleep_before_test: int, ignore_failures: bool = False, test_type: str = "server", ready_timeout: int = 120, wait_for_agent_started: bool = False, durations_file: str = DEFAULT_DURATIONS_FILE, prewarm_tests: int = 0, stop_timeout: int = 10, results_file: str = "", build_cache_dir: str = "", preload_tests: bool = True, shard: str = "", reuse_containers: bool = False, soak_duration: int = DEFAULT_SOAK_DURATION, soak_max_memory_slope: float = DEFAULT_SOAK_MAX_MEMORY_SLOPE):
     logger.debug(f"Dockerfile path: {dockerfile_path}")
+    # fail on a bad --shard before building anything
+    shard_spec = parse_shard(shard)
     logger.debug(f"Max parallel tests: {max_parallel_tests}")
     docker_postgres_host = get_running_container_ip("postgres")
     logger.info(f"Using postgres container IP: {docker_postgres_host}:5432")
-    build_docker_image(dockerfile_path, extra_build_args)
+    build_start = time.monotonic()
+    build_docker_image(dockerfile_path, extra_build_args, build_cache_dir)
+    build_duration = time.monotonic() - build_start
+    logger.info(f"Docker image built in {build_duration:.2f} seconds")
+    soak = None
     if test_type == "control":
         dir_start = "control_"
+    elif test_type in ("benchmark", "soak"):
+        dir_start = f"{test_type}_"
+        if max_parallel_tests > 1 or prewarm_tests > 0:
+            # benchmarks running (or containers booting) side by side would measure each other's load
+            logger.info(
+                f"{test_type.capitalize()} tests run one at a time, ignoring max_parallel_tests and prewarm_tests")
+            max_parallel_tests, prewarm_tests = 1, 0
+        if test_type == "soak":
+            # about SOAK_SAMPLES samples per run
+            soak = SoakConfig(soak_duration, soak_max_memory_slope,
+                              interval=min(30, max(2, soak_duration / SOAK_SAMPLES)))
+            test_timeout = max(test_timeout or 0,
+                               soak_duration + SOAK_TIMEOUT_MARGIN_SECONDS)
     else:
         dir_start = "test_"
 
@@ -711,6 +875,42 @@ def run_tests(dockerfile_path: str, max_parallel_tests: int, config_update_delay
     if tests_to_run:
         test_dirs = [d for d in test_dirs if d in tests_to_run]
 
+    durations = load_test_durations(durations_file)
+    if shard_spec:
+        test_dirs = shard_test_dirs(
+            test_dirs, shard_spec, durations, tests_to_skip)
+
+    # Longest-processing-time-first: the pool picks tests in submission order,
+    # so starting the longest ones first keeps a slow test from finishing last
+    test_dirs.sort(key=lambda d: estimate_test_duration(
+        d, durations), reverse=True)
+
+    # test.py scripts run in forks of a process that has already imported testlib and core_api
+    worker_pool = None
+    if preload_tests and forkserver_supported():
+        worker_pool = TestWorkerPool()
+        worker_pool.start()
+
+    # Databases for all queued tests are copied from a template in the background
+    db_pool = start_database_pool()
+    if db_pool:
+        db_pool.prepare([d for d in test_dirs if d not in tests_to_skip])
+
+    # Containers for the next `prewarm_tests` queued tests are started while earlier tests
+    # run, so a freed slot goes straight to a warm container. Sized like container_slots:
+    # at the start, the containers of all running tests are prepared at the same time.
+    prepare_executor = concurrent.futures.ThreadPoolExecutor(
+        max_workers=max_parallel_tests + prewarm_tests, thread_name_prefix="prepare") if prewarm_tests > 0 else None
+    # bounds the number of started containers: running tests + warm ones
+    container_slots = threading.Semaphore(max_parallel_tests + prewarm_tests)
+    # Finished containers are stopped and removed in the background; it is
+    # drained below before the summary is written
+    reaper = concurrent.futures.ThreadPoolExecutor(
+        max_workers=max_parallel_tests, thread_name_prefix="reaper")
+    # Tests marked reusable hand their container to the next test with the same start profile
+    reuse = ContainerReuse(
+        max_idle=max_parallel_tests) if reuse_containers else None
+
     with concurrent.futures.ThreadPoolExecutor(max_workers=max_parallel_tests) as executor:
         future_to_test = {}
         start_port = 3001
@@ -727,6 +927,16 @@ def run_tests(dockerfile_path: str, max_parallel_tests: int, config_update_delay
                 continue
 
             token = CoreApi.get_app_token(CORE_URL)
+            control_port = control_start_port if test_type in (
+                "control", "benchmark") else None
+            reuse_key = start_profile_hash(os.path.join(os.path.dirname(
+                os.path.abspath(__file__)), test_dir), test_type) if reuse else None
+            prepared = None
+            # a reusable test may get an idle container, so none is started for it ahead of time
+            if prepare_executor and not reuse_key:
+                container_slots.acquire()
+                prepared = prepare_executor.submit(
+                    prepare_test, test_dir, token, start_port, extra_args, app_port, control_port, docker_postgres_host, db_pool)
             future = executor.submit(
                 run_test,
                 test_dir,
@@ -738,9 +948,21 @@ def run_tests(dockerfile_path: str, max_parallel_tests: int, config_update_delay
                 extra_args,
                 app_port,
                 sleep_before_test,
-                None if test_type == "server" else control_start_port,
+                control_port,
                 docker_postgres_host,
+                ready_timeout,
+                wait_for_agent_started,
+                prepared,
+                stop_timeout,
+                reaper,
+                db_pool,
+                worker_pool,
+                reuse,
+                reuse_key,
+                soak,
             )
+            if prepared:
+                future.add_done_callback(lambda _: container_slots.release())
             future_to_test[future] = test_dir
             start_port += 1
             control_start_port += 1
@@ -771,40 +993,26 @@ def run_tests(dockerfile_path: str, max_parallel_tests: int, config_update_delay
                 test_results.append(result)
                 break
 
+    if prepare_executor:
+        prepare_executor.shutdown()
+    if reuse:
+        for container in reuse.drain():
+            future = reaper.submit(stop_and_remove_container,
+                                   container.name, stop_timeout, {}, db_pool)
+            future.add_done_callback(
+                lambda f, name=container.name: log_reaper_errors(name, f))
+    logger.info("Waiting for test containers to be removed...")
+    reaper.shutdown(wait=True)
+    if db_pool:
+        db_pool.close()
+
+    save_test_durations(durations_file, test_results)
+    write_results_file(results_file, test_results, build_duration)
+
     # Write summary to GitHub Step Summary
     write_summary_to_github_step_summary(test_results)
 
-    # Print summary to console as well
-    logger.info("\nTest Summary:")
-    logger.info("=" * 50)
-    total_tests = len(test_results)
-    passed_tests = sum(
-        1 for r in test_results if r.status == TestStatus.PASSED)
-    skipped_tests = sum(
-        1 for r in test_results if r.status == TestStatus.SKIPPED)
-    timeout_tests = sum(
-        1 for r in test_results if r.status == TestStatus.TIMEOUT)
-    failed_tests = sum(
-        1 for r in test_results if r.status == TestStatus.FAILED)
-    total_duration = sum(
-        r.duration for r in test_results if r.duration is not None)
-
-    logger.info(f"Total Tests: {total_tests}")
-    logger.info(f"Passed: {passed_tests}")
-    logger.info(f"Skipped: {skipped_tests}")
-    logger.info(f"Timed Out: {timeout_tests}")
-    logger.info(f"Failed: {failed_tests}")
-    logger.info(f"Total Duration: {total_duration:.2f} seconds")
-    logger.info("=" * 50)
-
-    # Exit with error if any tests failed or timed out
-    if failed_tests > 0 or timeout_tests > 0:
-        if ignore_failures == "true":
-            logger.warning("Tests failed but ignoring failures as requested")
-            sys.exit(0)
-        else:
-            sys.exit(1)
-
+    report_and_exit(test_results, ignore_failures)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -822,11 +1030,41 @@ if __name__ == "__main__":
                         required=False, default="false")
     parser.add_argument("--test_type", type=str,
                         required=False, default="server")
+    parser.add_argument("--ready_timeout", type=int,
+                        required=False, default=120)
+    parser.add_argument("--wait_for_agent_started", type=str,
+                        required=False, default="false")
+    parser.add_argument("--durations_file", type=str,
+                        required=False, default="")
+    parser.add_argument("--prewarm_tests", type=int,
+                        required=False, default=0)
+    parser.add_argument("--stop_timeout", type=int,
+                        required=False, default=10)
+    parser.add_argument("--results_file", type=str,
+                        required=False, default="")
+    parser.add_argument("--build_cache_dir", type=str,
+                        required=False, default="")
+    parser.add_argument("--preload_tests", type=str,
+                        required=False, default="true")
+    parser.add_argument("--shard", type=str,
+                        required=False, default="")
+    parser.add_argument("--reuse_containers", type=str,
+                        required=False, default="false")
+    parser.add_argument("--soak_duration", type=int,
+                        required=False, default=DEFAULT_SOAK_DURATION)
+    parser.add_argument("--soak_max_memory_slope", type=float,
+                        required=False, default=DEFAULT_SOAK_MAX_MEMORY_SLOPE)
 
     args = parser.parse_args()
     start_postgres()
     try:
         run_tests(args.dockerfile_path, args.max_parallel_tests,
-                  args.config_update_delay, args.skip_tests, args.run_tests or '', args.test_timeout, args.extra_args, args.extra_build_args, args.app_port, args.sleep_before_test, args.ignore_failures, args.test_type)
+                  args.config_update_delay, args.skip_tests, args.run_tests or '', args.test_timeout, args.extra_args, args.extra_build_args, args.app_port, args.sleep_before_test, args.ignore_failures, args.test_type,
+                  args.ready_timeout, args.wait_for_agent_started == "true",
+                  args.durations_file or DEFAULT_DURATIONS_FILE, args.prewarm_tests,
+                  args.stop_timeout, args.results_file, args.build_cache_dir,
+                  args.preload_tests == "true", args.shard,
+                  args.reuse_containers == "true", args.soak_duration,
+                  args.soak_max_memory_slope)
     finally:
         stop_postgres()
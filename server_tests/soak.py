@@ -0,0 +1,64 @@
+"""
+Soak mode: long runs of one container under mixed traffic, to catch slow leaks.
+
+With test_type soak, run_test runs the soak_* tests one at a time for `duration` seconds each while a
+ResourceSampler records the container's memory, CPU, pids and open fds. Afterwards the memory growth
+is fitted over time, leaving out the warm-up, and the test fails when it grows faster than
+`max_memory_slope` MiB per hour.
+"""
+from dataclasses import dataclass
+from typing import List, Optional
+
+from resource_monitor import slope_per_hour
+
+MIB = 1024 * 1024
+
+
+@dataclass
+class SoakConfig:
+    duration: int
+    # MiB per hour
+    max_memory_slope: float
+    # seconds between samples
+    interval: float = 10
+    # memory grows while the app warms up (JIT, caches, connection pools), so this part is not fitted
+    warmup_fraction: float = 0.2
+
+
+def analyze_soak(samples: List[dict], config: SoakConfig) -> dict:
+    warmup = config.duration * config.warmup_fraction
+    analysis = {
+        "duration": config.duration,
+        "interval": config.interval,
+        "warmup": warmup,
+        "max_memory_slope": config.max_memory_slope,
+        "memory_slope": None,
+        "samples": samples,
+    }
+    if not samples:
+        return analysis
+
+    memory_slope = slope_per_hour(samples, "memory", warmup)
+    analysis["memory_slope"] = memory_slope / MIB if memory_slope is not None else None
+    analysis["memory_start"] = samples[0]["memory"]
+    analysis["memory_end"] = samples[-1]["memory"]
+    # the peaks are in the test's resources (resource_monitor.summarize)
+    cpu = [s["cpu_percent"] for s in samples if s.get("cpu_percent") is not None]
+    analysis["cpu_mean"] = sum(cpu) / len(cpu) if cpu else None
+    fds = [s["open_fds"] for s in samples if s.get("open_fds") is not None]
+    analysis["fds_start"] = fds[0] if fds else None
+    analysis["fds_end"] = fds[-1] if fds else None
+    analysis["fds_slope"] = slope_per_hour(samples, "open_fds", warmup)
+    return analysis
+
+
+def soak_failure(analysis: dict) -> Optional[str]:
+    """Why the soak failed, or None if memory stayed within the allowed growth."""
+    if analysis["memory_slope"] is None:
+        return (f"Not enough resource samples after the {analysis['warmup']:.0f}s warm-up "
+                f"to fit the memory growth ({len(analysis['samples'])} sample(s))")
+    if analysis["memory_slope"] > analysis["max_memory_slope"]:
+        return (f"Memory grew by {analysis['memory_slope']:.1f} MiB/hour after warm-up "
+                f"(max {analysis['max_memory_slope']:g} MiB/hour): "
+                f"{analysis['memory_start'] / MIB:.1f} MiB -> {analysis['memory_end'] / MIB:.1f} MiB")
+    return None
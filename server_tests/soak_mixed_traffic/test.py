@@ -0,0 +1,75 @@
+
+from testlib import *
+from core_api import CoreApi
+import random
+import time
+
+
+"""
+Soak test: keeps mixed benign and attack traffic going for the soak duration (run_test --soak_duration),
+while run_test samples the container's memory, CPU and open fds and fails on memory growth.
+1. Offer a constant rate of benign requests and blocked attacks from a fixed pool of IPs and users
+2. After the soak, check that the traffic was answered and attacks are still blocked
+"""
+
+DEFAULT_DURATION = 600
+TRAFFIC_RATE = 50
+TRAFFIC_SEED = 4321
+# fixed pools: the agent's state per IP / user stays bounded, so any growth is a leak
+IP_COUNT = 50
+USER_COUNT = 50
+MAX_ERROR_RATE = 0.01
+
+BENIGN = [
+    ("GET", "/api/pets/", None),
+    ("GET", "/", None),
+]
+
+ATTACKS = [
+    ("GET", "/api/read?path=../secrets/key.txt", None),
+    ("POST", "/api/create", {"name": "Malicious Pet', 'Gru from the Minions') --"}),
+    ("POST", "/api/execute", {"userCommand": "whoami"}),
+    ("POST", "/api/request", {"url": "http://127.0.0.1:8081"}),
+]
+
+
+def build_traffic(count=5000, seed=TRAFFIC_SEED):
+    """90% benign requests, 10% attacks, from a fixed pool of IPs and users"""
+    rng = random.Random(seed)
+    ips = [f"198.51.{i // 250}.{i % 250 + 1}" for i in range(IP_COUNT)]
+    traffic = []
+    for _ in range(count):
+        method, route, data = rng.choice(ATTACKS if rng.random() < 0.1 else BENIGN)
+        headers = {"X-Forwarded-For": rng.choice(ips)}
+        if rng.random() < 0.5:
+            headers["X-User-ID"] = str(rng.randrange(USER_COUNT))
+        traffic.append((method, route, headers, data))
+    return traffic
+
+
+def check_attacks_blocked(collector):
+    for method, route, data in ATTACKS:
+        response = s.request(method, route, data or {}, timeout=10)
+        collector.soft_assert_response_code_is(
+            response, 500, f"{method} {route} not blocked after the soak: {response.text}")
+
+
+def run_test(s: TestServer, c: CoreApi, duration: int):
+    collector = AssertionCollector()
+
+    load = s.load(build_traffic(), rate=TRAFFIC_RATE, duration=duration)
+    time.sleep(duration)
+    report = load.stop()
+    print(report)
+    collector.soft_assert(
+        report.error_rate <= MAX_ERROR_RATE,
+        f"{report.errors} of {report.sent} requests got no response during the soak: {report}")
+
+    check_attacks_blocked(collector)
+
+    collector.raise_if_failures()
+
+
+if __name__ == "__main__":
+    args, s, c = init_server_and_core()
+    run_test(s, c, args.soak_duration or DEFAULT_DURATION)
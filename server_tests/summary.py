@@ -0,0 +1,552 @@
+"""
+Test results: the TestResult record, the JSON results file and the GitHub step summary.
+
+Kept apart from run_test so results of several runs (e.g. the shards of a matrix) can be
+merged and summarized by merge_results without a docker daemon.
+"""
+import io
+import json
+import logging
+import os
+import re
+import sys
+from dataclasses import dataclass, field
+from datetime import datetime
+from enum import Enum
+from typing import Dict, List, Optional
+
+
+class GitHubActionsFormatter(logging.Formatter):
+    def format(self, record):
+        level = record.levelname.lower()
+        message = super().format(record)
+
+        if record.levelno == logging.ERROR:
+            return f"::error::{message}"
+        elif record.levelno == logging.WARNING:
+            return f"::warning::{message}"
+        elif record.levelno == logging.INFO:
+            return f"{message}"
+        elif record.levelno == logging.DEBUG:
+            return f"::debug::{message}"
+        else:
+            return message
+
+
+def get_logger(name: str = "github_actions_logger") -> logging.Logger:
+    sys.stdout.reconfigure(encoding='utf-8')
+    logger = logging.getLogger(name)
+    if not logger.hasHandlers():
+        handler = logging.StreamHandler(sys.stdout)
+        formatter = GitHubActionsFormatter(
+            "%(asctime)s - %(levelname)s - %(message)s")
+        handler.setFormatter(formatter)
+        logger.addHandler(handler)
+        logger.setLevel(logging.DEBUG)
+    return logger
+
+
+logger = get_logger()
+
+
+class TestStatus(Enum):
+    PASSED = "PASSED"
+    FAILED = "FAILED"
+    SKIPPED = "SKIPPED"
+    TIMEOUT = "TIMEOUT"
+
+
+@dataclass
+class TestResult:
+    test_dir: str
+    start_time: datetime
+    end_time: Optional[datetime] = None
+    status: TestStatus = TestStatus.FAILED
+    error_message: Optional[str] = None
+    duration: Optional[float] = None
+    failed_assertions: Optional[List[str]] = None
+    # assertion records reported by the test (see result_protocol)
+    assertions: Optional[List[dict]] = None
+    # seconds spent in each phase of the run, see PHASES
+    phases: Dict[str, float] = field(default_factory=dict)
+    # latency histograms of the test's benchmarked requests, per route (see latency)
+    latency: Optional[List[dict]] = None
+    # agent overhead measurements of a benchmark test, see testlib.report_benchmark
+    benchmark: Optional[List[dict]] = None
+    # resource samples and memory growth of a soak test, see soak.analyze_soak
+    soak: Optional[dict] = None
+    # peak CPU, memory and pids of the test's container, see resource_monitor.summarize
+    resources: Optional[dict] = None
+
+    def complete(self, status: TestStatus, error_message: Optional[str] = None):
+        self.end_time = datetime.now()
+        self.status = status
+        self.error_message = error_message
+        self.duration = (self.end_time - self.start_time).total_seconds()
+
+    def to_json(self) -> dict:
+        return {
+            "test": self.test_dir,
+            "status": self.status.value,
+            "start_time": self.start_time.isoformat(),
+            "end_time": self.end_time.isoformat() if self.end_time else None,
+            "duration": self.duration,
+            "error_message": self.error_message,
+            "failed_assertions": self.failed_assertions,
+            "phases": self.phases,
+            "assertions": self.assertions,
+            "latency": self.latency,
+            "benchmark": self.benchmark,
+            "soak": self.soak,
+            "resources": self.resources,
+        }
+
+    @classmethod
+    def from_json(cls, data: dict) -> "TestResult":
+        return cls(
+            test_dir=data["test"],
+            start_time=datetime.fromisoformat(data["start_time"]),
+            end_time=datetime.fromisoformat(
+                data["end_time"]) if data.get("end_time") else None,
+            status=TestStatus(data["status"]),
+            error_message=data.get("error_message"),
+            duration=data.get("duration"),
+            failed_assertions=data.get("failed_assertions"),
+            assertions=data.get("assertions"),
+            phases=data.get("phases") or {},
+            latency=data.get("latency"),
+            benchmark=data.get("benchmark"),
+            soak=data.get("soak"),
+            resources=data.get("resources"),
+        )
+
+
+# Phases of a test run, in order, with their column name in the step summary
+PHASES = {
+    "config": "Start config",
+    "createdb": "Create DB",
+    "docker_run": "Docker run",
+    "readiness": "Readiness",
+    "test": "Test",
+    "logs": "Logs",
+    "teardown": "Teardown",
+}
+
+
+def _escape_markdown(text: str) -> str:
+    """Escape characters that can break GitHub markdown rendering."""
+    # Escape HTML-like angle brackets to prevent them being parsed as tags
+    text = text.replace("<", "&lt;").replace(">", "&gt;")
+    # Escape pipe for table cells
+    text = text.replace("|", "\\|")
+    # Escape backticks to prevent inline code spans
+    text = text.replace("`", "\\`")
+    return text
+
+
+def _linkify_line_ref(text: str, test_dir: str) -> str:
+    """Replace [line X → line Y → ...] prefix with clickable GitHub links."""
+    def _make_link(line_num: str) -> str:
+        url = f"https://github.com/AikidoSec/firewall-tester-action/blob/main/server_tests/{test_dir}/test.py#L{line_num}"
+        return f'<a href="{url}">line {line_num}</a>'
+
+    # Match the entire bracket prefix: [line N] or [line N → line M → ...]
+    bracket_match = re.match(r'\[(line \d+(?:\s*→\s*line \d+)*)\]\s*', text)
+    if bracket_match:
+        inner = bracket_match.group(1)
+        # Replace each "line N" with an HTML link
+        linked = re.sub(r'line (\d+)', lambda m: _make_link(m.group(1)), inner)
+        text = linked + " " + text[bracket_match.end():]
+    return text
+
+
+def _get_source_context(test_dir: str, assertion_text: str, context_lines: int = 3) -> Optional[str]:
+    """Extract lines around each failure frame from test.py (context_lines before + the line + context_lines after)."""
+    line_nums = [int(m) for m in re.findall(r'line (\d+)', assertion_text)]
+    if not line_nums:
+        return None
+    test_file = os.path.join(os.path.dirname(__file__), test_dir, "test.py")
+    try:
+        with open(test_file, 'r') as f:
+            lines = f.readlines()
+        snippets = []
+        for line_num in line_nums:
+            start = max(0, line_num - 1 - context_lines)
+            end = min(len(lines), line_num + context_lines)
+            snippet_lines = []
+            for i in range(start, end):
+                marker = "→" if (i + 1) == line_num else " "
+                snippet_lines.append(
+                    f"{marker} {i + 1:>4} | {lines[i].rstrip()}")
+            snippets.append("\n".join(snippet_lines))
+        return "\n\n".join(snippets)
+    except Exception:
+        return None
+
+
+def _build_summary_header(test_results: List[TestResult]) -> str:
+    """Build the overview and results table (always included)."""
+    buf = io.StringIO()
+    buf.write("\n## Test Results Summary\n\n")
+
+    total_tests = len(test_results)
+    passed_tests = sum(
+        1 for r in test_results if r.status == TestStatus.PASSED)
+    skipped_tests = sum(
+        1 for r in test_results if r.status == TestStatus.SKIPPED)
+    timeout_tests = sum(
+        1 for r in test_results if r.status == TestStatus.TIMEOUT)
+    failed_tests = sum(
+        1 for r in test_results if r.status == TestStatus.FAILED)
+
+    buf.write("### Overview\n\n")
+    buf.write(f"- **Total Tests:** {total_tests}\n")
+    buf.write(f"- **Passed:** {passed_tests}\n")
+    buf.write(f"- **Skipped:** {skipped_tests}\n")
+    buf.write(f"- **Timed Out:** {timeout_tests}\n")
+    buf.write(f"- **Failed:** {failed_tests}\n")
+
+    buf.write("### Detailed Results\n\n")
+    buf.write("| Test | Status | Duration | Error Message |\n")
+    buf.write("|------|--------|----------|---------------|\n")
+
+    for result in test_results:
+        status_emoji = {
+            TestStatus.PASSED: "✅ PASS",
+            TestStatus.FAILED: "❌ FAIL",
+            TestStatus.SKIPPED: "⏭️ SKIP",
+            TestStatus.TIMEOUT: "⏰ TIMEOUT"
+        }
+        status = status_emoji[result.status]
+        duration = f"{result.duration:.2f}s" if result.duration is not None else "N/A"
+        if result.failed_assertions:
+            error = f"{len(result.failed_assertions)} assertion(s) failed (see details below)"
+        elif result.error_message:
+            error = result.error_message
+        else:
+            error = "-"
+        error = _escape_markdown(error)
+        buf.write(
+            f"| {result.test_dir} | {status} | {duration} | {error} |\n")
+
+    buf.write(_build_phase_breakdown(test_results))
+    buf.write(_build_latency_tables(test_results))
+    buf.write(_build_benchmark_tables(test_results))
+    buf.write(_build_soak_tables(test_results))
+    buf.write(_build_resource_usage(test_results))
+
+    return buf.getvalue()
+
+
+def _build_phase_breakdown(test_results: List[TestResult]) -> str:
+    """Table of the seconds each test spent per phase, with a total row."""
+    timed_results = [r for r in test_results if r.phases]
+    if not timed_results:
+        return ""
+
+    buf = io.StringIO()
+    buf.write("\n### Phase Breakdown (seconds)\n\n")
+    buf.write("| Test | " + " | ".join(PHASES.values()) + " |\n")
+    buf.write("|------|" + "|".join("-" * (len(label) + 2)
+              for label in PHASES.values()) + "|\n")
+
+    totals = {phase: 0.0 for phase in PHASES}
+    for result in timed_results:
+        cells = []
+        for phase in PHASES:
+            if phase in result.phases:
+                totals[phase] += result.phases[phase]
+                cells.append(f"{result.phases[phase]:.1f}")
+            else:
+                cells.append("-")
+        buf.write(f"| {result.test_dir} | " + " | ".join(cells) + " |\n")
+    buf.write("| **Total** | " +
+              " | ".join(f"**{totals[phase]:.1f}**" for phase in PHASES) + " |\n")
+
+    return buf.getvalue()
+
+
+# routes per test in the latency table, the ones with the most requests first
+_LATENCY_ROUTES_PER_TEST = 20
+
+
+def _format_number(value: Optional[float]) -> str:
+    return f"{value:.1f}" if value is not None else "-"
+
+
+def _build_latency_tables(test_results: List[TestResult]) -> str:
+    """Percentiles of the benchmarked requests, per test and (method, route, status)."""
+    benchmarked = [r for r in test_results if r.latency]
+    if not benchmarked:
+        return ""
+
+    buf = io.StringIO()
+    buf.write("\n### Latency (ms)\n\n")
+    buf.write("| Test | Method | Route | Status | Count | p50 | p90 | p99 | Max |\n")
+    buf.write("|------|--------|-------|--------|-------|-----|-----|-----|-----|\n")
+    for result in benchmarked:
+        routes = sorted(result.latency, key=lambda r: r["count"], reverse=True)
+        for route in routes[:_LATENCY_ROUTES_PER_TEST]:
+            status = route["status"] if route["status"] is not None else "error"
+            buf.write(
+                f"| {result.test_dir} | {route['method']} | {_escape_markdown(route['route'])} | {status} "
+                f"| {route['count']} | {_format_number(route['p50'])} | {_format_number(route['p90'])} "
+                f"| {_format_number(route['p99'])} | {_format_number(route['max'])} |\n")
+        if len(routes) > _LATENCY_ROUTES_PER_TEST:
+            buf.write(f"| {result.test_dir} | | _{len(routes) - _LATENCY_ROUTES_PER_TEST} more route(s) "
+                      f"in the results file_ | | | | | | |\n")
+
+    return buf.getvalue()
+
+
+def _format_delta(without: Optional[float], with_agent: Optional[float]) -> str:
+    if not without or with_agent is None:
+        return "-"
+    return f"{(with_agent - without) / without:+.1%}"
+
+
+def _build_benchmark_tables(test_results: List[TestResult]) -> str:
+    """Throughput and latency of the same app without and with the agent, per route and concurrency."""
+    benchmarked = [r for r in test_results if r.benchmark]
+    if not benchmarked:
+        return ""
+
+    buf = io.StringIO()
+    buf.write("\n### Agent Overhead\n\n")
+    buf.write("| Test | Route | Concurrency | req/s without | req/s with | Δ req/s "
+              "| p50 without | p50 with | Δ p50 | p99 without | p99 with | Δ p99 |\n")
+    buf.write("|------|-------|-------------|---------------|------------|---------"
+              "|-------------|----------|-------|-------------|----------|-------|\n")
+    for result in benchmarked:
+        for row in result.benchmark:
+            without, with_agent = row["without"], row["with"]
+            cells = [f"{without['rps']:.1f}", f"{with_agent['rps']:.1f}",
+                     _format_delta(without["rps"], with_agent["rps"])]
+            for percentile in ("p50", "p99"):
+                cells += [_format_number(without[percentile]), _format_number(with_agent[percentile]),
+                          _format_delta(without[percentile], with_agent[percentile])]
+            buf.write(f"| {result.test_dir} | {row['method']} {_escape_markdown(row['route'])} "
+                      f"| {row['concurrency']} | " + " | ".join(cells) + " |\n")
+
+    return buf.getvalue()
+
+
+def _format_mib(value: Optional[float]) -> str:
+    return f"{value / (1024 * 1024):.1f}" if value is not None else "-"
+
+
+def _format_count(value: Optional[int]) -> str:
+    return str(value) if value is not None else "-"
+
+
+def _build_soak_tables(test_results: List[TestResult]) -> str:
+    """Memory growth and resource usage of the soak tests."""
+    soaked = [r for r in test_results if r.soak]
+    if not soaked:
+        return ""
+
+    buf = io.StringIO()
+    buf.write("\n### Soak\n\n")
+    buf.write("| Test | Duration (s) | Samples | Memory start (MiB) | Memory end (MiB) "
+              "| Growth (MiB/h) | Max growth (MiB/h) | CPU mean (%) | Open fds |\n")
+    buf.write("|------|--------------|---------|--------------------|------------------"
+              "|----------------|--------------------|--------------|----------|\n")
+    for result in soaked:
+        soak = result.soak
+        fds = "-"
+        if soak.get("fds_start") is not None:
+            fds = f"{soak['fds_start']} → {soak['fds_end']}"
+        buf.write(
+            f"| {result.test_dir} | {soak['duration']} | {len(soak['samples'])} "
+            f"| {_format_mib(soak.get('memory_start'))} | {_format_mib(soak.get('memory_end'))} "
+            f"| {_format_number(soak['memory_slope'])} | {soak['max_memory_slope']:g} "
+            f"| {_format_number(soak.get('cpu_mean'))} | {fds} |\n")
+
+    return buf.getvalue()
+
+
+def _build_resource_usage(test_results: List[TestResult]) -> str:
+    """Peak CPU, memory and pids of each test's container, and its CPU time and traffic during the test."""
+    sampled = [r for r in test_results if r.resources]
+    if not sampled:
+        return ""
+
+    columns = [("cpu_seconds", "CPU time (s)", _format_number), ("cpu_peak", "Peak CPU (%)", _format_number),
+               ("memory_peak", "Peak memory (MiB)", _format_mib), ("net_rx", "Net in (MiB)", _format_mib),
+               ("net_tx", "Net out (MiB)", _format_mib), ("pids_peak", "Peak PIDs", _format_count)]
+    buf = io.StringIO()
+    buf.write("\n### Resource Usage\n\n")
+    buf.write("| Test | " + " | ".join(label for _, label, _ in columns) + " |\n")
+    buf.write("|------|" + "|".join("-" * (len(label) + 2) for _, label, _ in columns) + "|\n")
+    for result in sorted(sampled, key=lambda r: r.resources.get("memory_peak") or 0, reverse=True):
+        buf.write(f"| {result.test_dir} | " +
+                  " | ".join(fmt(result.resources.get(key)) for key, _, fmt in columns) + " |\n")
+    # what a runner has to fit: the largest test, times max_parallel_tests
+    peaks = {key: max((r.resources[key] for r in sampled if r.resources.get(key) is not None), default=None)
+             for key, _, _ in columns}
+    buf.write("| **Max** | " + " | ".join(f"**{fmt(peaks[key])}**" for key, _, fmt in columns) + " |\n")
+
+    return buf.getvalue()
+
+
+def write_results_file(results_file: str, test_results: List[TestResult], build_duration: float) -> None:
+    """Write the results, with per-phase timings, as JSON for trending across runs."""
+    if not results_file:
+        return
+    results = {
+        "build_duration": build_duration,
+        "tests": [result.to_json() for result in test_results],
+    }
+    try:
+        with open(results_file, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    except OSError as e:
+        logger.warning(f"Could not write results file {results_file}: {e}")
+
+
+def load_results_file(results_file: str) -> dict:
+    """Read a file written by write_results_file, with its tests as TestResult objects."""
+    with open(results_file, "r", encoding="utf-8") as f:
+        results = json.load(f)
+    results["tests"] = [TestResult.from_json(test)
+                        for test in results.get("tests", [])]
+    return results
+
+
+def _build_details_block(result: TestResult, include_snippets: bool, max_assertions: Optional[int] = None) -> str:
+    """Build a single <details> block for one failed test."""
+    buf = io.StringIO()
+    total = len(result.failed_assertions)
+    assertions = result.failed_assertions
+    if max_assertions and max_assertions < total:
+        assertions = assertions[:max_assertions]
+
+    buf.write(f"<details>\n")
+    buf.write(
+        f"<summary>{result.test_dir} - {total} failed assertion(s)</summary>\n\n")
+    for i, assertion in enumerate(assertions, 1):
+        escaped = _escape_markdown(assertion)
+        escaped = _linkify_line_ref(escaped, result.test_dir)
+        indent = " " * (len(str(i)) + 2)
+        buf.write(f"{i}. {escaped}\n")
+        if include_snippets:
+            snippet = _get_source_context(result.test_dir, assertion)
+            if snippet:
+                buf.write(f"{indent}<details>\n")
+                buf.write(f"{indent}<summary>Show source</summary>\n\n")
+                buf.write(f"{indent}```python\n")
+                for snippet_line in reversed(snippet.split("\n")):
+                    buf.write(f"{indent}{snippet_line}\n")
+                buf.write(f"{indent}```\n")
+                buf.write(f"{indent}</details>\n")
+    if max_assertions and max_assertions < total:
+        buf.write(
+            f"\n*... and {total - max_assertions} more assertion(s) truncated to fit summary size limit.*\n")
+    buf.write(f"\n</details>\n\n")
+    return buf.getvalue()
+
+
+# GitHub step summary limit is 1024 KB; use 1020 KB as safe threshold
+_SUMMARY_SIZE_LIMIT = 1020 * 1024
+
+
+def write_summary_to_github_step_summary(test_results: List[TestResult]):
+    summary_path = os.environ.get('GITHUB_STEP_SUMMARY')
+    if not summary_path:
+        logger.warning("GITHUB_STEP_SUMMARY environment variable not set")
+        return
+
+    header = _build_summary_header(test_results)
+
+    failed_with_details = [
+        r for r in test_results if r.failed_assertions]
+
+    if not failed_with_details:
+        # No details section needed – just write the header
+        with open(summary_path, 'a', encoding='utf-8') as f:
+            f.write(header)
+        return
+
+    details_heading = "\n### Failed Assertions Details\n\n"
+
+    # Strategy 1: full details with snippets
+    details_blocks = [_build_details_block(
+        r, include_snippets=True) for r in failed_with_details]
+    full_content = header + details_heading + "".join(details_blocks)
+
+    if len(full_content.encode('utf-8')) <= _SUMMARY_SIZE_LIMIT:
+        with open(summary_path, 'a', encoding='utf-8') as f:
+            f.write(full_content)
+        return
+
+    logger.warning(
+        f"Summary with snippets is {len(full_content.encode('utf-8')) // 1024}KB, "
+        f"exceeds {_SUMMARY_SIZE_LIMIT // 1024}KB limit – removing source snippets")
+
+    # Strategy 2: details without snippets
+    details_blocks = [_build_details_block(
+        r, include_snippets=False) for r in failed_with_details]
+    full_content = header + details_heading + "".join(details_blocks)
+
+    if len(full_content.encode('utf-8')) <= _SUMMARY_SIZE_LIMIT:
+        with open(summary_path, 'a', encoding='utf-8') as f:
+            f.write(full_content)
+        return
+
+    logger.warning(
+        f"Summary without snippets is {len(full_content.encode('utf-8')) // 1024}KB, "
+        f"still exceeds limit – capping assertions per test")
+
+    # Strategy 3: no snippets + cap assertions per test, progressively reduce
+    for cap in [20, 10, 5]:
+        details_blocks = [_build_details_block(
+            r, include_snippets=False, max_assertions=cap) for r in failed_with_details]
+        full_content = header + details_heading + "".join(details_blocks)
+        if len(full_content.encode('utf-8')) <= _SUMMARY_SIZE_LIMIT:
+            with open(summary_path, 'a', encoding='utf-8') as f:
+                f.write(full_content)
+            return
+
+    # Strategy 4: only header + a note that details were truncated
+    logger.warning(
+        "Summary still too large – writing header only with truncation notice")
+    truncation_notice = (
+        "\n### Failed Assertions Details\n\n"
+        "> ⚠️ Detailed assertion failures were omitted because the summary exceeded "
+        "GitHub's 1024KB size limit. Check the test logs for full details.\n\n"
+    )
+    with open(summary_path, 'a', encoding='utf-8') as f:
+        f.write(header + truncation_notice)
+
+
+def report_and_exit(test_results: List[TestResult], ignore_failures: str = "false") -> None:
+    """Print the summary to the console and exit with an error if any test failed or timed out."""
+    logger.info("\nTest Summary:")
+    logger.info("=" * 50)
+    total_tests = len(test_results)
+    passed_tests = sum(
+        1 for r in test_results if r.status == TestStatus.PASSED)
+    skipped_tests = sum(
+        1 for r in test_results if r.status == TestStatus.SKIPPED)
+    timeout_tests = sum(
+        1 for r in test_results if r.status == TestStatus.TIMEOUT)
+    failed_tests = sum(
+        1 for r in test_results if r.status == TestStatus.FAILED)
+    total_duration = sum(
+        r.duration for r in test_results if r.duration is not None)
+
+    logger.info(f"Total Tests: {total_tests}")
+    logger.info(f"Passed: {passed_tests}")
+    logger.info(f"Skipped: {skipped_tests}")
+    logger.info(f"Timed Out: {timeout_tests}")
+    logger.info(f"Failed: {failed_tests}")
+    logger.info(f"Total Duration: {total_duration:.2f} seconds")
+    logger.info("=" * 50)
+
+    # Exit with error if any tests failed or timed out
+    if failed_tests > 0 or timeout_tests > 0:
+        if ignore_failures == "true":
+            logger.warning("Tests failed but ignoring failures as requested")
+            sys.exit(0)
+        else:
+            sys.exit(1)
@@ -73,22 +73,21 @@ def get_api_spec_simple():
 
 
 def run_api_spec_tests(collector, fns, expected_json, s: TestServer, c: CoreApi):
-    start_events = c.get_events("heartbeat")
+    cursor = c.get_events_cursor()
     for fn in fns:
         response = s.post(*fn())
         collector.soft_assert_response_code_is(response, 200)
 
-    c.wait_for_new_events(70, old_events_length=len(
-        start_events), filter_type="heartbeat")
+    # the first heartbeat that reports the routes just called
+    c.flush_heartbeat()
+    heartbeat = c.wait_for_heartbeat(
+        70, cursor, lambda heartbeat: len(heartbeat.get("routes", [])) > 0)
 
-    all_events = c.get_events("heartbeat")
-    new_events = all_events[len(start_events):]
-
-    # Prerequisite: need exactly 1 event to check its contents
-    if not collector.soft_assert(len(new_events) == 1, f"Expected 1 new heartbeat event, got {len(new_events)}"):
+    # Prerequisite: need the heartbeat to check its contents
+    if not collector.soft_assert(heartbeat is not None, "Expected a heartbeat event with routes, got none"):
         return
     try:
-        assert_event_contains_subset_file(new_events[0], expected_json)
+        assert_event_contains_subset_file(heartbeat, expected_json)
     except AssertionError as e:
         collector.add_failure(str(e))
 
@@ -44,7 +44,7 @@ def run_test(s: TestServer, c: CoreApi):
     ]
 
     # Baseline events before sending any traffic for this test
-    start_heartbeat_events = c.get_events("heartbeat")
+    cursor = c.get_events_cursor()
 
     # Send multiple requests from each bypass IP and ensure they are never blocked
     for ip in bypass_ips:
@@ -106,12 +106,9 @@ def run_test(s: TestServer, c: CoreApi):
             response, 200, f"Request from bypass IP {ip['ip']} ({ip['type']}) should bypass blocked user IDs: {response.text}")
 
     # Wait a bit to give the agent time to potentially send heartbeat / stats
-    c.wait_for_new_events(
-        70, old_events_length=len(start_heartbeat_events), filter_type="heartbeat"
-    )
+    c.wait_for_events_since(70, cursor, filter_type="heartbeat")
 
-    all_heartbeat_events = c.get_events("heartbeat")
-    new_heartbeat_events = all_heartbeat_events[len(start_heartbeat_events):]
+    new_heartbeat_events, _ = c.events_since(cursor, "heartbeat")
 
     # Prerequisite: need exactly 1 heartbeat event to inspect its contents
     if not collector.soft_assert(
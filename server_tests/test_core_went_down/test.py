@@ -22,15 +22,13 @@ def check_attacks_blocked(collector, s, response_code):
 
 
 def check_event_is_submitted_shell_injection(collector, s, c, response_code, expected_json):
-    start_events = c.get_events("detected_attack")
+    cursor = c.get_events_cursor()
     response = s.post("/api/execute", {"userCommand": "whoami"})
     collector.soft_assert_response_code_is(response, response_code)
 
-    c.wait_for_new_events(5, old_events_length=len(
-        start_events), filter_type="detected_attack")
+    c.wait_for_events_since(5, cursor, filter_type="detected_attack")
 
-    all_events = c.get_events("detected_attack")
-    new_events = all_events[len(start_events):]
+    new_events, _ = c.events_since(cursor, "detected_attack")
 
     # Prerequisite: need exactly 1 event to check its contents
     if not collector.soft_assert(len(new_events) == 1, f"Expected 1 new event, got {len(new_events)}"):
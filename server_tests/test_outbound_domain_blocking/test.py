@@ -33,58 +33,53 @@ MOCK_SERVER_CONTAINER = "mock-server-outbound-domain-blocking"
 # The temporary network that connects the demo app to the mock server.
 MOCK_SERVER_NETWORK = "mock-network-outbound-domain-blocking"
 # The active Docker engine type, used to choose Linux vs Windows container commands.
-DOCKER_OSTYPE = subprocess.run(
-    ["docker", "info", "--format", "{{.OSType}}"],
-    capture_output=True,
-    text=True,
-    check=True,
-).stdout.strip().lower()
-
-
-def wait_for_running_container(container_name: str, timeout_seconds: int = 20):
-    deadline = time.time() + timeout_seconds
-    while time.time() < deadline:
-        result = subprocess.run(f'docker inspect -f "{{{{.State.Running}}}}" {container_name}', shell=True, capture_output=True, text=True)
-        if result.returncode == 0 and result.stdout.strip().lower() == "true":
-            return
-        time.sleep(1)
-    raise Exception(f"Container {container_name} did not start after {timeout_seconds} seconds")
+DOCKER_OSTYPE = get_docker().info()["OSType"].strip().lower()
 
 
 def start_mock_server():
     path = os.path.dirname(__file__)
 
+    docker = get_docker()
     driver = "nat" if DOCKER_OSTYPE == "windows" else "bridge"
-    subprocess.run(f'docker network create --driver {driver} --subnet {MOCK_SERVER_SUBNET} {MOCK_SERVER_NETWORK}', shell=True, check=True)
-    subprocess.run(f'docker network connect {MOCK_SERVER_NETWORK} {TARGET_CONTAINER_NAME}', shell=True, check=True)
+    docker.create_network(MOCK_SERVER_NETWORK, driver, MOCK_SERVER_SUBNET)
+    docker.connect_network(MOCK_SERVER_NETWORK, TARGET_CONTAINER_NAME)
 
     if DOCKER_OSTYPE == "windows":
-        command = f'docker run -d --name {MOCK_SERVER_CONTAINER} --network {MOCK_SERVER_NETWORK} --ip {MOCK_SERVER_IP} -v "{path}:C:\\test:ro" mcr.microsoft.com/windows-cssc/python:3.13-nanoserver-ltsc2022 python C:\\test\\mock-server.py'
+        image = "mcr.microsoft.com/windows-cssc/python:3.13-nanoserver-ltsc2022"
+        bind = f"{path}:C:\\test:ro"
+        cmd = ["python", "C:\\test\\mock-server.py"]
     else:
-        command = f'docker run -d --name {MOCK_SERVER_CONTAINER} --network {MOCK_SERVER_NETWORK} --ip {MOCK_SERVER_IP} -v "{path}:/test:ro" python:3.13-alpine python /test/mock-server.py'
+        image = "python:3.13-alpine"
+        bind = f"{path}:/test:ro"
+        cmd = ["python", "/test/mock-server.py"]
 
-    subprocess.run(command, shell=True, check=True)
-    wait_for_running_container(MOCK_SERVER_CONTAINER)
+    docker.run_container(MOCK_SERVER_CONTAINER, image, cmd=cmd, binds=[bind],
+                         network=MOCK_SERVER_NETWORK, ip=MOCK_SERVER_IP)
+    docker.wait_for_running(MOCK_SERVER_CONTAINER)
 
 
 def stop_mock_server():
-    subprocess.run(f'docker rm -f {MOCK_SERVER_CONTAINER}', shell=True, check=False, capture_output=True)
-    subprocess.run(f'docker network disconnect {MOCK_SERVER_NETWORK} {TARGET_CONTAINER_NAME}', shell=True, check=False, capture_output=True)
-    subprocess.run(f'docker network rm {MOCK_SERVER_NETWORK}', shell=True, check=False, capture_output=True)
+    docker = get_docker()
+    docker.remove_container(MOCK_SERVER_CONTAINER)
+    docker.disconnect_network(MOCK_SERVER_NETWORK, TARGET_CONTAINER_NAME)
+    docker.remove_network(MOCK_SERVER_NETWORK)
 
 
 def set_etc_hosts(hostname: str):
     if DOCKER_OSTYPE == "windows":
-        command = f'docker exec {TARGET_CONTAINER_NAME} cmd /c "echo {MOCK_SERVER_IP} {hostname} >> %SystemRoot%\\System32\\drivers\\etc\\hosts"'
+        exit_code, output = get_docker().exec_run(TARGET_CONTAINER_NAME, [
+            "cmd", "/c", f"echo {MOCK_SERVER_IP} {hostname} >> %SystemRoot%\\System32\\drivers\\etc\\hosts"])
     else:
-        command = f'docker exec -u 0 {TARGET_CONTAINER_NAME} sh -c "echo {MOCK_SERVER_IP} {hostname} >> /etc/hosts"'
+        exit_code, output = get_docker().exec_run(TARGET_CONTAINER_NAME, [
+            "sh", "-c", f"echo {MOCK_SERVER_IP} {hostname} >> /etc/hosts"], user="0")
 
-    subprocess.run(command, shell=True, check=True)
+    if exit_code != 0:
+        raise Exception(f"Failed to add {hostname} to hosts file: {output}")
 
 
 def test_explicitly_blocked_domain(collector, s: TestServer, c: CoreApi):
 
-    start_events = c.get_events("heartbeat")
+    cursor = c.get_events_cursor()
 
     """Test that explicitly blocked domains are always blocked"""
     response = s.post("/api/request",
@@ -189,18 +184,15 @@ def test_explicitly_blocked_domain(collector, s: TestServer, c: CoreApi):
         collector.soft_assert_response_body_contains(
             response, "blocked an outbound connection", f"{response.text} - percent-encoded hostname b%C3%B6se.example.com should not be allowed")
 
-    c.wait_for_new_events(120, old_events_length=len(
-        start_events), filter_type="heartbeat")
-
-    # test heartbeat event ()
-    all_events = c.get_events("heartbeat")
-    new_events = all_events[len(start_events):]
+    # test heartbeat event: the first one that reports outbound hostnames
+    c.flush_heartbeat()
+    heartbeat = c.wait_for_heartbeat(
+        120, cursor, lambda heartbeat: len(heartbeat.get("hostnames", [])) > 0)
 
-    # # Prerequisite: need exactly 1 heartbeat event to check contents
-    if not collector.soft_assert(len(new_events) == 1, f"Expected 1 new heartbeat event, got {len(new_events)}"):
+    # Prerequisite: need the heartbeat to check its contents
+    if not collector.soft_assert(heartbeat is not None, "Expected a heartbeat event with hostnames, got none"):
         return
 
-    heartbeat = new_events[0]
     # assrt hostname in heartbeat
     collector.soft_assert("hostnames" in heartbeat,
                           "hostnames should be in heartbeat")
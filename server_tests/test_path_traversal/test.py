@@ -14,16 +14,14 @@ from core_api import CoreApi
 
 
 def check_path_traversal_with_event(collector, response_code, expected_json):
-    start_events = c.get_events("detected_attack")
+    cursor = c.get_events_cursor()
     response = s.get("/api/read?path=../secrets/key.txt")
     collector.soft_assert_response_code_is(response, response_code,
                                            f"Path traversal check failed {response.text}")
 
-    c.wait_for_new_events(20, old_events_length=len(
-        start_events), filter_type="detected_attack")
+    c.wait_for_events_since(20, cursor, filter_type="detected_attack")
 
-    all_events = c.get_events("detected_attack")
-    new_events = all_events[len(start_events):]
+    new_events, _ = c.events_since(cursor, "detected_attack")
 
     if not collector.soft_assert(
             len(new_events) >= 1,
@@ -16,16 +16,14 @@ import os
 
 
 def check_sql_injection(collector, s, c, response_code, response_body, event_id, expected_json):
-    start_events = c.get_events("detected_attack")
+    cursor = c.get_events_cursor()
     response = s.post(
         "/api/create", {"name": "Malicious Pet', 'Gru from the Minions') --"})
     collector.soft_assert_response_body_contains(response, response_body)
 
-    c.wait_for_new_events(20, old_events_length=len(
-        start_events), filter_type="detected_attack")
+    c.wait_for_events_since(20, cursor, filter_type="detected_attack")
 
-    all_events = c.get_events("detected_attack")
-    new_events = all_events[len(start_events):]
+    new_events, _ = c.events_since(cursor, "detected_attack")
 
     # Prerequisite: need at least 1 event to check its contents
     if not collector.soft_assert(len(new_events) >= 1, f"Expected at least 1 new event, got {len(new_events)}"):
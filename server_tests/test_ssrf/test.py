@@ -19,12 +19,15 @@ import os
 
 def start_mock_servers(target_container_name: str):
     path = os.path.join(os.path.dirname(__file__), "mock-4000.sh")
-    subprocess.run(
-        f"docker run -d --name mock-4000-for-ssrf -v {path}:/mock-4000.sh:ro --network container:{target_container_name} alpine:3.20 sh /mock-4000.sh", shell=True)
+    docker = get_docker()
+    docker.run_container("mock-4000-for-ssrf", "alpine:3.20", cmd=["sh", "/mock-4000.sh"],
+                         binds=[f"{path}:/mock-4000.sh:ro"], network=f"container:{target_container_name}")
 
     path = os.path.join(os.path.dirname(__file__), "mock-imds.py")
-    subprocess.run(
-        f"docker run -d --name mock-imds -v {path}:/mock-imds.py:ro --network container:{target_container_name} --cap-add NET_ADMIN python:3.12-alpine sh -c 'apk add --no-cache iproute2 && python /mock-imds.py 169.254.169.254 100.100.100.200'", shell=True)
+    docker.run_container("mock-imds", "python:3.12-alpine",
+                         cmd=["sh", "-c", "apk add --no-cache iproute2 && python /mock-imds.py 169.254.169.254 100.100.100.200"],
+                         binds=[f"{path}:/mock-imds.py:ro"], network=f"container:{target_container_name}",
+                         cap_add=["NET_ADMIN"])
     time.sleep(20)
 
 
@@ -71,16 +74,14 @@ def generate_combinations(ip_str):
 
 
 def check_ssrf_with_event(collector, s, c, response_code, expected_json):
-    start_events = c.get_events("detected_attack")
+    cursor = c.get_events_cursor()
     response = s.post(
         "/api/request", {"url": "http://127.0.0.1:4000"}, timeout=10)
     collector.soft_assert_response_code_is(response, response_code)
 
-    c.wait_for_new_events(5, old_events_length=len(
-        start_events), filter_type="detected_attack")
+    c.wait_for_events_since(5, cursor, filter_type="detected_attack")
 
-    all_events = c.get_events("detected_attack")
-    new_events = all_events[len(start_events):]
+    new_events, _ = c.events_since(cursor, "detected_attack")
 
     # Prerequisite: need at least 1 event to check its contents
     if not collector.soft_assert(len(new_events) >= 1, f"Expected at least 1 new event, got {len(new_events)}"):
@@ -213,7 +214,5 @@ if __name__ == "__main__":
         start_mock_servers("test_ssrf")
         run_test(s, c)
     finally:
-        subprocess.run(
-            f"docker rm -f mock-4000-for-ssrf", shell=True)
-        subprocess.run(
-            f"docker rm -f mock-imds", shell=True)
+        get_docker().remove_container("mock-4000-for-ssrf")
+        get_docker().remove_container("mock-imds")
@@ -17,8 +17,8 @@ import os
 
 def start_mock_servers(target_container_name: str):
     path = os.path.join(os.path.dirname(__file__), "mock-4000.sh")
-    subprocess.run(
-        f"docker run -d --name mock-4000-for-php -v {path}:/mock-4000.sh:ro --network container:{target_container_name} alpine:3.20 sh /mock-4000.sh", shell=True)
+    get_docker().run_container("mock-4000-for-php", "alpine:3.20", cmd=["sh", "/mock-4000.sh"],
+                               binds=[f"{path}:/mock-4000.sh:ro"], network=f"container:{target_container_name}")
     time.sleep(20)
 
 
@@ -32,8 +32,7 @@ def run_test(s: TestServer, c: CoreApi):
         collector.soft_assert_response_code_is(
             response, 200, f"Aikido Zen should not block the request {response.text}")
     finally:
-        subprocess.run(
-            f"docker rm -f mock-4000-for-php", shell=True)
+        get_docker().remove_container("mock-4000-for-php")
     collector.raise_if_failures()
 
 
@@ -21,39 +21,30 @@ Test Steps:
 
 
 def set_etc_hosts(target_container_name: str, ip: str, hostname: str):
-    subprocess.run(
-        f"docker exec  -u 0 {target_container_name} sh -c 'echo {ip} {hostname} >> /etc/hosts'", shell=True)
+    get_docker().exec_run(target_container_name, [
+        "sh", "-c", f"echo {ip} {hostname} >> /etc/hosts"], user="0")
     time.sleep(5)
 
 
 def start_mock_servers(target_container_name: str):
     path = os.path.join(os.path.dirname(__file__), "mock-imds.py")
-    subprocess.run(
-        f"docker run -d --name {target_container_name}-mock-imds -v {path}:/mock-imds.py:ro --network container:{target_container_name} --cap-add NET_ADMIN python:3.12-alpine sh -c 'apk add --no-cache iproute2 && python /mock-imds.py 169.254.169.254'", shell=True)
-    i = 0
-    while True:
-        time.sleep(1)
-        if subprocess.run(
-                f"docker ps | grep {target_container_name}-mock-imds | grep Up", shell=True).returncode == 0:
-            break
-        time.sleep(1)
-        i += 1
-        if i > 20:
-            raise Exception(
-                f"Mock IMDS server did not start after {i} seconds")
+    docker = get_docker()
+    docker.run_container(f"{target_container_name}-mock-imds", "python:3.12-alpine",
+                         cmd=["sh", "-c", "apk add --no-cache iproute2 && python /mock-imds.py 169.254.169.254"],
+                         binds=[f"{path}:/mock-imds.py:ro"], network=f"container:{target_container_name}",
+                         cap_add=["NET_ADMIN"])
+    docker.wait_for_running(f"{target_container_name}-mock-imds")
 
 
 def check_ssrf_with_event(collector, response_code, expected_json):
-    start_events = c.get_events("detected_attack")
+    cursor = c.get_events_cursor()
     response = s.post("/api/stored_ssrf_2", timeout=10)
     collector.soft_assert_response_code_is(
         response, response_code, f"[{response.text}]")
 
-    c.wait_for_new_events(30, old_events_length=len(
-        start_events), filter_type="detected_attack")
+    c.wait_for_events_since(30, cursor, filter_type="detected_attack")
 
-    all_events = c.get_events("detected_attack")
-    new_events = all_events[len(start_events):]
+    new_events, _ = c.events_since(cursor, "detected_attack")
 
     if not collector.soft_assert(
             len(new_events) >= 1,
@@ -81,5 +72,4 @@ if __name__ == "__main__":
         start_mock_servers(target_container_name)
         run_test(s, c, target_container_name)
     finally:
-        subprocess.run(
-            f"docker rm -f {target_container_name}-mock-imds", shell=True)
+        get_docker().remove_container(f"{target_container_name}-mock-imds")
@@ -19,7 +19,7 @@ USER_ID = "42"
 def run_test(s: TestServer, c: CoreApi):
     collector = AssertionCollector()
 
-    start_events = c.get_events("heartbeat")
+    cursor = c.get_events_cursor()
 
     for _ in range(3):
         response = s.get("/api/pets/", headers={
@@ -29,17 +29,14 @@ def run_test(s: TestServer, c: CoreApi):
         collector.soft_assert_response_code_is(response, 200)
         time.sleep(0.5)
 
-    c.wait_for_new_events(70, old_events_length=len(
-        start_events), filter_type="heartbeat")
+    c.flush_heartbeat()
+    heartbeat = c.wait_for_heartbeat(
+        70, cursor, lambda heartbeat: len(heartbeat.get("users", [])) > 0)
 
-    all_events = c.get_events("heartbeat")
-    new_events = all_events[len(start_events):]
-
-    if not collector.soft_assert(len(new_events) >= 1, f"Expected at least 1 heartbeat event, got {len(new_events)}"):
+    if not collector.soft_assert(heartbeat is not None, "Expected a heartbeat event with users, got none"):
         collector.raise_if_failures()
         return
 
-    heartbeat = new_events[0]
     users = heartbeat.get("users", [])
 
     if not collector.soft_assert(len(users) >= 1, f"Expected at least 1 user in heartbeat, got {len(users)}"):
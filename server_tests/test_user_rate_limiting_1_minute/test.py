@@ -33,9 +33,10 @@ def run_test(s: TestServer, c: CoreApi):
         else:
             collector.soft_assert_response_code_is(response, 429)
 
-    for _ in range(100):
-        response = s.get(
-            "/api/pets/", headers={"X-Forwarded-For": "2.16.53.5"})
+    # the limit has to hold when the requests arrive at the same time
+    responses = s.burst(
+        [("GET", "/api/pets/", {"X-Forwarded-For": "2.16.53.5"})] * 100)
+    for response in responses:
         collector.soft_assert_response_code_is(response, 200)
 
     # check that the rate limiting is working
@@ -63,9 +64,9 @@ def run_test(s: TestServer, c: CoreApi):
         "/api/pets%2f..%2fsecret", "/api/pets%2f/", "/api/%2e%2e/pets"
     ]
 
-    for test in tests:
-        response = s.get_raw(test, headers={"X-Forwarded-For": "2.16.53.5"})
-
+    responses = s.burst(
+        [("GET", test, {"X-Forwarded-For": "2.16.53.5"}) for test in tests])
+    for test, response in zip(tests, responses):
         collector.soft_assert_response_code_is_not(
             response, 200, f"Should not be 200 for {test} ")
 
@@ -92,8 +93,9 @@ def run_test(s: TestServer, c: CoreApi):
         "/test_ratelimiting_1%2f..%2fsecret", "/test_ratelimiting_1%2f/", "/%2e%2e/test_ratelimiting_1"
     ]
 
-    for test in tests:
-        response = s.get_raw(test, headers={"X-Forwarded-For": "2.16.53.5"})
+    responses = s.burst(
+        [("GET", test, {"X-Forwarded-For": "2.16.53.5"}) for test in tests])
+    for test, response in zip(tests, responses):
         collector.soft_assert_response_code_is_not(
             response, 200, f"Should not be 200 for {test} ")
 
@@ -25,10 +25,13 @@ Negative Tests (expect no detection):
 - Bypass IP: Tests that requests from allowed/bypass IP addresses don't trigger detection
   (sends 15 requests, expects 0 events)
 
+The scenarios use distinct IPs and user ids, so they run concurrently (each positive test followed by
+its same IP retry) and match events on their own IP.
+
 NOTE: Tests for HTTP methods (BDMTHD, etc.) are not included because they don't reach the aikido middleware.
 """
 
-# Initialize iterators for deterministic value selection
+# Values are picked in order, so every attack wave covers each of them
 filenames = [
     ".addressbook",
     ".atom",
@@ -45,7 +48,6 @@ filenames = [
     ".gitlab-ci.yml",
     ".gitmodules",
 ]
-_filename_iterator = itertools.cycle(filenames)
 directories = [
     ".gem",
     ".git",
@@ -59,7 +61,6 @@ directories = [
     "apache",
     "apache2"
 ]
-_directory_iterator = itertools.cycle(directories)
 
 file_extensions = [
     "env",
@@ -74,7 +75,6 @@ file_extensions = [
     "sqlitedb",
     "sqlite3db"
 ]
-_file_extension_iterator = itertools.cycle(file_extensions)
 
 queries = [
     "SELECT (CASE WHEN 1=1",
@@ -93,51 +93,41 @@ queries = [
     "UNION ALL SELECT 1",
     "../../etc/passwd",
 ]
-_query_iterator = itertools.cycle(queries)
-
-
-def get_filename():
-    return next(_filename_iterator)
-
-
-def get_directory_name():
-    return next(_directory_iterator)
 
 
-def get_file_extension():
-    return next(_file_extension_iterator)
+def cycle_paths(path_template, values):
+    """A get_method_path function that cycles through `values` deterministically, on its own."""
+    iterator = itertools.cycle(values)
 
+    def get_method_path():
+        return "GET", path_template.format(next(iterator))
+    return get_method_path
 
-def get_query():
-    return next(_query_iterator)
 
+def filename_paths():
+    return cycle_paths("/api/execute/{}", filenames)
 
-def get_random_path_filename():
-    return "GET", f"/api/execute/{get_filename()}"
 
+def directory_paths():
+    return cycle_paths("/api/pets/{}/test.txt", directories)
 
-def get_random_path_directory():
-    return "GET", f"/api/pets/{get_directory_name()}/test.txt"
 
+def extension_paths():
+    return cycle_paths("/api/pets/file.{}", file_extensions)
 
-def get_random_path_extension():
-    return "GET", f"/api/pets/file.{get_file_extension()}"
 
-
-def get_random_path_query():
-    return "GET", f"/api/pets/?path={get_query()}"
+def query_paths():
+    return cycle_paths("/api/pets/?path={}", queries)
 
 
 def check_wave_attack(collector, get_method_path, ip, user_id, len_samples):
-    start_events = c.get_events("detected_attack_wave")
+    cursor = c.get_events_cursor()
     for i in range(16):
         method, path = get_method_path()
         r = s.request(method, path,
                       headers={"X-Forwarded-For": ip, "user": user_id})
-    c.wait_for_new_events(20, old_events_length=len(
-        start_events), filter_type="detected_attack_wave")
-    all_events = c.get_events("detected_attack_wave")
-    new_events = all_events[len(start_events):]
+    new_events = c.wait_for_matching_events(
+        20, cursor, lambda event: event_matches(event, ip=ip), "detected_attack_wave")
 
     # Prerequisite: need exactly 1 event to inspect its contents
     if not collector.soft_assert(
@@ -204,15 +194,13 @@ def check_wave_attack(collector, get_method_path, ip, user_id, len_samples):
 
 
 def check_wave_attack_with_same_ip(collector, get_method_path, ip, user_id):
-    start_events = c.get_events("detected_attack_wave")
+    cursor = c.get_events_cursor()
     for i in range(16):
         method, path = get_method_path()
         r = s.request(method, path,
                       headers={"X-Forwarded-For": ip, "user": user_id})
-    c.wait_for_new_events(5, old_events_length=len(
-        start_events), filter_type="detected_attack_wave")
-    all_events = c.get_events("detected_attack_wave")
-    new_events = all_events[len(start_events):]
+    new_events = c.wait_for_matching_events(
+        5, cursor, lambda event: event_matches(event, ip=ip), "detected_attack_wave")
 
     collector.soft_assert(
         len(new_events) == 0,
@@ -220,65 +208,61 @@ def check_wave_attack_with_same_ip(collector, get_method_path, ip, user_id):
 
 
 def check_wave_attack_with_same_ip_sliding_window_and_LRU(collector, ip, user_id):
-    start_events = c.get_events("detected_attack_wave")
+    cursor = c.get_events_cursor()
+    get_method_path = filename_paths()
     for _ in range(14):
         time.sleep(1)
-        method, path = get_random_path_filename()
+        method, path = get_method_path()
         _ = s.request(method, path,
                       headers={"X-Forwarded-For": ip, "user": user_id})
     time.sleep(60)
     # send 1 more request
-    method, path = get_random_path_filename()
+    method, path = get_method_path()
     _ = s.request(method, path,
                   headers={"X-Forwarded-For": ip, "user": user_id})
-    c.wait_for_new_events(10, old_events_length=len(
-        start_events), filter_type="detected_attack_wave")
-    all_events = c.get_events("detected_attack_wave")
-    new_events = all_events[len(start_events):]
+    new_events = c.wait_for_matching_events(
+        10, cursor, lambda event: event_matches(event, ip=ip), "detected_attack_wave")
     collector.soft_assert(
         len(new_events) == 0,
         f"Test sent 14 suspicious requests with 1 second sleep between each request (same IP) and 1 more request after 60 seconds. Expected 0 attack wave events, but got {len(new_events)} event(s)")
 
 
 def check_wave_attack_with_bypass_ip(collector, ip, user_id):
-    start_events = c.get_events("detected_attack_wave")
+    cursor = c.get_events_cursor()
+    get_method_path = filename_paths()
     for _ in range(15):
-        method, path = get_random_path_filename()
+        method, path = get_method_path()
         _ = s.request(method, path,
                       headers={"X-Forwarded-For": ip, "user": user_id})
-    c.wait_for_new_events(10, old_events_length=len(
-        start_events), filter_type="detected_attack_wave")
-    all_events = c.get_events("detected_attack_wave")
-    new_events = all_events[len(start_events):]
+    new_events = c.wait_for_matching_events(
+        10, cursor, lambda event: event_matches(event, ip=ip), "detected_attack_wave")
     collector.soft_assert(
         len(new_events) == 0,
         f"Test sent 15 suspicious requests with bypass IP {ip} (allowedIPAddresses). Expected 0 attack wave events, but got {len(new_events)} event(s)")
 
 
+def check_wave_attack_and_retry(collector, get_method_path, ip, user_id, len_samples):
+    check_wave_attack(collector, get_method_path, ip, user_id, len_samples)
+    check_wave_attack_with_same_ip(collector, get_method_path, ip, user_id)
+
+
 def run_test(s: TestServer, c: CoreApi):
     collector = AssertionCollector()
 
-    check_wave_attack(collector, get_random_path_filename,
-                      "2.16.53.5", "1234", len(filenames))
-    check_wave_attack(collector, get_random_path_directory,
-                      "2.16.53.6", "1235", len(directories))
-    check_wave_attack(collector, get_random_path_extension, "2.16.53.7",
-                      "1236", len(file_extensions))
-    check_wave_attack(collector, get_random_path_query,
-                      "2.16.53.8", "1237", len(queries))
-
-    check_wave_attack_with_same_ip(collector,
-                                   get_random_path_filename, "2.16.53.5", "1234")
-    check_wave_attack_with_same_ip(collector,
-                                   get_random_path_directory, "2.16.53.6", "1235")
-    check_wave_attack_with_same_ip(collector,
-                                   get_random_path_extension, "2.16.53.7", "1236")
-    check_wave_attack_with_same_ip(
-        collector, get_random_path_query, "2.16.53.8", "1237")
-
-    check_wave_attack_with_same_ip_sliding_window_and_LRU(
-        collector, "2.16.53.9", "1238")
-    check_wave_attack_with_bypass_ip(collector, "2.16.53.10", "1239")
+    run_scenarios(collector, {
+        "filenames": lambda: check_wave_attack_and_retry(
+            collector, filename_paths(), "2.16.53.5", "1234", len(filenames)),
+        "directories": lambda: check_wave_attack_and_retry(
+            collector, directory_paths(), "2.16.53.6", "1235", len(directories)),
+        "file extensions": lambda: check_wave_attack_and_retry(
+            collector, extension_paths(), "2.16.53.7", "1236", len(file_extensions)),
+        "queries": lambda: check_wave_attack_and_retry(
+            collector, query_paths(), "2.16.53.8", "1237", len(queries)),
+        "sliding window": lambda: check_wave_attack_with_same_ip_sliding_window_and_LRU(
+            collector, "2.16.53.9", "1238"),
+        "bypass ip": lambda: check_wave_attack_with_bypass_ip(
+            collector, "2.16.53.10", "1239"),
+    })
 
     collector.raise_if_failures()
 
@@ -1,8 +1,12 @@
-import datetime
 import time
 import requests
 import argparse
 from core_api import CoreApi
+from docker_api import get_docker
+from result_protocol import ResultWriter
+from latency import LatencyHistogram, LatencyRecorder
+import burst
+import load_generator
 import json
 import subprocess
 import random
@@ -11,21 +15,112 @@ import inspect
 import os
 import http.client
 import re
+import sys
+import traceback
+import threading
+import concurrent.futures
+import contextlib
+import atexit
+import http.cookiejar
 
-_sessions = {}
-_raw_connections = {}
+_result_writer = None
+_latency_recorder = None
+_latency_recorder_lock = threading.Lock()
+_exit_hooks = []
 
 
-def get_session(port):
-    if port not in _sessions:
-        _sessions[port] = requests.Session()
-    return _sessions[port]
+class _ThreadClients(threading.local):
+    """
+    Keep-alive connections of the current thread, per port. A Session or HTTPConnection is not safe
+    to share between threads, so every thread that sends requests (scenarios, traffic generators,
+    the main thread) gets its own; their number follows the test's concurrency.
+    """
+
+    def __init__(self):
+        self.sessions = {}
+        self.raw_connections = {}
+
+
+_clients = _ThreadClients()
+
+
+def get_result_writer():
+    """Where soft assertions and uncaught exceptions are reported to run_test (see result_protocol)."""
+    global _result_writer
+    if _result_writer is None:
+        _result_writer = ResultWriter()
+    return _result_writer
+
+
+def on_test_exit(hook):
+    """Call `hook()` when the test script ends, after the test itself; the last one registered runs first."""
+    _exit_hooks.append(hook)
+
+
+def run_test_exit_hooks():
+    """
+    Run the on_test_exit hooks. Registered with atexit for `python test.py`; a forkserver worker leaves
+    with os._exit and calls this itself once the script is done (see worker_pool).
+    """
+    while _exit_hooks:
+        hook = _exit_hooks.pop()
+        try:
+            hook()
+        except Exception:
+            traceback.print_exc()
+
+
+atexit.register(run_test_exit_hooks)
+
+
+def get_latency_recorder():
+    """Latencies of requests sent with benchmark=True; reported to run_test when the test exits."""
+    global _latency_recorder
+    with _latency_recorder_lock:
+        if _latency_recorder is None:
+            _latency_recorder = LatencyRecorder()
+            on_test_exit(_report_latency)
+    return _latency_recorder
+
+
+def _report_latency():
+    if _latency_recorder is not None and len(_latency_recorder):
+        get_result_writer().report("latency", routes=_latency_recorder.to_json())
+
+
+def _report_uncaught_exception(exc_type, exc, tb):
+    # the last test.py frame is the line the summary points at
+    line = None
+    for frame, lineno in traceback.walk_tb(tb):
+        if frame.f_code.co_filename.endswith("test.py"):
+            line = f'File "{frame.f_code.co_filename}", line {lineno}, in {frame.f_code.co_name}'
+    get_result_writer().report("error", exception=exc_type.__name__,
+                               message=str(exc), line=line)
+    sys.__excepthook__(exc_type, exc, tb)
+
+
+sys.excepthook = _report_uncaught_exception
+
+
+def get_session(port, keep_cookies=True):
+    """
+    This thread's keep-alive session for `port`. GET requests have always kept the cookies the app
+    sets; POST and other requests went without a session, so they get one that never stores any.
+    """
+    key = (port, keep_cookies)
+    if key not in _clients.sessions:
+        session = requests.Session()
+        if not keep_cookies:
+            session.cookies.set_policy(
+                http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+        _clients.sessions[key] = session
+    return _clients.sessions[key]
 
 
 def get_raw_connection(port):
-    if port not in _raw_connections:
-        _raw_connections[port] = http.client.HTTPConnection("localhost", port)
-    return _raw_connections[port]
+    if port not in _clients.raw_connections:
+        _clients.raw_connections[port] = http.client.HTTPConnection("localhost", port)
+    return _clients.raw_connections[port]
 
 
 def wrap_raw_response(raw_response, port, route):
@@ -39,9 +134,7 @@ def wrap_raw_response(raw_response, port, route):
 
 
 def localhost_get_request(port, route="", headers={}, benchmark=False, raw=False, method="GET"):
-    global benchmarks, s
-
-    start_time = datetime.datetime.now()
+    start_time = time.perf_counter()
 
     for attempt in range(3):
         try:
@@ -56,33 +149,28 @@ def localhost_get_request(port, route="", headers={}, benchmark=False, raw=False
         except Exception as e:
             print(f"Error (attempt {attempt + 1}/3): {e}")
             if raw:
-                conn = _raw_connections.pop(port, None)
+                conn = _clients.raw_connections.pop(port, None)
                 if conn is not None:
                     conn.close()
             if attempt == 2:  # Last attempt
                 return None
             time.sleep(0.1)  # Brief delay before retry
 
-    end_time = datetime.datetime.now()
-    delta = end_time - start_time
-    elapsed_ms = delta.total_seconds() * 1000
-
     if benchmark:
-        benchmarks.append(elapsed_ms)
+        get_latency_recorder().record(method, route, r.status_code,
+                                      (time.perf_counter() - start_time) * 1000)
 
     time.sleep(0.001)
     return r
 
 
 def localhost_post_request(port, route, data, headers={}, benchmark=False, timeout=100):
-    global benchmarks, s
-
-    start_time = datetime.datetime.now()
+    start_time = time.perf_counter()
 
     for attempt in range(3):
         try:
-            r = requests.post(f"http://localhost:{port}{route}",
-                              json=data, headers=headers, timeout=timeout)
+            r = get_session(port, keep_cookies=False).post(f"http://localhost:{port}{route}",
+                                                           json=data, headers=headers, timeout=timeout)
             break  # Success, exit retry loop
         except Exception as e:
             print(f"Error (attempt {attempt + 1}/3): {e}")
@@ -91,14 +179,21 @@ def localhost_post_request(port, route, data, headers={}, benchmark=False, timeo
             time.sleep(0.1)  # Brief delay before retry
 
     if benchmark:
-        benchmarks.append(elapsed_ms)
+        get_latency_recorder().record("POST", route, r.status_code,
+                                      (time.perf_counter() - start_time) * 1000)
 
     time.sleep(0.001)
     return r
 
 
 def localhost_request_request(port, method, route, data, headers, benchmark, timeout):
-    return requests.request(method, f"http://localhost:{port}{route}", json=data, headers=headers, timeout=timeout)
+    start_time = time.perf_counter()
+    r = get_session(port, keep_cookies=False).request(method, f"http://localhost:{port}{route}",
+                                                      json=data, headers=headers, timeout=timeout)
+    if benchmark:
+        get_latency_recorder().record(method, route, r.status_code,
+                                      (time.perf_counter() - start_time) * 1000)
+    return r
 
 
 def init_server_and_core():
@@ -109,9 +204,14 @@ def init_server_and_core():
     parser.add_argument("--token", type=str, required=True)
     parser.add_argument("--core_port", type=int, default=3000)
     parser.add_argument("--config_update_delay", type=int, default=60)
+    parser.add_argument("--logs_file", type=str, required=False)
+    # soak tests only: how long to keep the traffic going
+    parser.add_argument("--soak_duration", type=int, required=False)
     args = parser.parse_args()
+    get_result_writer()
 
-    server = TestServer(port=args.server_port, token=args.token)
+    server = TestServer(port=args.server_port, token=args.token,
+                        logs_file=args.logs_file)
     core = CoreApi(token=args.token, core_url=f"http://localhost:{args.core_port}", test_name=args.test_name,
                    config_update_delay=args.config_update_delay)
     if args.control_server_port:
@@ -227,9 +327,11 @@ class TestControlServer:
 
 
 class TestServer:
-    def __init__(self, port: int, token: str):
+    def __init__(self, port: int, token: str, logs_file: str = None):
         self.port = port
         self.token = token
+        # container logs streamed to disk by run_test's LogMonitor
+        self.logs_file = logs_file
 
     def get(self, route="", headers={}, benchmark=False):
         return localhost_get_request(self.port, route, headers, benchmark)
@@ -243,11 +345,58 @@ class TestServer:
     def request(self, method, route="", data={}, headers={}, benchmark=False, timeout=100):
         return localhost_request_request(self.port, method, route, data, headers, benchmark, timeout)
 
+    def burst(self, requests, concurrency=10, timeout=burst.DEFAULT_TIMEOUT_SECONDS):
+        """
+        Send `requests` concurrently over `concurrency` keep-alive connections (see burst.py).
+        Each request is a (method, route[, headers[, data]]) tuple; routes are sent as is, like get_raw.
+        Returns the responses in the same order, with each request's latency in `response.elapsed`.
+        """
+        return burst.burst(self.port, requests, concurrency, timeout)
+
+    def measure(self, requests, concurrency):
+        """
+        Send `requests` (like for burst) over `concurrency` keep-alive connections and measure them:
+        throughput in responses per second, latency percentiles (ms), failed requests and statuses.
+        """
+        start = time.perf_counter()
+        responses = self.burst(requests, concurrency)
+        seconds = time.perf_counter() - start
+        histogram = LatencyHistogram()
+        statuses = {}
+        for response in responses:
+            if response.status_code is not None:
+                histogram.record(response.elapsed.total_seconds() * 1000)
+                statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+        return {
+            "concurrency": concurrency,
+            "requests": len(responses),
+            "errors": len(responses) - histogram.count,
+            "statuses": statuses,
+            "rps": histogram.count / seconds if seconds else 0.0,
+            "p50": histogram.percentile(50),
+            "p99": histogram.percentile(99),
+            "max": histogram.max_ms,
+        }
+
+    def load(self, requests, rate, processes=load_generator.DEFAULT_PROCESSES, duration=None,
+             max_in_flight=load_generator.DEFAULT_MAX_IN_FLIGHT, timeout=load_generator.DEFAULT_TIMEOUT_SECONDS):
+        """
+        Start offering `rate` requests per second, spread over `processes` worker processes, cycling
+        through `requests` (like for burst). Open loop: the rate doesn't depend on the app's response
+        times (see load_generator.py). Call stop() on the returned generator, or use it as a context
+        manager, to get a LoadReport with the achieved rate, error rate and latency percentiles.
+        """
+        return load_generator.LoadGenerator(
+            self.port, requests, rate, processes, duration, max_in_flight, timeout,
+            recorder=get_latency_recorder()).start()
+
     def get_logs(self, container_name: str):
-        # this gets the logs from the server (docker logs <container_name>)
-        logs = subprocess.check_output(
-            ["docker", "logs", container_name], stderr=subprocess.STDOUT)
-        return logs.decode("utf-8")
+        # read the logs run_test is already streaming, if there is such a file
+        if self.logs_file and os.path.exists(self.logs_file):
+            with open(self.logs_file, "r", encoding="utf-8") as f:
+                return f.read()
+        # otherwise this gets the logs from the server (docker logs <container_name>)
+        return get_docker().logs(container_name)
 
 
 def assert_event_contains_subset(event, event_subset, dry_mode=False, _path=""):
@@ -409,40 +558,80 @@ class AssertionCollector:
         if not collector.soft_assert(condition, msg):
             return  # dependent code can't run
     Call raise_if_failures() at the end to report all collected failures.
+    Failures are also sent to run_test as they happen; passed assertions only with report_passed=True
+    (e.g. for their timings in the results file), since most tests make many of them.
     """
 
     FAILURE_MARKER = "[FAIL]"
 
-    def __init__(self):
+    def __init__(self, report_passed=False):
         self.failures = []
+        self.report_passed = report_passed
+        # soft asserts may come from several scenarios at once, see run_scenarios()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextlib.contextmanager
+    def scenario(self, name):
+        """Attribute what the current thread records inside the block to the scenario `name`."""
+        previous = self.current_scenario
+        self._local.scenario = name
+        try:
+            yield
+        finally:
+            self._local.scenario = previous
+
+    @property
+    def current_scenario(self):
+        """Name of the scenario the current thread runs, if any."""
+        return getattr(self._local, "scenario", None)
+
+    def _with_scenario(self, message):
+        return f"[{self.current_scenario}] {message}" if self.current_scenario else message
 
     def _get_test_caller_frames(self, max_frames=3):
         """Walk the stack and return up to max_frames frames from test.py (outermost first)."""
         frames = []
-        for frame_info in inspect.stack():
-            if frame_info.filename.endswith("test.py"):
-                frames.append(frame_info.lineno)
-                if len(frames) >= max_frames:
-                    break
+        # plain frame walk: inspect.stack() would read source lines for every frame
+        frame = inspect.currentframe()
+        while frame is not None and len(frames) < max_frames:
+            if frame.f_code.co_filename.endswith("test.py"):
+                frames.append(frame)
+            frame = frame.f_back
         frames.reverse()
         return frames
 
     def soft_assert(self, condition, message="Assertion failed"):
         """Record failure but continue execution. Returns True if passed, False if failed."""
+        if condition and not self.report_passed:
+            return True
+        frames = self._get_test_caller_frames()
+        lines = [frame.f_lineno for frame in frames]
+        if not condition:
+            message = self._with_scenario(message)
+        get_result_writer().report(
+            "assertion", passed=bool(condition), message=None if condition else str(message), lines=lines,
+            phase=frames[-1].f_code.co_name if frames else None, scenario=self.current_scenario)
         if not condition:
-            frames = self._get_test_caller_frames()
-            if frames:
-                refs = " → ".join(f"line {ln}" for ln in frames)
+            if lines:
+                refs = " → ".join(f"line {ln}" for ln in lines)
                 prefix = f"[{refs}] "
             else:
                 prefix = ""
-            self.failures.append(f"{prefix}{message}")
+            with self._lock:
+                self.failures.append(f"{prefix}{message}")
             return False
         return True
 
     def add_failure(self, message):
         """Directly add a failure message to the collector."""
-        self.failures.append(message)
+        frames = self._get_test_caller_frames()
+        message = self._with_scenario(message)
+        get_result_writer().report(
+            "assertion", passed=False, message=str(message), lines=[],
+            phase=frames[-1].f_code.co_name if frames else None, scenario=self.current_scenario)
+        with self._lock:
+            self.failures.append(message)
 
     def soft_assert_response_code_is(self, response, status_code, message=None):
         actual = get_response_status_code(response)
@@ -489,6 +678,49 @@ class AssertionCollector:
             raise AssertionError("\n".join(lines))
 
 
+def run_scenarios(collector, scenarios, max_workers=None):
+    """
+    Run independent scenarios concurrently and wait for all of them.
+    `scenarios` maps a name to a function without arguments (use a lambda to pass some).
+    Failures recorded with `collector` while a scenario runs are prefixed with its name, and an
+    exception in one scenario is recorded as a failure of that scenario without stopping the others.
+    Scenarios must not depend on each other: use their own IPs / user ids and match events on them
+    (see CoreApi.wait_for_matching_events) instead of counting all new events.
+    """
+    def run(name, scenario):
+        with collector.scenario(name):
+            try:
+                scenario()
+            except Exception as e:
+                collector.add_failure(f"{type(e).__name__}: {e}")
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers or len(scenarios),
+                                               thread_name_prefix="scenario") as executor:
+        futures = [executor.submit(run, name, scenario)
+                   for name, scenario in scenarios.items()]
+        for future in futures:
+            future.result()
+
+
+def report_benchmark(rows):
+    """
+    Report agent overhead measurements to run_test, for the step summary. Each row is a dict with
+    "method", "route", "concurrency" and the TestServer.measure() results "without" and "with" the agent.
+    """
+    get_result_writer().report("benchmark", rows=rows)
+
+
+def event_matches(event, ip=None, user_id=None):
+    """True if the event's request came from `ip` and its user is `user_id` (each when given)."""
+    if ip is not None and event.get("request", {}).get("ipAddress") != ip:
+        return False
+    if user_id is not None:
+        user = event.get("attack", {}).get("user") or event.get("request", {}).get("user") or {}
+        if user.get("id") != user_id:
+            return False
+    return True
+
+
 def assert_line_contains_sensitive_data(line, line_number):
     patterns = {
         "SQL Query": r"select .* from|insert .* into",
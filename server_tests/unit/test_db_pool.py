@@ -0,0 +1,172 @@
+import base64
+import hashlib
+import socket
+import struct
+import threading
+import unittest
+
+from db_pool import DUPLICATE_DATABASE, DatabasePool, PgConnection, PgError, ScramSha256
+
+
+def message(message_type: bytes, payload: bytes) -> bytes:
+    return message_type + struct.pack("!I", len(payload) + 4) + payload
+
+
+def auth(code: int, data: bytes = b"") -> bytes:
+    return message(b"R", struct.pack("!I", code) + data)
+
+
+READY = message(b"Z", b"I")
+
+
+class FakePostgres:
+    """Accepts one connection and answers each message the client sends with the next scripted reply."""
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.received = []
+        self.listener = socket.create_server(("127.0.0.1", 0))
+        self.port = self.listener.getsockname()[1]
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def _recv_exact(self, conn: socket.socket, size: int) -> bytes:
+        data = b""
+        while len(data) < size:
+            chunk = conn.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("client went away")
+            data += chunk
+        return data
+
+    def _serve(self):
+        conn, _ = self.listener.accept()
+        with conn:
+            # the startup message has no type byte
+            size = struct.unpack("!I", self._recv_exact(conn, 4))[0]
+            self.received.append((None, self._recv_exact(conn, size - 4)))
+            conn.sendall(self.replies.pop(0))
+            while self.replies:
+                header = self._recv_exact(conn, 5)
+                size = struct.unpack("!I", header[1:])[0]
+                self.received.append((header[:1], self._recv_exact(conn, size - 4)))
+                conn.sendall(self.replies.pop(0))
+            # the terminate message
+            conn.recv(5)
+        self.listener.close()
+
+
+class ScramSha256Test(unittest.TestCase):
+    # RFC 7677, section 3
+    def test_rfc_7677_example(self):
+        scram = ScramSha256("pencil", user="user", nonce="rOprNGfwEbeRWgbNEkqO")
+        self.assertEqual(scram.client_first(), b"n,,n=user,r=rOprNGfwEbeRWgbNEkqO")
+
+        client_final = scram.client_final(
+            b"r=rOprNGfwEbeRWgbNEkqO%hvYDpWUa2RaTCAfuxFIlj)hNlF$k0,s=W22ZaJ0SNY7soEsUEjb6gQ==,i=4096")
+
+        self.assertEqual(client_final, b"c=biws,r=rOprNGfwEbeRWgbNEkqO%hvYDpWUa2RaTCAfuxFIlj)hNlF$k0,"
+                                       b"p=dHzbZapWIk4jUhN+Ute9ytag9zjfMHgsqmmiz7AndVQ=")
+        scram.verify_server_final(b"v=6rriTRBi23WpRR/wtup+mMhUZUn/dB5nLTJRsjl95G4=")
+
+    def test_rejects_a_wrong_server_signature(self):
+        scram = ScramSha256("pencil", user="user", nonce="rOprNGfwEbeRWgbNEkqO")
+        scram.client_final(
+            b"r=rOprNGfwEbeRWgbNEkqO%hvYDpWUa2RaTCAfuxFIlj)hNlF$k0,s=W22ZaJ0SNY7soEsUEjb6gQ==,i=4096")
+
+        with self.assertRaises(ConnectionError):
+            scram.verify_server_final(b"v=" + base64.b64encode(b"\0" * 32))
+
+    def test_rejects_a_server_nonce_that_does_not_extend_ours(self):
+        scram = ScramSha256("pencil", nonce="abc")
+
+        with self.assertRaises(ConnectionError):
+            scram.client_final(b"r=xyz123,s=W22ZaJ0SNY7soEsUEjb6gQ==,i=4096")
+
+
+class PgConnectionTest(unittest.TestCase):
+    def test_startup_message_and_md5_password(self):
+        salt = b"\x01\x02\x03\x04"
+        fake = FakePostgres([auth(5, salt), auth(0) + message(b"S", b"server_version\x0016\x00") + READY])
+
+        PgConnection("127.0.0.1", fake.port, "zen", "secret", "postgres").close()
+        fake.thread.join(5)
+
+        (_, startup), (password_type, password) = fake.received
+        self.assertEqual(struct.unpack("!I", startup[:4])[0], 196608)
+        self.assertEqual(startup[4:], b"user\0zen\0database\0postgres\0\0")
+        inner = hashlib.md5(b"secretzen").hexdigest().encode("ascii")
+        self.assertEqual(password_type, b"p")
+        self.assertEqual(password, b"md5" + hashlib.md5(inner + salt).hexdigest().encode("ascii") + b"\0")
+
+    def test_execute_reads_rows_and_nulls(self):
+        rows = (message(b"T", b"\0\x02")
+                + message(b"D", b"\0\x02" + struct.pack("!i", 3) + b"abc" + struct.pack("!i", -1))
+                + message(b"D", b"\0\x02" + struct.pack("!i", 0) + struct.pack("!i", 1) + b"x")
+                + message(b"C", b"SELECT 2\0") + READY)
+        fake = FakePostgres([auth(0) + READY, rows])
+
+        conn = PgConnection("127.0.0.1", fake.port, "zen", "secret", "postgres")
+        self.assertEqual(conn.execute("SELECT a, b FROM t"), [("abc", None), ("", "x")])
+        conn.close()
+        fake.thread.join(5)
+
+        self.assertEqual(fake.received[-1], (b"Q", b"SELECT a, b FROM t\0"))
+
+    def test_execute_raises_the_error_after_ready_for_query(self):
+        error = message(b"E", b"SERROR\0C42P04\0Mdatabase \"t\" already exists\0\0") + READY
+        fake = FakePostgres([auth(0) + READY, error, message(b"C", b"SELECT 0\0") + READY])
+
+        conn = PgConnection("127.0.0.1", fake.port, "zen", "secret", "postgres")
+        with self.assertRaises(PgError) as raised:
+            conn.execute("CREATE DATABASE t")
+        # the connection is still usable
+        self.assertEqual(conn.execute("SELECT 1 WHERE false"), [])
+        conn.close()
+        fake.thread.join(5)
+
+        self.assertEqual(raised.exception.code, DUPLICATE_DATABASE)
+        self.assertEqual(str(raised.exception), 'database "t" already exists')
+
+
+class FakeAdminConnection:
+    def __init__(self, calls, existing):
+        self.calls = calls
+        self.existing = existing
+
+    def execute(self, sql: str):
+        self.calls.append(sql)
+        if sql.startswith("CREATE DATABASE") and self.existing:
+            raise PgError({"C": DUPLICATE_DATABASE, "M": "already exists"})
+        return []
+
+
+class DatabasePoolTest(unittest.TestCase):
+    def pool(self, existing: bool = False) -> DatabasePool:
+        pool = DatabasePool("127.0.0.1", 5432, "zen", "secret", "postgres")
+        self.calls = []
+        pool._connection = lambda: FakeAdminConnection(self.calls, existing)
+        return pool
+
+    def test_databases_are_created_from_the_template_and_dropped(self):
+        pool = self.pool()
+        pool.prepare(["test_a"])
+        pool.acquire("test_a")
+        pool.release("test_a")
+        pool.close()
+
+        self.assertEqual(self.calls, [
+            'CREATE DATABASE "test_a" TEMPLATE "zen_test_template"',
+            'DROP DATABASE IF EXISTS "test_a" WITH (FORCE)',
+        ])
+
+    def test_an_existing_database_is_reused(self):
+        pool = self.pool(existing=True)
+        pool.acquire('quo"ted')
+        pool.close()
+
+        self.assertEqual(self.calls, ['CREATE DATABASE "quo""ted" TEMPLATE "zen_test_template"'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,199 @@
+import json
+import os
+import socketserver
+import sys
+import tempfile
+import threading
+import unittest
+import urllib.parse
+from http.server import BaseHTTPRequestHandler
+
+from docker_api import DockerApi, DockerApiError
+
+
+def frame(stream: int, data: bytes) -> bytes:
+    """A stdout (1) / stderr (2) frame as docker multiplexes them for containers without a TTY."""
+    return bytes([stream, 0, 0, 0]) + len(data).to_bytes(4, "big") + data
+
+
+STATS = {
+    "memory_stats": {"usage": 300 * 1024 * 1024, "stats": {"inactive_file": 100 * 1024 * 1024}},
+    "cpu_stats": {"cpu_usage": {"total_usage": 3_000_000_000}, "system_cpu_usage": 20_000_000_000,
+                  "online_cpus": 2},
+    "precpu_stats": {"cpu_usage": {"total_usage": 2_000_000_000}, "system_cpu_usage": 10_000_000_000},
+    "pids_stats": {"current": 7},
+    "networks": {"eth0": {"rx_bytes": 1000, "tx_bytes": 10}, "eth1": {"rx_bytes": 24, "tx_bytes": 5}},
+}
+
+
+class FakeDocker:
+    """Just enough of the Docker Engine API, on a unix socket, for the calls run_test makes."""
+
+    def __init__(self):
+        self.requests = []
+        self.running = False
+        self.statuses = {}
+        self.socket_path = os.path.join(tempfile.mkdtemp(), "docker.sock")
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _respond(self, status: int, body=b""):
+                if not isinstance(body, bytes):
+                    body = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _handle(self):
+                url = urllib.parse.urlparse(self.path)
+                params = dict(urllib.parse.parse_qsl(url.query))
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                fake.requests.append((self.command, url.path, params, body))
+                route = (self.command, url.path)
+                if route in fake.statuses:
+                    return self._respond(fake.statuses[route], {"message": "fake error"})
+
+                if route == ("POST", "/containers/create"):
+                    return self._respond(201, {"Id": "c0ffee"})
+                if route == ("POST", "/containers/c0ffee/start"):
+                    return self._respond(204)
+                if route == ("GET", "/containers/app/json"):
+                    return self._respond(200, {"State": {"Running": fake.running}})
+                if route == ("GET", "/events"):
+                    # a stream that stays open, in chunks like the daemon sends it
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    event = json.dumps({"status": "start", "id": "c0ffee"}).encode() + b"\n"
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(event), event))
+                    self.wfile.flush()
+                    fake.running = True
+                    self.close_connection = True
+                    return
+                if route == ("GET", "/containers/app/logs"):
+                    self.send_response(200)
+                    self.end_headers()
+                    self.wfile.write(frame(1, b"listening on 8080\nhalf a ") + frame(2, b"warning\n")
+                                     + frame(1, b"line\nlast without newline"))
+                    self.close_connection = True
+                    return
+                if route == ("GET", "/containers/app/stats"):
+                    return self._respond(200, STATS)
+                if route == ("POST", "/containers/app/exec"):
+                    return self._respond(201, {"Id": "e1"})
+                if route == ("POST", "/exec/e1/start"):
+                    return self._respond(200, frame(1, b"out\n") + frame(2, b"err\n"))
+                if route == ("GET", "/exec/e1/json"):
+                    return self._respond(200, {"ExitCode": 3})
+                self._respond(404, {"message": f"no such route {self.command} {url.path}"})
+
+            do_GET = do_POST = do_DELETE = _handle
+
+        class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+            daemon_threads = True
+
+            def get_request(self):
+                request, _ = super().get_request()
+                # BaseHTTPRequestHandler expects a (host, port) client address
+                return request, ("fake", 0)
+
+            def handle_error(self, request, client_address):
+                # the client closing a keep-alive connection is not an error
+                if not isinstance(sys.exc_info()[1], ConnectionError):
+                    super().handle_error(request, client_address)
+
+        self.server = Server(self.socket_path, Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+        os.remove(self.socket_path)
+
+
+class DockerApiTest(unittest.TestCase):
+    def setUp(self):
+        self.fake = FakeDocker()
+        self.docker = DockerApi(f"unix://{self.fake.socket_path}", timeout=5)
+
+    def tearDown(self):
+        self.fake.close()
+
+    def test_run_container(self):
+        container_id = self.docker.run_container(
+            "app", "zen-test:latest", env=["PORT=8080"], ports={8080: 4000}, cap_add=["NET_ADMIN"])
+
+        self.assertEqual(container_id, "c0ffee")
+        (_, path, params, body), (method, start_path, _, _) = self.fake.requests
+        self.assertEqual((path, params), ("/containers/create", {"name": "app"}))
+        self.assertEqual(body["Image"], "zen-test:latest")
+        self.assertEqual(body["Env"], ["PORT=8080"])
+        self.assertEqual(body["HostConfig"]["PortBindings"], {"8080/tcp": [{"HostPort": "4000"}]})
+        self.assertEqual(body["HostConfig"]["CapAdd"], ["NET_ADMIN"])
+        self.assertEqual((method, start_path), ("POST", "/containers/c0ffee/start"))
+
+    def test_wait_for_running_returns_on_the_start_event(self):
+        self.docker.wait_for_running("app", timeout_seconds=5)
+
+        self.assertTrue(self.fake.running)
+        events = [r for r in self.fake.requests if r[1] == "/events"]
+        self.assertEqual(json.loads(events[0][2]["filters"])["container"], ["app"])
+
+    def test_wait_for_running_times_out(self):
+        self.fake.statuses[("GET", "/events")] = 500
+
+        with self.assertRaises(RuntimeError):
+            self.docker.wait_for_running("app", timeout_seconds=1)
+
+    def test_follow_logs_splits_the_streams_into_lines(self):
+        lines = list(self.docker.follow_logs("app", since=1700000000.25))
+
+        self.assertEqual(lines, ["listening on 8080", "warning", "half a line", "last without newline"])
+        self.assertEqual(self.fake.requests[0][2]["since"], "1700000000.250000")
+
+    def test_exec_run(self):
+        exit_code, output = self.docker.exec_run("app", ["sh", "-c", "true"], env=["A=1"])
+
+        self.assertEqual(exit_code, 3)
+        self.assertEqual(output, "out\nerr\n")
+        self.assertEqual(self.fake.requests[0][3]["Cmd"], ["sh", "-c", "true"])
+
+    def test_stats(self):
+        stats = self.docker.stats("app")
+
+        self.assertEqual(stats["memory"], 200 * 1024 * 1024)
+        self.assertAlmostEqual(stats["cpu_percent"], 20.0)
+        self.assertAlmostEqual(stats["cpu_seconds"], 3.0)
+        self.assertEqual(stats["pids"], 7)
+        self.assertEqual((stats["net_rx"], stats["net_tx"]), (1024, 15))
+        self.assertIsNone(self.docker.stats("gone"))
+
+    def test_stop_and_remove_ignore_containers_that_are_gone(self):
+        self.docker.stop_container("gone")
+        self.docker.remove_container("gone")
+        self.docker.remove_network("gone")
+
+    def test_stop_and_remove_raise_on_errors(self):
+        self.fake.statuses[("POST", "/containers/app/stop")] = 500
+        self.fake.statuses[("DELETE", "/containers/app")] = 409
+        self.fake.statuses[("POST", "/networks/net/disconnect")] = 403
+
+        with self.assertRaises(DockerApiError) as stop:
+            self.docker.stop_container("app")
+        with self.assertRaises(DockerApiError) as remove:
+            self.docker.remove_container("app")
+        with self.assertRaises(DockerApiError):
+            self.docker.disconnect_network("net", "app")
+        self.assertEqual((stop.exception.status, remove.exception.status), (500, 409))
+
+
+if __name__ == "__main__":
+    unittest.main()
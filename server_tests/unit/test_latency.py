@@ -0,0 +1,64 @@
+import unittest
+
+from latency import LatencyHistogram, LatencyRecorder, _bucket_highest_value, _bucket_index
+
+
+class BucketTest(unittest.TestCase):
+    def test_small_values_have_a_bucket_each(self):
+        for value in range(256):
+            self.assertEqual(_bucket_index(value), value)
+            self.assertEqual(_bucket_highest_value(value), value)
+
+    def test_buckets_are_contiguous_and_within_one_percent(self):
+        for value in [256, 257, 511, 512, 1000, 4095, 4096, 123_456, 10 ** 9]:
+            index = _bucket_index(value)
+            highest = _bucket_highest_value(index)
+            self.assertGreaterEqual(highest, value)
+            self.assertLess(_bucket_highest_value(index - 1), value)
+            self.assertLessEqual(highest - value, value / 128)
+
+
+class LatencyHistogramTest(unittest.TestCase):
+    def test_percentiles(self):
+        histogram = LatencyHistogram()
+        for latency_ms in range(1, 101):
+            histogram.record(latency_ms)
+
+        self.assertAlmostEqual(histogram.percentile(50), 50, delta=0.5)
+        self.assertAlmostEqual(histogram.percentile(99), 99, delta=1)
+        # never above the largest recorded value
+        self.assertEqual(histogram.percentile(100), 100)
+        self.assertIsNone(LatencyHistogram().percentile(50))
+
+    def test_merge_and_json_round_trip(self):
+        first, second = LatencyHistogram(), LatencyHistogram()
+        for latency_ms in (1.5, 2.0, 3.0):
+            first.record(latency_ms)
+        second.record(0.25)
+        second.record(40.0)
+
+        first.merge(LatencyHistogram.from_json(second.to_json()))
+
+        self.assertEqual(first.count, 5)
+        self.assertEqual((first.min_ms, first.max_ms), (0.25, 40.0))
+        self.assertAlmostEqual(first.to_json()["mean"], 46.75 / 5)
+        self.assertEqual(sum(first.buckets.values()), 5)
+
+
+class LatencyRecorderTest(unittest.TestCase):
+    def test_routes_without_query_string(self):
+        recorder = LatencyRecorder()
+        recorder.record("get", "/api/users?id=1", 200, 5.0)
+        recorder.record("GET", "/api/users?id=2", 200, 7.0)
+        recorder.record("GET", "/api/users", 500, 1.0)
+
+        other = LatencyRecorder()
+        other.record("GET", "/api/users", 200, 9.0)
+        recorder.merge_json(other.to_json())
+
+        routes = {(r["method"], r["route"], r["status"]): r["count"] for r in recorder.to_json()}
+        self.assertEqual(routes, {("GET", "/api/users", 200): 3, ("GET", "/api/users", 500): 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
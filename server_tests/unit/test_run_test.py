@@ -0,0 +1,201 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import docker_api
+import summary
+from container_reuse import ContainerReuse
+
+# run_test asks the daemon for its OS type and gateway when it is imported
+_fake_docker = mock.MagicMock()
+_fake_docker.info.return_value = {"OSType": "linux"}
+_fake_docker.inspect_network.return_value = {"IPAM": {"Config": [{"Gateway": "172.17.0.1"}]}}
+with mock.patch.object(docker_api, "_docker", _fake_docker):
+    import run_test
+
+
+class TempDirTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def write(self, rel_path: str, content: str) -> str:
+        path = os.path.join(self.dir, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+        return path
+
+
+class ComputeBuildHashTest(TempDirTest):
+    def setUp(self):
+        super().setUp()
+        self.dockerfile = self.write("Dockerfile", "FROM scratch\n")
+        self.write("app/main.py", "print('hi')\n")
+
+    def build_hash(self, extra_build_args: str = "") -> str:
+        return run_test.compute_build_hash(self.dockerfile, self.dir, extra_build_args)
+
+    def test_changes_with_the_context_and_build_args(self):
+        before = self.build_hash()
+
+        self.assertEqual(self.build_hash(), before)
+        self.assertNotEqual(self.build_hash("--build-arg A=1"), before)
+        self.write("app/main.py", "print('bye')\n")
+        self.assertNotEqual(self.build_hash(), before)
+
+    def test_ignores_what_the_dockerignore_leaves_out(self):
+        self.write(".dockerignore", "# build output\nnode_modules/\n*.log\n")
+        before = self.build_hash()
+
+        self.write("node_modules/lib/index.js", "module.exports = 1\n")
+        self.write("debug.log", "noise\n")
+        self.assertEqual(self.build_hash(), before)
+
+        self.write("app/util.py", "\n")
+        self.assertNotEqual(self.build_hash(), before)
+
+    def test_hashes_everything_when_the_dockerignore_has_exceptions(self):
+        self.write(".dockerignore", "*.log\n!keep.log\n")
+
+        self.assertEqual(run_test._dockerignore_patterns(self.dir), [])
+        before = self.build_hash()
+        self.write("debug.log", "noise\n")
+        self.assertNotEqual(self.build_hash(), before)
+
+    def test_is_ignored_matches_parent_directories(self):
+        self.assertTrue(run_test._is_ignored("node_modules/a/b.js", ["node_modules"]))
+        self.assertTrue(run_test._is_ignored("logs/app.log", ["*.log"]))
+        self.assertFalse(run_test._is_ignored("src/node_modules.py", ["node_modules"]))
+
+
+class BuildContainerEnvTest(TempDirTest):
+    def test_precedence(self):
+        extra_file = self.write("extra.env", "A=extra-file\nB=extra-file\nD=extra-file\n")
+        test_file = self.write("test.env", "# comment\nB=test-file\nC=test-file\n")
+
+        with mock.patch.dict(os.environ, {"FROM_HOST": "host"}):
+            env = run_test.build_container_env(
+                f"--env-file={extra_file} -e A=flag --env FROM_HOST", test_file, {"C": "extra-env", "E": "1"})
+
+        self.assertEqual(dict(entry.split("=", 1) for entry in env), {
+            # -e/--env flags win over env files, and the extra envs over both
+            "A": "flag",
+            # test.env comes after the --env-file of the extra args
+            "B": "test-file",
+            "C": "extra-env",
+            "D": "extra-file",
+            "E": "1",
+            "FROM_HOST": "host",
+        })
+
+    def test_without_env_file(self):
+        env = run_test.build_container_env("", os.path.join(self.dir, "missing.env"), {"PORT": "8080"})
+
+        self.assertEqual(env, ["PORT=8080"])
+
+
+class ShardTest(unittest.TestCase):
+    def test_parse_shard(self):
+        self.assertIsNone(run_test.parse_shard(""))
+        self.assertEqual(run_test.parse_shard(" 2 / 4 "), (2, 4))
+        for shard in ("0/4", "5/4", "1/0", "1-4", "a/b"):
+            with self.assertRaises(ValueError):
+                run_test.parse_shard(shard)
+
+    def test_longest_tests_go_to_the_least_loaded_shard(self):
+        durations = {"test_a": 100, "test_b": 60, "test_c": 50, "test_d": 10}
+        test_dirs = ["test_d", "test_c", "test_b", "test_a"]
+
+        first = run_test.shard_test_dirs(test_dirs, (1, 2), durations, set())
+        second = run_test.shard_test_dirs(test_dirs, (2, 2), durations, set())
+
+        self.assertEqual(first, ["test_a", "test_d"])
+        self.assertEqual(second, ["test_b", "test_c"])
+
+    def test_every_test_lands_in_exactly_one_shard(self):
+        test_dirs = [f"test_{i}" for i in range(10)] + ["test_wave_attack"]
+        durations = {"test_3": 300}
+        skipped = {"test_5"}
+
+        shards = [run_test.shard_test_dirs(test_dirs, (i, 3), durations, skipped) for i in (1, 2, 3)]
+
+        self.assertEqual(sorted(d for shard in shards for d in shard), sorted(test_dirs))
+        # the static estimate (600s) keeps the other timed tests off the first shard; the skipped
+        # test weighs nothing and goes last, to the first of the shards tied at 600s
+        self.assertEqual(shards[0], ["test_wave_attack", "test_5"])
+
+
+class ContainerReuseTest(unittest.TestCase):
+    """run_test handing a passed test's container to the next test with the same start profile."""
+
+    def setUp(self):
+        self.reuse = ContainerReuse(max_idle=2)
+        self.db_pool = mock.MagicMock()
+        self.executed = []
+        self.status = summary.TestStatus.PASSED
+        patches = {
+            "docker": mock.MagicMock(),
+            "prepare_test": mock.MagicMock(return_value={"start": 1.0}),
+            "reset_reused_container": mock.MagicMock(return_value={"config": 0.5}),
+            "LogMonitor": mock.MagicMock(),
+            "execute_test": mock.MagicMock(side_effect=self.execute_test),
+        }
+        for name, value in patches.items():
+            patcher = mock.patch.object(run_test, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        monitor = run_test.LogMonitor.return_value.start.return_value
+        monitor.log_file = None
+        monitor.crash_line = None
+
+    def execute_test(self, result, test_dir, token, start_port, *args, reused=False, **kwargs):
+        self.executed.append((test_dir, token, start_port, reused))
+        result.complete(self.status)
+        return result
+
+    def run_one(self, test_dir: str, token: str, start_port: int):
+        return run_test.run_test(test_dir, token, "Dockerfile", start_port, 60, 60, "", 8080, 0, 0, "postgres",
+                                 db_pool=self.db_pool, reuse=self.reuse, reuse_key="profile")
+
+    def test_the_next_test_runs_in_the_released_container(self):
+        self.run_one("test_a", "token-a", 4000)
+        self.run_one("test_b", "token-b", 4001)
+
+        # test_b runs against test_a's app, reset instead of started
+        self.assertEqual(self.executed, [("test_a", "token-a", 4000, False), ("test_b", "token-a", 4000, True)])
+        run_test.prepare_test.assert_called_once()
+        container = run_test.reset_reused_container.call_args[0][1]
+        self.assertEqual((container.name, container.tests_run), ("test_a", 2))
+        self.assertEqual(run_test.LogMonitor.call_args[0][0], "test_a")
+        self.assertIsInstance(run_test.LogMonitor.call_args[1]["since"], float)
+        # test_b's own database is never used, and test_a's container is kept
+        self.db_pool.release.assert_called_once_with("test_b")
+        run_test.docker.stop_container.assert_not_called()
+        self.assertEqual([c.name for c in self.reuse.drain()], ["test_a"])
+
+    def test_a_container_that_fails_to_reset_is_replaced(self):
+        self.run_one("test_a", "token-a", 4000)
+        run_test.reset_reused_container.side_effect = RuntimeError("agent did not fetch the config")
+
+        self.run_one("test_b", "token-b", 4001)
+
+        self.assertEqual(self.executed[-1], ("test_b", "token-b", 4001, False))
+        self.assertEqual(run_test.prepare_test.call_count, 2)
+        run_test.docker.stop_container.assert_called_once_with("test_a", timeout_seconds=10)
+        run_test.docker.remove_container.assert_called_once_with("test_a")
+        self.assertEqual([c.name for c in self.reuse.drain()], ["test_b"])
+
+    def test_the_container_of_a_failed_test_is_removed(self):
+        self.status = summary.TestStatus.FAILED
+        self.run_one("test_a", "token-a", 4000)
+
+        self.assertIsNone(self.reuse.acquire("profile"))
+        run_test.docker.remove_container.assert_called_once_with("test_a")
+        self.db_pool.release.assert_called_once_with("test_a")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+
+from resource_monitor import slope_per_hour
+from soak import MIB, SoakConfig, analyze_soak, soak_failure
+
+
+def samples(memory_per_second: float, seconds: int = 100, step: int = 10):
+    return [{"time": t, "memory": 100 * MIB + memory_per_second * t, "cpu_percent": 10.0, "open_fds": 20}
+            for t in range(0, seconds + 1, step)]
+
+
+class SlopePerHourTest(unittest.TestCase):
+    def test_fits_a_line(self):
+        points = [{"time": t, "memory": 1000 + 2 * t} for t in range(0, 101, 10)]
+
+        self.assertAlmostEqual(slope_per_hour(points, "memory"), 7200)
+
+    def test_leaves_out_the_warmup_and_missing_values(self):
+        points = [{"time": 0, "memory": 10 ** 9}, {"time": 5, "memory": 10 ** 8},
+                  {"time": 10, "memory": 100}, {"time": 20, "memory": None}, {"time": 30, "memory": 100}]
+
+        self.assertEqual(slope_per_hour(points, "memory", skip_seconds=10), 0)
+
+    def test_needs_two_points_in_time(self):
+        self.assertIsNone(slope_per_hour([{"time": 10, "memory": 1}], "memory"))
+        self.assertIsNone(slope_per_hour([{"time": 10, "memory": 1}, {"time": 10, "memory": 2}], "memory"))
+
+
+class SoakTest(unittest.TestCase):
+    def test_memory_growth_within_the_limit(self):
+        # 1 MiB a minute
+        analysis = analyze_soak(samples(MIB / 60), SoakConfig(duration=100, max_memory_slope=100))
+
+        self.assertAlmostEqual(analysis["memory_slope"], 60)
+        self.assertEqual(analysis["warmup"], 20)
+        self.assertEqual((analysis["fds_start"], analysis["fds_end"]), (20, 20))
+        self.assertIsNone(soak_failure(analysis))
+
+    def test_memory_growth_over_the_limit(self):
+        analysis = analyze_soak(samples(MIB / 60), SoakConfig(duration=100, max_memory_slope=50))
+
+        self.assertIn("Memory grew by 60.0 MiB/hour", soak_failure(analysis))
+
+    def test_not_enough_samples_after_the_warmup(self):
+        analysis = analyze_soak(samples(0, seconds=20), SoakConfig(duration=100, max_memory_slope=50))
+
+        self.assertIsNone(analysis["memory_slope"])
+        self.assertIn("Not enough resource samples", soak_failure(analysis))
+
+
+if __name__ == "__main__":
+    unittest.main()
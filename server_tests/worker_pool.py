@@ -0,0 +1,188 @@
+"""
+Runs test.py scripts in processes forked from a preloaded forkserver.
+
+The forkserver imports testlib, core_api and requests once; each test then runs in a fresh fork of it
+as `__main__`, with the same argv it would get on the command line. TestProcess mirrors the parts of
+subprocess.Popen that run_test uses (communicate with a timeout, kill, returncode), and the test's
+output is streamed back over a pipe while it runs. PopenTestProcess is the same for `python test.py`
+in a new interpreter, when there is no forkserver.
+
+Both hand every output line to `on_output` as it arrives and only keep the last OUTPUT_TAIL_LINES
+lines of each stream for communicate(), for the failure message.
+"""
+import collections
+import io
+import multiprocessing
+import os
+import runpy
+import subprocess
+import sys
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+PRELOAD_MODULES = ["requests", "core_api", "testlib"]
+OUTPUT_TAIL_LINES = 200
+
+
+def forkserver_supported() -> bool:
+    return "forkserver" in multiprocessing.get_all_start_methods()
+
+
+class _PipeWriter(io.TextIOBase):
+    """sys.stdout / sys.stderr replacement in the child that sends complete lines to the parent."""
+
+    def __init__(self, conn, stream: str):
+        self._conn = conn
+        self._stream = stream
+        self._buffer = ""
+        self._lock = threading.Lock()
+
+    @property
+    def encoding(self):
+        return "utf-8"
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        with self._lock:
+            self._buffer += text
+            if "\n" in self._buffer:
+                lines, _, self._buffer = self._buffer.rpartition("\n")
+                self._conn.send((self._stream, lines + "\n"))
+        return len(text)
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._buffer:
+                self._conn.send((self._stream, self._buffer))
+                self._buffer = ""
+
+
+def _run_script(script_path: str, argv: List[str], env: Dict[str, str], conn) -> None:
+    """Child side: run the test script as __main__, like `python test.py <argv>` would."""
+    os.environ.update(env)
+    sys.argv = [script_path, *argv]
+    sys.path.insert(0, os.path.dirname(script_path))
+    sys.stdout = _PipeWriter(conn, "stdout")
+    sys.stderr = _PipeWriter(conn, "stderr")
+    exit_code = 0
+    try:
+        runpy.run_path(script_path, run_name="__main__")
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            exit_code = e.code or 0
+        else:
+            print(e.code, file=sys.stderr)
+            exit_code = 1
+    except BaseException as error:
+        # leave out the frames of this runner, so the traceback reads like the one of `python test.py`
+        tb = error.__traceback__
+        while tb is not None and tb.tb_frame.f_code.co_filename != script_path:
+            tb = tb.tb_next
+        # through the excepthook, which testlib uses to report the error to run_test
+        sys.excepthook(type(error), error, tb or error.__traceback__)
+        exit_code = 1
+    finally:
+        # the child exits with os._exit, without atexit handlers: run testlib's on_test_exit hooks
+        # (e.g. the latency report) like `python test.py` would at exit
+        testlib = sys.modules.get("testlib")
+        if testlib is not None:
+            testlib.run_test_exit_hooks()
+        sys.stdout.flush()
+        sys.stderr.flush()
+    sys.exit(exit_code)
+
+
+class TestProcess:
+    def __init__(self, context, script_path: str, argv: List[str], env: Dict[str, str], on_output: Optional[Callable[[str, str], None]] = None):
+        self.args = [script_path, *argv]
+        self.returncode: Optional[int] = None
+        self._on_output = on_output
+        self._output = {"stdout": collections.deque(maxlen=OUTPUT_TAIL_LINES),
+                        "stderr": collections.deque(maxlen=OUTPUT_TAIL_LINES)}
+        reader, writer = context.Pipe(duplex=False)
+        self._process = context.Process(
+            target=_run_script, args=(script_path, argv, env, writer), daemon=True)
+        self._process.start()
+        writer.close()
+        self._reader = threading.Thread(
+            target=self._read, args=(reader,), daemon=True)
+        self._reader.start()
+
+    def _read(self, reader) -> None:
+        try:
+            while True:
+                stream, text = reader.recv()
+                for line in text.splitlines():
+                    self._output[stream].append(line)
+                    if self._on_output:
+                        self._on_output(stream, line)
+        except (EOFError, OSError):
+            pass
+        finally:
+            reader.close()
+
+    def communicate(self, timeout: Optional[float] = None) -> Tuple[str, str]:
+        """Wait for the test to exit; raises subprocess.TimeoutExpired like Popen.communicate."""
+        self._process.join(timeout)
+        if self._process.is_alive():
+            raise subprocess.TimeoutExpired(self.args, timeout)
+        self._reader.join(5)
+        self.returncode = self._process.exitcode
+        return "\n".join(self._output["stdout"]), "\n".join(self._output["stderr"])
+
+    def kill(self) -> None:
+        if self._process.is_alive():
+            self._process.kill()
+
+
+class PopenTestProcess:
+    def __init__(self, command: List[str], env: Dict[str, str], on_output: Optional[Callable[[str, str], None]] = None):
+        self.args = command
+        self._on_output = on_output
+        self._output = {"stdout": collections.deque(maxlen=OUTPUT_TAIL_LINES),
+                        "stderr": collections.deque(maxlen=OUTPUT_TAIL_LINES)}
+        self._process = subprocess.Popen(command, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                         text=True, encoding="utf-8", errors="replace")
+        self._readers = [threading.Thread(target=self._read, args=(name, stream), daemon=True)
+                         for name, stream in (("stdout", self._process.stdout), ("stderr", self._process.stderr))]
+        for reader in self._readers:
+            reader.start()
+
+    @property
+    def returncode(self) -> Optional[int]:
+        return self._process.returncode
+
+    def _read(self, name: str, stream) -> None:
+        with stream:
+            for line in stream:
+                line = line.rstrip("\n")
+                self._output[name].append(line)
+                if self._on_output:
+                    self._on_output(name, line)
+
+    def communicate(self, timeout: Optional[float] = None) -> Tuple[str, str]:
+        """Wait for the test to exit; raises subprocess.TimeoutExpired like Popen.communicate."""
+        self._process.wait(timeout)
+        for reader in self._readers:
+            reader.join(5)
+        return "\n".join(self._output["stdout"]), "\n".join(self._output["stderr"])
+
+    def kill(self) -> None:
+        self._process.kill()
+
+
+class TestWorkerPool:
+    def __init__(self, preload: List[str] = PRELOAD_MODULES):
+        self._context = multiprocessing.get_context("forkserver")
+        self._context.set_forkserver_preload(preload)
+
+    def start(self) -> None:
+        """Start the forkserver (and import the preloaded modules) before the first test needs it."""
+        from multiprocessing import forkserver
+        forkserver.ensure_running()
+
+    def run(self, script_path: str, argv: List[str], env: Optional[Dict[str, str]] = None, on_output: Optional[Callable[[str, str], None]] = None) -> TestProcess:
+        """Start test.py with `argv`; `env` is added to the child's environment."""
+        return TestProcess(self._context, script_path, argv, env or {}, on_output)
@@ -1,13 +1,19 @@
 import express, { Express } from 'express'
 import * as core from '@actions/core'
 import { Server } from 'http'
-import createApp from './src/handlers/createApp.js'
+import createApp, { rotateApp } from './src/handlers/createApp.js'
 import { checkToken } from './src/middleware/checkToken.js'
 import { getConfigHandler } from './src/handlers/getConfig.js'
 import { updateConfigHandler } from './src/handlers/updateConfig.js'
 import { realtimeConfigHandler } from './src/handlers/realtimeConfig.js'
-import { listEventsHandler } from './src/handlers/listEvents.js'
+import { configAppliedHandler } from './src/handlers/configApplied.js'
+import {
+  listEventsHandler,
+  eventsCursorHandler,
+  waitForEventsHandler
+} from './src/handlers/listEvents.js'
 import { captureEventHandler } from './src/handlers/captureEvent.js'
+import { flushHeartbeatHandler } from './src/handlers/heartbeat.js'
 import { listsHandler } from './src/handlers/listsHandler.js'
 import { updateListsHandler } from './src/handlers/updateListsHandler.js'
 import {
@@ -27,16 +33,26 @@ app.use(express.urlencoded({ extended: true }))
 // Routes
 app.get('/api/runtime/config', checkToken, getConfigHandler)
 app.post('/api/runtime/config', checkToken, updateConfigHandler)
+// which configUpdatedAt the agent has fetched so far (used as a config-applied barrier)
+app.get('/api/runtime/config/applied', checkToken, configAppliedHandler)
 
 app.get('/config', checkToken, realtimeConfigHandler)
 
+// ?type= filters on event type, ?after=<seq> only returns events captured after that cursor
 app.get('/api/runtime/events', checkToken, listEventsHandler)
+app.get('/api/runtime/events/cursor', checkToken, eventsCursorHandler)
 app.post('/api/runtime/events', checkToken, captureEventHandler)
+// serves a short heartbeat interval (intervalInMS in the body) until the agent's next heartbeat
+app.post('/api/runtime/heartbeat/flush', checkToken, flushHeartbeatHandler)
+// long-poll: responds once an event of ?type= exists past index ?after= (counted from cursor ?since=), or after ?timeout= ms
+app.get('/api/runtime/events/wait', checkToken, waitForEventsHandler)
 
 app.get('/api/runtime/firewall/lists', checkToken, listsHandler)
 app.post('/api/runtime/firewall/lists', checkToken, updateListsHandler)
 
 app.post('/api/runtime/apps', createApp)
+// a reused test container keeps its token: the app behind it starts over with fresh state
+app.post('/api/runtime/apps/rotate', checkToken, rotateApp)
 // when this endpoint is called, the server should go down (will respind with 503 at any request for that token)
 app.post('/api/runtime/apps/down', checkToken, setTokenDownHandler)
 
@@ -1,7 +1,11 @@
 import { Response } from 'express'
 import { RequestWithAppData } from '../types.js'
 import { captureEvent } from '../zen/events.js'
-import { getAppConfig } from '../zen/config.js'
+import {
+  getAppConfig,
+  recordConfigDelivery,
+  restoreHeartbeatInterval
+} from '../zen/config.js'
 
 export function captureEventHandler(
   req: RequestWithAppData,
@@ -14,6 +18,11 @@ export function captureEventHandler(
   }
   const event = req.body
   captureEvent(event, appData)
+  if (event.type === 'heartbeat') {
+    // if the agent already had the flushed config, this is the heartbeat the
+    // flush asked for: the response below carries the normal interval again
+    restoreHeartbeatInterval(appData)
+  }
 
   if (event.type === 'detected_attack') {
     res.json({
@@ -22,5 +31,7 @@ export function captureEventHandler(
     return
   }
 
+  // Agents apply the config returned in response to started/heartbeat events
+  recordConfigDelivery(appData, 'config')
   res.json(getAppConfig(appData))
 }
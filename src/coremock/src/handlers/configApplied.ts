@@ -0,0 +1,20 @@
+import { Response } from 'express'
+import { RequestWithAppData } from '../types.js'
+import { getAppConfig, getConfigDeliveries } from '../zen/config.js'
+
+export function configAppliedHandler(
+  req: RequestWithAppData,
+  res: Response
+): void {
+  const appData = req.appData
+  if (!appData) {
+    res.status(401).json({ message: 'Unauthorized' })
+    return
+  }
+
+  res.json({
+    serviceId: appData.id,
+    configUpdatedAt: getAppConfig(appData).configUpdatedAt,
+    delivered: getConfigDeliveries(appData)
+  })
+}
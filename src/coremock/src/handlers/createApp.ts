@@ -1,5 +1,6 @@
 import { Request, Response } from 'express'
-import { createZenApp } from '../zen/apps.js'
+import { createZenApp, rotateZenApp } from '../zen/apps.js'
+import { RequestWithAppData } from '../types.js'
 import * as core from '@actions/core'
 
 export default function createApp(req: Request, res: Response): void {
@@ -11,3 +12,20 @@ export default function createApp(req: Request, res: Response): void {
     token
   })
 }
+
+export function rotateApp(req: RequestWithAppData, res: Response): void {
+  const appData = req.appData
+  if (!appData) {
+    res.status(401).json({ message: 'Unauthorized' })
+    return
+  }
+
+  const app = rotateZenApp(appData)
+
+  core.info(`Rotated app ${app.token.substring(0, 15)}... to id ${app.id}`)
+
+  res.json({
+    serviceId: app.id,
+    configUpdatedAt: app.configUpdatedAt
+  })
+}
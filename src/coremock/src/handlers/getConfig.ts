@@ -1,5 +1,5 @@
 import { Response } from 'express'
-import { getAppConfig } from '../zen/config.js'
+import { getAppConfig, recordConfigDelivery } from '../zen/config.js'
 import { RequestWithAppData } from '../types.js'
 
 export function getConfigHandler(req: RequestWithAppData, res: Response): void {
@@ -9,5 +9,6 @@ export function getConfigHandler(req: RequestWithAppData, res: Response): void {
     return
   }
 
+  recordConfigDelivery(appData, 'config')
   res.json(getAppConfig(appData))
 }
@@ -0,0 +1,30 @@
+import { Response } from 'express'
+import { RequestWithAppData } from '../types.js'
+import { flushHeartbeat, getAppConfig } from '../zen/config.js'
+
+// Default interval served until the agent's next heartbeat
+const FLUSH_INTERVAL_IN_MS = 5 * 1000
+
+export function flushHeartbeatHandler(
+  req: RequestWithAppData,
+  res: Response
+): void {
+  const appData = req.appData
+  if (!appData) {
+    res.status(401).json({ message: 'Unauthorized' })
+    return
+  }
+
+  const intervalInMS = Number(req.body?.intervalInMS ?? FLUSH_INTERVAL_IN_MS)
+  if (!Number.isFinite(intervalInMS) || intervalInMS <= 0) {
+    res.status(400).json({ message: 'intervalInMS must be a positive number' })
+    return
+  }
+
+  flushHeartbeat(appData, intervalInMS)
+
+  res.json({
+    success: true,
+    configUpdatedAt: getAppConfig(appData).configUpdatedAt
+  })
+}
@@ -1,6 +1,12 @@
 import { Response } from 'express'
 import { RequestWithAppData } from '../types.js'
-import { listEvents } from '../zen/events.js'
+import {
+  getEventsCursor,
+  listEvents,
+  waitForEvents
+} from '../zen/events.js'
+
+const MAX_WAIT_MS = 5 * 60 * 1000
 
 export function listEventsHandler(
   req: RequestWithAppData,
@@ -11,6 +17,60 @@ export function listEventsHandler(
     res.status(401).json({ message: 'App is missing' })
     return
   }
-  const events = listEvents(appData)
-  res.json(events)
+  const type = typeof req.query.type === 'string' ? req.query.type : undefined
+  const since = parseInt(String(req.query.after ?? '0')) || 0
+
+  // Cursor to pass as ?after= next time to only get events captured after this call
+  res.setHeader('X-Events-Cursor', getEventsCursor(appData).toString())
+  res.json(listEvents(appData, type, since))
+}
+
+export function eventsCursorHandler(
+  req: RequestWithAppData,
+  res: Response
+): void {
+  const appData = req.appData
+  if (!appData) {
+    res.status(401).json({ message: 'App is missing' })
+    return
+  }
+
+  res.json({ cursor: getEventsCursor(appData) })
+}
+
+export async function waitForEventsHandler(
+  req: RequestWithAppData,
+  res: Response
+): Promise<void> {
+  const appData = req.appData
+  if (!appData) {
+    res.status(401).json({ message: 'App is missing' })
+    return
+  }
+
+  const type = typeof req.query.type === 'string' ? req.query.type : undefined
+  const since = parseInt(String(req.query.since ?? '0')) || 0
+  const after = parseInt(String(req.query.after ?? '0')) || 0
+  const timeout = Math.min(
+    parseInt(String(req.query.timeout ?? '0')) || 0,
+    MAX_WAIT_MS
+  )
+
+  // Stop waiting if the client gives up on the request
+  const controller = new AbortController()
+  res.on('close', () => controller.abort())
+
+  const count = await waitForEvents(
+    appData,
+    type,
+    since,
+    after,
+    timeout,
+    controller.signal
+  )
+  if (res.writableEnded || res.destroyed) {
+    return
+  }
+
+  res.json({ found: count > after, count })
 }
@@ -6,7 +6,8 @@ import {
   getBlockedUserAgents,
   getMonitoredIPAddresses,
   getMonitoredUserAgents,
-  getUserAgentDetails
+  getUserAgentDetails,
+  recordConfigDelivery
 } from '../zen/config.js'
 
 export function listsHandler(req: RequestWithAppData, res: Response) {
@@ -20,6 +21,7 @@ export function listsHandler(req: RequestWithAppData, res: Response) {
   const monitoredUserAgents = getMonitoredUserAgents(req.appData)
   const monitoredIps = getMonitoredIPAddresses(req.appData)
   const userAgentDetails = getUserAgentDetails(req.appData)
+  recordConfigDelivery(req.appData, 'lists')
 
   res.json({
     success: true,
@@ -1,6 +1,6 @@
 import { Response } from 'express'
 import { RequestWithAppData } from '../types.js'
-import { getAppConfig } from '../zen/config.js'
+import { getAppConfig, recordConfigDelivery } from '../zen/config.js'
 
 export function realtimeConfigHandler(
   req: RequestWithAppData,
@@ -13,6 +13,7 @@ export function realtimeConfigHandler(
   }
 
   const config = getAppConfig(appData)
+  recordConfigDelivery(appData, 'realtime')
 
   res.json({
     serviceId: appData.id,
@@ -6,7 +6,8 @@ import {
   updateAllowedIPAddresses,
   updateMonitoredUserAgents,
   updateMonitoredIPAddresses,
-  updateUserAgentDetails
+  updateUserAgentDetails,
+  getAppConfig
 } from '../zen/config.js'
 
 export function updateListsHandler(req: RequestWithAppData, res: Response) {
@@ -69,5 +70,8 @@ export function updateListsHandler(req: RequestWithAppData, res: Response) {
     updateUserAgentDetails(req.appData, req.body.userAgentDetails)
   }
 
-  res.json({ success: true })
+  res.json({
+    success: true,
+    configUpdatedAt: getAppConfig(req.appData).configUpdatedAt
+  })
 }
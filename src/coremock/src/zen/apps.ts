@@ -18,6 +18,15 @@ export function createZenApp(): string {
   return token
 }
 
+// Gives the app behind `token` a new id, so it starts over with a fresh config,
+// events and lists while an agent that already runs with the token keeps using it
+export function rotateZenApp(app: AppData): AppData {
+  app.id = id++
+  app.configUpdatedAt = Date.now()
+
+  return app
+}
+
 export function getByToken(token: string) {
   return apps.find((app) => {
     if (app.token.length !== token.length) {
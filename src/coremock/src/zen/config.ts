@@ -46,11 +46,75 @@ export function updateAppConfig(
   configs[index] = {
     ...configs[index],
     ...newConfig,
-    configUpdatedAt: Date.now()
+    // strictly increasing, so two updates within a millisecond stay apart
+    configUpdatedAt: Math.max(Date.now(), configs[index].configUpdatedAt + 1)
   }
   return true
 }
 
+// heartbeatIntervalInMS to go back to after a flush, and the configUpdatedAt
+// of the config that serves the short interval, per app
+const heartbeatFlushes = new Map<
+  number,
+  { intervalInMS: number; configUpdatedAt: number }
+>()
+
+// Serves a short heartbeat interval until the agent's next heartbeat, so it
+// reports soon instead of after the default 10 minutes
+export function flushHeartbeat(app: AppData, intervalInMS: number) {
+  const restoreTo =
+    heartbeatFlushes.get(app.id)?.intervalInMS ??
+    getAppConfig(app).heartbeatIntervalInMS
+  updateAppConfig(app, { heartbeatIntervalInMS: intervalInMS })
+  heartbeatFlushes.set(app.id, {
+    intervalInMS: restoreTo,
+    configUpdatedAt: getAppConfig(app).configUpdatedAt
+  })
+}
+
+// Only a heartbeat sent after the agent fetched the flushed config ends the
+// flush: one that was already on its way ran on the old interval
+export function restoreHeartbeatInterval(app: AppData) {
+  const flush = heartbeatFlushes.get(app.id)
+  if (!flush || getConfigDeliveries(app).config < flush.configUpdatedAt) {
+    return
+  }
+  heartbeatFlushes.delete(app.id)
+  updateAppConfig(app, { heartbeatIntervalInMS: flush.intervalInMS })
+}
+
+export type ConfigSource = 'config' | 'lists' | 'realtime'
+
+// Latest configUpdatedAt that the agent has fetched, per endpoint
+const configDeliveries: {
+  serviceId: number
+  config: number
+  lists: number
+  realtime: number
+}[] = []
+
+export function recordConfigDelivery(app: AppData, source: ConfigSource) {
+  const configUpdatedAt = getAppConfig(app).configUpdatedAt
+  let entry = configDeliveries.find((e) => e.serviceId === app.id)
+
+  if (!entry) {
+    entry = { serviceId: app.id, config: 0, lists: 0, realtime: 0 }
+    configDeliveries.push(entry)
+  }
+
+  entry[source] = Math.max(entry[source], configUpdatedAt)
+}
+
+export function getConfigDeliveries(app: AppData) {
+  const entry = configDeliveries.find((e) => e.serviceId === app.id)
+
+  return {
+    config: entry?.config ?? 0,
+    lists: entry?.lists ?? 0,
+    realtime: entry?.realtime ?? 0
+  }
+}
+
 const blockedIPAddresses: { serviceId: number; ipAddresses: string[] }[] = []
 const allowedIPAddresses: { serviceId: number; ipAddresses: string[] }[] = []
 const blockedUserAgents: { serviceId: number; userAgents: string }[] = []
@@ -1,7 +1,18 @@
 /* eslint-disable @typescript-eslint/no-explicit-any */
 import { AppData } from '../types.js'
 
-const events = new Map()
+// Every captured event gets a per-app sequence number, so clients can ask
+// for "everything after <seq>" instead of re-downloading the full list
+interface CapturedEvent {
+  seq: number
+  event: any
+}
+
+const events = new Map<number, CapturedEvent[]>()
+const lastSeq = new Map<number, number>()
+
+// Pending long-poll requests per app, woken up whenever an event is captured
+const eventWaiters = new Map<number, Set<() => void>>()
 
 function normalizeTypesInApiSpec(schema: any): any {
   if (Array.isArray(schema)) {
@@ -38,6 +49,8 @@ export function captureEvent(event: any, app: AppData) {
   if (event.type === 'started') {
     events.set(app.id, [])
   }
+  const seq = getEventsCursor(app) + 1
+  lastSeq.set(app.id, seq)
 
   if (event.type === 'heartbeat') {
     event.routes.forEach((route: any) => {
@@ -45,9 +58,72 @@ export function captureEvent(event: any, app: AppData) {
     })
   }
 
-  events.get(app.id).push(event)
+  events.get(app.id)?.push({ seq, event })
+  eventWaiters.get(app.id)?.forEach((wake) => wake())
 }
 
-export function listEvents(app: AppData) {
-  return events.get(app.id) || []
+export function getEventsCursor(app: AppData): number {
+  return lastSeq.get(app.id) ?? 0
+}
+
+function matches(captured: CapturedEvent, type?: string, since = 0) {
+  return captured.seq > since && (!type || captured.event.type === type)
+}
+
+// Events of `type` (all types if omitted) captured after sequence `since`
+export function listEvents(app: AppData, type?: string, since = 0) {
+  return (events.get(app.id) || [])
+    .filter((captured) => matches(captured, type, since))
+    .map((captured) => captured.event)
+}
+
+export function countEvents(app: AppData, type?: string, since = 0): number {
+  let count = 0
+  for (const captured of events.get(app.id) || []) {
+    if (matches(captured, type, since)) {
+      count++
+    }
+  }
+  return count
+}
+
+// Resolves with the event count as soon as more than `after` events (of
+// `type`, if given, captured after sequence `since`) exist, or with the
+// current count once `timeoutMs` passed
+export function waitForEvents(
+  app: AppData,
+  type: string | undefined,
+  since: number,
+  after: number,
+  timeoutMs: number,
+  signal?: AbortSignal
+): Promise<number> {
+  return new Promise((resolve) => {
+    if (countEvents(app, type, since) > after || timeoutMs <= 0) {
+      resolve(countEvents(app, type, since))
+      return
+    }
+
+    const waiters = eventWaiters.get(app.id) ?? new Set<() => void>()
+    eventWaiters.set(app.id, waiters)
+
+    const done = () => {
+      clearTimeout(timer)
+      waiters.delete(wake)
+      if (waiters.size === 0) {
+        eventWaiters.delete(app.id)
+      }
+      signal?.removeEventListener('abort', done)
+      resolve(countEvents(app, type, since))
+    }
+    const wake = () => {
+      if (countEvents(app, type, since) > after) {
+        done()
+      }
+    }
+    const timer = setTimeout(done, timeoutMs)
+
+    waiters.add(wake)
+    signal?.addEventListener('abort', done)
+  })
 }
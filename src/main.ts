@@ -19,8 +19,6 @@ process.on('SIGTERM', () => {
 
 export async function run(): Promise<void> {
   try {
-    // Start the Express server
-    startServer()
     const dockerfile_path: string = core.getInput('dockerfile_path')
     const max_parallel_tests: number = parseInt(
       core.getInput('max_parallel_tests')
@@ -40,12 +38,38 @@ export async function run(): Promise<void> {
     )
     const ignore_failures: boolean = core.getInput('ignore_failures') === 'true'
     const test_type: string = core.getInput('test_type')
-    if (!['server', 'control'].includes(test_type)) {
+    const ready_timeout: number = parseInt(core.getInput('ready_timeout'))
+    const wait_for_agent_started: boolean =
+      core.getInput('wait_for_agent_started') === 'true'
+    const durations_file: string = core.getInput('durations_file')
+    const prewarm_tests: number = parseInt(core.getInput('prewarm_tests'))
+    const stop_timeout: number = parseInt(core.getInput('stop_timeout'))
+    const results_file: string = core.getInput('results_file')
+    const build_cache_dir: string = core.getInput('build_cache_dir')
+    const preload_tests: boolean = core.getInput('preload_tests') !== 'false'
+    const shard: string = core.getInput('shard')
+    const merge_results: string = core.getInput('merge_results')
+    const reuse_containers: boolean =
+      core.getInput('reuse_containers') === 'true'
+    const soak_duration: number = parseInt(core.getInput('soak_duration'))
+    const soak_max_memory_slope: number = parseFloat(
+      core.getInput('soak_max_memory_slope')
+    )
+    if (!['server', 'control', 'benchmark', 'soak'].includes(test_type)) {
       core.setFailed(
-        `Invalid test type: ${test_type} Must be one of: server, control`
+        `Invalid test type: ${test_type} Must be one of: server, control, benchmark, soak`
       )
       return
     }
+    // merge mode only reads results files: no Dockerfile, and no core mock
+    if (!merge_results) {
+      if (!dockerfile_path) {
+        core.setFailed('Input required and not supplied: dockerfile_path')
+        return
+      }
+      // Start the Express server
+      startServer()
+    }
 
     core.debug(`Dockerfile path: ${dockerfile_path}`)
     core.debug(`Max parallel tests: ${max_parallel_tests}`)
@@ -59,19 +83,39 @@ export async function run(): Promise<void> {
     core.debug(`Sleep before test: ${sleep_before_test}`)
     core.debug(`Ignore failures: ${ignore_failures}`)
     core.debug(`Test type: ${test_type}`)
+    core.debug(`Ready timeout: ${ready_timeout}`)
+    core.debug(`Wait for agent started: ${wait_for_agent_started}`)
+    core.debug(`Durations file: ${durations_file}`)
+    core.debug(`Prewarm tests: ${prewarm_tests}`)
+    core.debug(`Stop timeout: ${stop_timeout}`)
+    core.debug(`Results file: ${results_file}`)
+    core.debug(`Build cache dir: ${build_cache_dir}`)
+    core.debug(`Preload tests: ${preload_tests}`)
+    core.debug(`Shard: ${shard}`)
+    core.debug(`Merge results: ${merge_results}`)
+    core.debug(`Reuse containers: ${reuse_containers}`)
+    core.debug(`Soak duration: ${soak_duration}`)
+    core.debug(`Soak max memory slope: ${soak_max_memory_slope}`)
     // Spawn the Python process
     const this_file_dir = path.dirname(fileURLToPath(import.meta.url))
-    const run_test_path = path.resolve(
+    const script = merge_results ? 'merge_results.py' : 'run_test.py'
+    const script_path = path.resolve(
       this_file_dir,
       '..',
       'server_tests',
-      'run_test.py'
+      script
     )
-    await new Promise<void>((resolve, reject) => {
-      const proc = spawn(
-        'python',
-        [
-          run_test_path,
+    // merge mode only combines the results files of earlier shard runs
+    const args: string[] = merge_results
+      ? [
+          '--results',
+          merge_results,
+          '--results_file',
+          results_file,
+          '--ignore_failures',
+          ignore_failures.toString()
+        ]
+      : [
           '--dockerfile_path',
           dockerfile_path,
           '--max_parallel_tests',
@@ -95,16 +139,40 @@ export async function run(): Promise<void> {
           '--ignore_failures',
           ignore_failures.toString(),
           '--test_type',
-          test_type
-        ],
-        {
-          stdio: 'inherit'
-        }
-      )
+          test_type,
+          '--ready_timeout',
+          ready_timeout.toString(),
+          '--wait_for_agent_started',
+          wait_for_agent_started.toString(),
+          '--durations_file',
+          durations_file,
+          '--prewarm_tests',
+          prewarm_tests.toString(),
+          '--stop_timeout',
+          stop_timeout.toString(),
+          '--results_file',
+          results_file,
+          '--build_cache_dir',
+          build_cache_dir,
+          '--preload_tests',
+          preload_tests.toString(),
+          '--shard',
+          shard,
+          '--reuse_containers',
+          reuse_containers.toString(),
+          '--soak_duration',
+          soak_duration.toString(),
+          '--soak_max_memory_slope',
+          soak_max_memory_slope.toString()
+        ]
+    await new Promise<void>((resolve, reject) => {
+      const proc = spawn('python', [script_path, ...args], {
+        stdio: 'inherit'
+      })
 
       proc.on('close', (code) => {
         if (code !== 0) {
-          reject(new Error(`run_test.py exited with code ${code}`))
+          reject(new Error(`${script} exited with code ${code}`))
         } else {
           resolve()
         }